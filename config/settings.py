@@ -1,6 +1,6 @@
 import os
 from pathlib import Path
-from typing import Optional
+from typing import Dict, Optional
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import Field, computed_field
 
@@ -22,9 +22,11 @@ class Settings(BaseSettings):
     # ==========================
     # 1. 基础路径配置
     # ==========================
+    DATA_PATH: Optional[Path] = Field(default=None, description="数据目录 (各 SQLite 库 / 页面图片 / 上传文件)，默认 PROJECT_ROOT/data")
+
     @computed_field
     def DATA_DIR(self) -> Path:
-        path = PROJECT_ROOT / "data"
+        path = self.DATA_PATH or PROJECT_ROOT / "data"
         path.mkdir(parents=True, exist_ok=True)
         return path
 
@@ -38,6 +40,58 @@ class Settings(BaseSettings):
         path.mkdir(parents=True, exist_ok=True)
         return path
 
+    @computed_field
+    def INGESTION_CHECKPOINT_DB(self) -> Path:
+        # 入库流程的持久化 Checkpoint，崩溃后可按论文断点续跑
+        return self.DATA_DIR / "ingestion_checkpoints.sqlite"
+
+    @computed_field
+    def BIBLIOGRAPHY_DB(self) -> Path:
+        # 离线书目库 (DBLP / Crossref / BibTeX 导入)，用于在联网前补全 venue / year
+        return self.DATA_DIR / "bibliography.sqlite"
+
+    @computed_field
+    def SEARCH_CACHE_DB(self) -> Path:
+        # Tavily 搜索结果缓存，TTL 见 core/search.py
+        return self.DATA_DIR / "search_cache.sqlite"
+
+    @computed_field
+    def CHAT_MEMORY_DB(self) -> Path:
+        # 窗口记忆模式下旧对话的滚动摘要 (按 thread_id)
+        return self.DATA_DIR / "chat_memory.sqlite"
+
+    @computed_field
+    def DOC_STORE_DB(self) -> Path:
+        # 联网结果 / 上传论文摘要等临时文档，Research State 中只保留引用
+        return self.DATA_DIR / "doc_store.sqlite"
+
+    @computed_field
+    def CHECKPOINT_ARCHIVE_DIR(self) -> Path:
+        # 长期不活跃会话的 Checkpoint 冷存储 (gzip JSON，每个会话一个文件)
+        return self.DATA_DIR / "checkpoint_archive"
+
+    @computed_field
+    def QDRANT_STATE_DB(self) -> Path:
+        # Qdrant 集合的本地元信息 (版本号等)
+        return self.DATA_DIR / "qdrant_state.sqlite"
+
+    @computed_field
+    def QDRANT_EMBEDDED_PATH(self) -> str:
+        # 嵌入式 Qdrant 的存储目录 (QDRANT_MODE=embedded)，目录由 Qdrant 客户端自行创建
+        return self.QDRANT_PATH or str(self.DATA_DIR / "qdrant")
+
+    @computed_field
+    def ANSWER_CACHE_DB(self) -> Path:
+        # 研究助手的语义答案缓存
+        return self.DATA_DIR / "answer_cache.sqlite"
+
+    @computed_field
+    def BLOB_DIR(self) -> Path:
+        # 渲染后的页面图片等大对象存放在这里，Graph State 中只保留引用
+        path = self.DATA_DIR / "blobs"
+        path.mkdir(parents=True, exist_ok=True)
+        return path
+
     # ==========================
     # 2. Agent 模型 (DeepSeek Reasoner / R1)
     # ==========================
@@ -69,19 +123,103 @@ class Settings(BaseSettings):
     EMBEDDING_BASE_URL: str = Field(default="https://dashscope.aliyuncs.com/compatible-mode/v1")
     EMBEDDING_API_KEY: str = Field(..., description="DashScope API Key")
     EMBEDDING_MODEL_NAME: str = Field(default="text-embedding-v4")
+    # 服务商限制: DashScope text-embedding-v4 单次请求最多 10 条文本
+    EMBEDDING_BATCH_SIZE: int = Field(default=10, description="单次 Embedding 请求的最大文本条数")
+    EMBEDDING_BATCH_MAX_CHARS: int = Field(default=60000, description="单次 Embedding 请求的最大总字符数")
+    # Matryoshka 截断：前 N 维重新归一化后单独存成 dense_mini 向量驱动 ANN，完整向量只用于重排
+    EMBEDDING_MINI_DIM: int = Field(default=256, description="新建集合的截断向量维度，0 表示只存完整向量")
 
     # ==========================
-    # 5. 向量数据库 (Qdrant Cloud)
+    # 5. 向量数据库 (Qdrant)
     # ==========================
-    # 注意: Cloud 版本必须要有 API Key
-    QDRANT_URL: str = Field(..., description="Qdrant Cloud Cluster URL")
+    # remote: 连接 Qdrant 服务 (自建 / Cloud，Cloud 版本必须要有 API Key)
+    # embedded: 进程内本地存储 (QdrantClient(path=...))，检索不走网络；存储目录同一时间只能被一个进程打开
+    QDRANT_MODE: str = Field(default="remote", description="Qdrant 运行方式: remote / embedded")
+    QDRANT_PATH: Optional[str] = Field(default=None, description="embedded 模式的存储目录，默认 DATA_DIR/qdrant；:memory: 表示纯内存 (测试用)")
+    QDRANT_URL: Optional[str] = Field(default=None, description="Qdrant Cloud Cluster URL (remote 模式必填)")
     QDRANT_API_KEY: Optional[str] = Field(default=None, description="Qdrant Cloud API Key") 
     QDRANT_COLLECTION_NAME: str = Field(default="academic_knowledge")
+    # 传输方式：gRPC 用 protobuf 传向量，批量取向量 (聚类 / 迁移 / 工作集) 时比 REST JSON 省带宽和解析时间
+    QDRANT_PREFER_GRPC: bool = Field(default=False, description="是否优先使用 gRPC 连接 Qdrant")
+    QDRANT_GRPC_PORT: int = Field(default=6334, description="Qdrant gRPC 端口")
+    QDRANT_TIMEOUT: Optional[int] = Field(default=None, description="Qdrant 请求超时 (秒)，为空使用客户端默认值；大批量 scroll 向量时可调大")
+    # 集合配置档 (量化 / 磁盘存储 / HNSW 参数)，见 core/qdrant.py 的 COLLECTION_PROFILES
+    QDRANT_COLLECTION_PROFILE: str = Field(default="default", description="集合配置档: default / scalar / binary / disk")
+    QDRANT_RESCORE_FACTOR: int = Field(default=4, description="两阶段检索时截断向量先取 top_k 的多少倍候选，再用完整向量重排")
+    # 检索档位 (core/retriever.py 的 SEARCH_MODES)，研究助手里每个请求可以单独选择
+    SEARCH_MODE: str = Field(default="balanced", description="默认检索档位: fast / balanced / exhaustive")
+    # 混合检索：新建集合带 BM25 风格稀疏向量 (core/sparse.py)，检索时稠密 / 稀疏结果按 RRF 融合
+    HYBRID_SEARCH: bool = Field(default=True, description="是否启用稠密 + 稀疏混合检索")
+    SPARSE_AVG_DOC_LENGTH: float = Field(default=300, description="BM25 长度归一化使用的平均文档词项数")
+    # 分段向量：标题 / 摘要 / 引言分别存向量，检索时与整体向量、稀疏向量按权重做 RRF 融合，聚类时按权重融合成单一向量
+    SECTION_VECTORS: bool = Field(default=True, description="新建集合是否带 title / abstract / intro 分段向量")
+    SECTION_WEIGHTS: Dict[str, float] = Field(
+        default={"dense": 1.0, "title": 0.5, "abstract": 1.0, "intro": 0.7, "sparse": 1.0},
+        description="检索融合 / 聚类时各路向量的权重"
+    )
+    # Payload 精简：Qdrant 只存过滤 / 展示字段，正文 / 摘要 / 引言存本地 doc_store，只为进入 Writer 的文档取回
+    # 注意正文只在入库的这台机器上，多机共用同一个 Qdrant 时不要开启
+    QDRANT_LEAN_PAYLOAD: bool = Field(default=False, description="是否只在 Qdrant 中保留过滤和展示字段")
+    # doc_store 中的联网结果 / 上传论文摘要由后台维护线程按期清理；知识库论文的正文不过期
+    DOC_STORE_RETENTION_DAYS: float = Field(default=30, description="doc_store 中非正文文档的保存天数，0 表示不清理")
 
     # ==========================
     # 6. 搜索工具 (Tavily)
     # ==========================
     TAVILY_API_KEY: str = Field(..., description="Tavily API Key")
+    WEB_SEARCH_TIMEOUT: float = Field(default=15.0, description="并发搜索时每个查询的超时 (秒)")
+    SEARCH_CACHE_MAX_ENTRIES: int = Field(default=5000, description="搜索缓存最多保留的条目数，超出按最近访问时间淘汰")
+
+    # ==========================
+    # 7. 上下文预算 (Writer)
+    # ==========================
+    WRITER_PROMPT_MAX_TOKENS: int = Field(default=24000, description="Writer System Prompt 的 Token 上限")
+    TOKENIZER_ENCODING: str = Field(default="cl100k_base", description="tiktoken 编码，用于估算 Prompt 长度")
+    # reference: State 只存文档引用，Writer 按需取回; full: State 直接存完整 Document
+    RESEARCH_CONTEXT_MODE: str = Field(default="reference", description="Research State 的上下文存储模式: reference / full")
+    # full: 每轮带上全部历史; windowed: 最近 N 轮原文 + 更早对话的滚动摘要
+    CHAT_MEMORY_MODE: str = Field(default="windowed", description="对话记忆模式: full / windowed")
+    CHAT_MEMORY_WINDOW_TURNS: int = Field(default=3, description="windowed 模式下原样保留的最近轮数")
+
+    # ==========================
+    # 8. Checkpoint 存储与维护
+    # ==========================
+    # Research Graph 的对话 Checkpoint (绝对路径，不再依赖启动时的工作目录)
+    CHECKPOINT_DB_PATH: Path = Field(default=PROJECT_ROOT / "checkpoints.sqlite", description="Research Checkpoint 数据库路径")
+    CHECKPOINT_POOL_SIZE: int = Field(default=8, description="Checkpointer 连接池大小")
+    SQLITE_BUSY_TIMEOUT_MS: int = Field(default=5000, description="SQLite 写锁冲突时的等待时间 (毫秒)")
+    CHECKPOINT_KEEP_LAST: int = Field(default=10, description="每个会话保留的最近 Checkpoint 数")
+    CHECKPOINT_ARCHIVE_AFTER_DAYS: float = Field(default=30, description="超过该天数未活跃的会话归档到冷存储，0 表示不归档")
+    CHECKPOINT_MAINTENANCE_INTERVAL: float = Field(default=3600, description="后台维护间隔 (秒)，0 表示关闭")
+
+    # ==========================
+    # 9. 语义答案缓存
+    # ==========================
+    ANSWER_CACHE_ENABLED: bool = Field(default=True, description="是否启用研究助手的语义答案缓存")
+    ANSWER_CACHE_THRESHOLD: float = Field(default=0.95, description="问题向量余弦相似度超过该值视为同一问题")
+    ANSWER_CACHE_MAX_AGE_HOURS: float = Field(default=72, description="缓存答案的最长有效期 (小时)")
+    ANSWER_CACHE_MAX_ENTRIES: int = Field(default=2000, description="答案缓存最多保留的条目数")
+
+    # ==========================
+    # 10. 会话检索工作集
+    # ==========================
+    # 工作集只能在本地复现纯稠密检索：集合带分段向量 (SECTION_VECTORS) 或开启混合检索 (HYBRID_SEARCH) 时，
+    # 多路 RRF 融合每次都要查 Qdrant，工作集不生效。默认配置下两者都开启，追问不会走工作集；
+    # 需要它时用 SECTION_VECTORS=false 新建集合 (或把 SECTION_WEIGHTS 中 title / abstract / intro 设为 0) 并设 HYBRID_SEARCH=false
+    WORKING_SET_POOL_FACTOR: int = Field(default=3, description="首次检索取 top_k 的多少倍候选放进会话工作集")
+    WORKING_SET_DRIFT_THRESHOLD: float = Field(default=0.75, description="追问与会话主题的余弦相似度低于该值时回到 Qdrant 检索")
+    WORKING_SET_MAX_THREADS: int = Field(default=64, description="进程内最多缓存多少个会话的工作集")
+
+    # ==========================
+    # 11. 全文分块索引 (可选)
+    # ==========================
+    # 开启后入库时额外抽取 PDF 文本层切块，写入 {QDRANT_COLLECTION_NAME}_chunks 集合；检索先找论文，再找论文内的片段
+    FULLTEXT_INDEX: bool = Field(default=False, description="是否建立全文分块索引")
+    FULLTEXT_CHUNK_SIZE: int = Field(default=1000, description="分块的最大字符数")
+    FULLTEXT_CHUNK_OVERLAP: int = Field(default=200, description="相邻分块的重叠字符数")
+    FULLTEXT_MAX_PAGES: int = Field(default=30, description="每篇论文最多抽取的页数 (跳过过长的附录)")
+    FULLTEXT_TOP_CHUNKS: int = Field(default=4, description="每次检索追加到上下文的分块数")
+    FULLTEXT_CHUNKS_PER_PAPER: int = Field(default=2, description="同一篇论文最多追加的分块数")
 
 # 实例化并导出
 settings = Settings()
@@ -91,6 +229,11 @@ if __name__ == "__main__":
     print(f"✅ Loaded Settings from {PROJECT_ROOT}")
     print(f"   Agent Model: {settings.AGENT_MODEL_NAME}")
     print(f"   Embedding Model: {settings.EMBEDDING_MODEL_NAME}")
-    print(f"   Qdrant URL: {settings.QDRANT_URL}")
-    if not settings.QDRANT_API_KEY:
-        print("⚠️  Warning: QDRANT_API_KEY is missing! Cloud connection will fail.")
\ No newline at end of file
+    if settings.QDRANT_MODE == "embedded":
+        print(f"   Qdrant: embedded ({settings.QDRANT_EMBEDDED_PATH})")
+    else:
+        print(f"   Qdrant URL: {settings.QDRANT_URL}")
+        if not settings.QDRANT_URL:
+            print("⚠️  Warning: QDRANT_URL is missing! Set it or use QDRANT_MODE=embedded.")
+        elif not settings.QDRANT_API_KEY:
+            print("⚠️  Warning: QDRANT_API_KEY is missing! Cloud connection will fail.")
\ No newline at end of file
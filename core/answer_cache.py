@@ -0,0 +1,158 @@
+"""
+研究助手的语义答案缓存
+key = 问题向量 (余弦相似度超过阈值即命中) + 是否联网 + top_k + 检索档位 + Qdrant 集合版本号
+知识库有任何写入 / 删除，集合版本号 +1，旧答案自动失效
+"""
+
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional, Sequence
+
+import numpy as np
+
+from config.settings import settings
+
+# 命中缓存时加在回答前面的标记
+CACHED_MARKER = "> ⚡ *Cached answer* — 相同问题在知识库未变化期间已回答过，直接返回缓存结果。\n\n"
+
+
+@dataclass
+class CachedAnswer:
+    answer: str        # 含参考文献的完整回答
+    question: str      # 当初被回答的原始问题
+    similarity: float
+    age_seconds: float
+
+
+class AnswerCache:
+    def __init__(
+        self,
+        db_path: Path,
+        threshold: float = 0.95,
+        max_age_hours: float = 72,
+        max_entries: int = 2000
+    ):
+        self.db_path = Path(db_path)
+        self.threshold = threshold
+        self.max_age_seconds = max_age_hours * 3600
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS answer_cache (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    question TEXT NOT NULL,
+                    embedding BLOB NOT NULL,        -- float32, 已归一化
+                    allow_web INTEGER NOT NULL,
+                    top_k INTEGER NOT NULL,
+                    search_mode TEXT NOT NULL DEFAULT 'balanced',
+                    collection_version INTEGER NOT NULL,
+                    answer TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_hit REAL NOT NULL
+                )
+                """
+            )
+            # 旧版本的缓存表没有 search_mode 列 (当时只有 balanced 一种行为)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(answer_cache)")}
+            if "search_mode" not in columns:
+                conn.execute("ALTER TABLE answer_cache ADD COLUMN search_mode TEXT NOT NULL DEFAULT 'balanced'")
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_answer_cache_key "
+                "ON answer_cache (collection_version, allow_web, top_k)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=10)
+
+    @staticmethod
+    def _normalize(vector: Sequence[float]) -> np.ndarray:
+        vec = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm > 0 else vec
+
+    def lookup(
+        self,
+        embedding: Sequence[float],
+        allow_web: bool,
+        top_k: int,
+        collection_version: int,
+        search_mode: str = "balanced"
+    ) -> Optional[CachedAnswer]:
+        """查找足够相似的已回答问题，未命中返回 None"""
+        now = time.time()
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id, question, embedding, answer, created_at FROM answer_cache "
+                "WHERE collection_version = ? AND allow_web = ? AND top_k = ? AND search_mode = ? AND created_at > ?",
+                (collection_version, int(allow_web), top_k, search_mode, now - self.max_age_seconds)
+            ).fetchall()
+
+            best = None
+            if rows:
+                matrix = np.stack([np.frombuffer(row[2], dtype=np.float32) for row in rows])
+                scores = matrix @ self._normalize(embedding)
+                i = int(np.argmax(scores))
+                if scores[i] >= self.threshold:
+                    best = rows[i], float(scores[i])
+                    conn.execute("UPDATE answer_cache SET last_hit = ? WHERE id = ?", (now, rows[i][0]))
+
+        with self._lock:
+            if best:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if not best:
+            return None
+        row, score = best
+        return CachedAnswer(answer=row[3], question=row[1], similarity=score, age_seconds=now - row[4])
+
+    def store(
+        self,
+        question: str,
+        embedding: Sequence[float],
+        allow_web: bool,
+        top_k: int,
+        collection_version: int,
+        answer: str,
+        search_mode: str = "balanced"
+    ):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO answer_cache (question, embedding, allow_web, top_k, search_mode, collection_version, answer, created_at, last_hit) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (question, self._normalize(embedding).tobytes(), int(allow_web), top_k, search_mode, collection_version, answer, now, now)
+            )
+            # 旧版本集合上的答案已经不可能命中，顺手清掉；超过容量按最近命中时间淘汰
+            conn.execute("DELETE FROM answer_cache WHERE collection_version < ?", (collection_version,))
+            conn.execute(
+                "DELETE FROM answer_cache WHERE id IN ("
+                "  SELECT id FROM answer_cache ORDER BY last_hit DESC LIMIT -1 OFFSET ?"
+                ")",
+                (self.max_entries,)
+            )
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM answer_cache")
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+# 单例
+answer_cache = AnswerCache(
+    settings.ANSWER_CACHE_DB,
+    threshold=settings.ANSWER_CACHE_THRESHOLD,
+    max_age_hours=settings.ANSWER_CACHE_MAX_AGE_HOURS,
+    max_entries=settings.ANSWER_CACHE_MAX_ENTRIES
+)
@@ -0,0 +1,206 @@
+"""
+集合配置档基准测试：召回率 vs 延迟 vs 内存
+对每个 (配置档, 截断维度) 组合，把当前集合的 (部分) 数据复制到一个临时集合，用同一批查询向量测
+- recall@k：以完整向量上的精确检索 (exact=True，暴力计算) 结果为标准答案
+- 检索延迟 p50 / p95 (走与线上相同的 core.retriever.search_points)
+- 向量部分的内存估算
+运行: python -m core.benchmark --profiles default scalar binary --points 2000 --queries 50 --k 10
+Matryoshka 截断维度对比: python -m core.benchmark --profiles default --mini-dims 0 128 256 512
+检索档位对比: python -m core.benchmark --profiles scalar --modes fast balanced exhaustive
+"""
+
+import argparse
+import sys
+import time
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import List, Optional, Sequence
+
+import numpy as np
+from qdrant_client import models
+
+# 确保能导入项目模块
+current_file_path = Path(__file__).resolve()
+project_root = current_file_path.parent.parent
+sys.path.append(str(project_root))
+
+from config.settings import settings
+from core.qdrant import COLLECTION_PROFILES, get_profile, qdrant_manager
+from core.retriever import SEARCH_MODES, get_search_mode, normalize, search_points
+from utils.logger import logger
+
+
+@dataclass
+class BenchmarkResult:
+    profile: str
+    mode: str
+    mini_dim: int
+    points: int
+    recall: float
+    p50_ms: float
+    p95_ms: float
+    ram_mb: float
+
+    def format(self) -> str:
+        return (
+            f"{self.profile:<10} {self.mode:<10} {self.mini_dim or 'full':>6} {self.points:>8} {self.recall:>9.3f} "
+            f"{self.p50_ms:>9.1f} {self.p95_ms:>9.1f} {self.ram_mb:>10.1f}"
+        )
+
+
+HEADER = f"{'profile':<10} {'mode':<10} {'dim':>6} {'points':>8} {'recall@k':>9} {'p50 ms':>9} {'p95 ms':>9} {'RAM MB':>10}"
+
+
+def sample_queries(collection_name: str, num_queries: int, noise: float = 0.05, seed: int = 42) -> List[np.ndarray]:
+    """
+    从集合中随机取点的向量加少量噪声作为查询
+    (直接用原向量的话 top-1 必然是它自己，召回率会偏高)
+    """
+    rng = np.random.default_rng(seed)
+    points, _ = qdrant_manager.client.scroll(
+        collection_name=collection_name, limit=max(num_queries * 5, 100), with_vectors=True, with_payload=False
+    )
+    if not points:
+        return []
+    chosen = rng.choice(len(points), size=min(num_queries, len(points)), replace=False)
+    queries = []
+    for i in chosen:
+        vec = normalize(qdrant_manager.full_vector(points[i].vector))
+        queries.append(normalize(vec + rng.normal(0, noise / np.sqrt(len(vec)), size=len(vec))))
+    return queries
+
+
+def ground_truth(collection_name: str, queries: Sequence[np.ndarray], k: int) -> List[set]:
+    """精确检索的 top-k，作为召回率的标准答案"""
+    return [
+        {p.id for p in qdrant_manager.client.query_points(
+            collection_name=collection_name, query=q.tolist(), limit=k,
+            search_params=models.SearchParams(exact=True)
+        ).points}
+        for q in queries
+    ]
+
+
+def wait_for_index(collection_name: str, timeout: float = 600):
+    """等待集合索引 / 量化构建完成 (状态变为 green)"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if qdrant_manager.client.get_collection(collection_name).status == models.CollectionStatus.GREEN:
+            return
+        time.sleep(1)
+    logger.warning(f"⚠️ Collection '{collection_name}' still optimizing after {timeout}s; results may be pessimistic.")
+
+
+def benchmark_profile(
+    profile_name: str,
+    source: str,
+    queries: Sequence[np.ndarray],
+    truth: Sequence[set],
+    k: int,
+    mini_dim: int = 0,
+    num_points: Optional[int] = None,
+    keep: bool = False,
+    modes: Sequence[str] = ("balanced",)
+) -> List[BenchmarkResult]:
+    """
+    :param mini_dim: Matryoshka 截断维度，0 表示只用完整向量 (单阶段检索)
+    :param modes: 在同一个临时集合上依次测试的检索档位
+    """
+    profile = get_profile(profile_name)
+    client = qdrant_manager.client
+    vector_size = qdrant_manager.full_dim(source)
+    bench = f"{qdrant_manager.collection_name}__bench_{profile.name}_{mini_dim}"
+
+    if client.collection_exists(bench):
+        client.delete_collection(bench)
+    # 只测稠密 ANN 的保真度：标准答案是精确稠密检索，不加稀疏 / 分段向量
+    qdrant_manager.create_collection(bench, vector_size, profile, mini_dim=mini_dim, sparse=False, sections=False)
+    try:
+        copied = qdrant_manager.copy_points(source, bench, limit=num_points)
+        wait_for_index(bench)
+
+        results = []
+        for mode_name in modes:
+            # 测的是索引本身：关闭档位的"小集合精确检索"，否则抽样的小集合上各配置档都是精确结果
+            mode = replace(get_search_mode(mode_name), exact_max_points=0)
+            latencies, recalls = [], []
+            for q, expected in zip(queries, truth):
+                t0 = time.perf_counter()
+                points = search_points(q, k, collection_name=bench, profile=profile, mode=mode)
+                latencies.append((time.perf_counter() - t0) * 1000)
+                recalls.append(len({p.document.metadata["_id"] for p in points} & expected) / max(1, len(expected)))
+
+            results.append(BenchmarkResult(
+                profile=profile.name,
+                mode=mode.name,
+                mini_dim=mini_dim,
+                points=copied,
+                recall=float(np.mean(recalls)) if recalls else 0.0,
+                p50_ms=float(np.percentile(latencies, 50)) if latencies else 0.0,
+                p95_ms=float(np.percentile(latencies, 95)) if latencies else 0.0,
+                ram_mb=profile.estimate_ram_bytes(copied, vector_size, mini_dim) / (1024 * 1024)
+            ))
+        return results
+    finally:
+        if not keep:
+            client.delete_collection(bench)
+
+
+def run_benchmark(
+    profiles: Sequence[str],
+    num_points: Optional[int] = None,
+    num_queries: int = 50,
+    k: int = 10,
+    keep: bool = False,
+    mini_dims: Sequence[int] = (settings.EMBEDDING_MINI_DIM,),
+    modes: Sequence[str] = (settings.SEARCH_MODE,)
+) -> List[BenchmarkResult]:
+    """
+    :param num_points: 每个配置档复制多少个点，None 表示全部
+    :param mini_dims: 要对比的截断维度，0 表示单阶段 (只用完整向量)
+    :param modes: 要对比的检索档位 (fast / balanced / exhaustive)
+    :param keep: 是否保留临时集合 (便于在 Qdrant 控制台查看实际内存占用)
+    """
+    source = qdrant_manager.resolve_alias() or qdrant_manager.collection_name
+    queries = sample_queries(source, num_queries)
+    if not queries:
+        raise RuntimeError(f"Collection '{source}' is empty; nothing to benchmark.")
+
+    # 标准答案只在要测试的那部分数据上计算：先复制到一个未量化的精确集合
+    truth_collection = f"{qdrant_manager.collection_name}__bench_truth"
+    client = qdrant_manager.client
+    if client.collection_exists(truth_collection):
+        client.delete_collection(truth_collection)
+    qdrant_manager.create_collection(truth_collection, qdrant_manager.full_dim(source), get_profile("default"), mini_dim=0, sparse=False, sections=False)
+    try:
+        qdrant_manager.copy_points(source, truth_collection, limit=num_points)
+        truth = ground_truth(truth_collection, queries, k)
+    finally:
+        client.delete_collection(truth_collection)
+
+    results = []
+    for name in profiles:
+        for mini_dim in mini_dims:
+            logger.info(f"⏱️ Benchmarking profile '{name}' (mini_dim={mini_dim})...")
+            results.extend(benchmark_profile(
+                name, source, queries, truth, k, mini_dim, num_points=num_points, keep=keep, modes=modes
+            ))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recall vs latency benchmark for Qdrant collection profiles")
+    parser.add_argument("--profiles", nargs="+", default=list(COLLECTION_PROFILES), choices=list(COLLECTION_PROFILES))
+    parser.add_argument("--points", type=int, default=None, help="每个配置档复制的点数 (默认全部)")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--keep", action="store_true", help="保留临时集合")
+    parser.add_argument("--mini-dims", nargs="+", type=int, default=[settings.EMBEDDING_MINI_DIM],
+                        help="要对比的 Matryoshka 截断维度，0 表示只用完整向量")
+    parser.add_argument("--modes", nargs="+", default=[settings.SEARCH_MODE], choices=list(SEARCH_MODES),
+                        help="要对比的检索档位")
+    args = parser.parse_args()
+
+    print(HEADER)
+    for result in run_benchmark(args.profiles, args.points, args.queries, args.k, args.keep, args.mini_dims, args.modes):
+        print(result.format())
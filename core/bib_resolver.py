@@ -0,0 +1,350 @@
+"""
+离线文献元数据解析器
+将书目数据 (DBLP XML / Crossref JSONL / BibTeX) 导入本地 SQLite + FTS5 索引，
+入库时先在本地按标题模糊匹配补全 venue / year，只有本地查不到时才联网 (web_fixer)。
+
+导入:
+    python -m core.bib_resolver import --format dblp dblp.xml.gz
+    python -m core.bib_resolver import --format crossref works.jsonl
+    python -m core.bib_resolver import --format bibtex my_library.bib
+查询:
+    python -m core.bib_resolver lookup "Attention Is All You Need"
+"""
+
+import argparse
+import gzip
+import html.entities
+import json
+import re
+import sqlite3
+import sys
+import xml.etree.ElementTree as ET
+from difflib import SequenceMatcher
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+# 确保能导入项目模块
+current_file_path = Path(__file__).resolve()
+project_root = current_file_path.parent.parent
+sys.path.append(str(project_root))
+
+from config.settings import settings
+from utils.logger import logger
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS papers (
+    id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL,
+    norm_title TEXT NOT NULL,
+    year INTEGER,
+    venue TEXT,
+    authors TEXT,
+    doi TEXT,
+    source TEXT,
+    UNIQUE (norm_title, venue, year)
+);
+CREATE INDEX IF NOT EXISTS idx_papers_norm_title ON papers (norm_title);
+CREATE VIRTUAL TABLE IF NOT EXISTS papers_fts USING fts5 (
+    norm_title, content='papers', content_rowid='id'
+);
+"""
+
+# 预印本来源：匹配到多个版本时优先选择正式发表的版本
+_PREPRINT_MARKERS = ("arxiv", "corr", "preprint", "biorxiv", "medrxiv")
+
+
+def normalize_title(title: str) -> str:
+    """统一大小写、去掉 LaTeX 花括号和标点，用于精确 / 模糊比较"""
+    title = re.sub(r"\\[a-zA-Z]+|[{}$]", "", title or "")
+    title = re.sub(r"[^0-9a-z]+", " ", title.lower())
+    return " ".join(title.split())
+
+
+def is_preprint(venue: Optional[str]) -> bool:
+    venue = (venue or "").lower()
+    return not venue or any(marker in venue for marker in _PREPRINT_MARKERS)
+
+
+def _open_text(path: Path):
+    return gzip.open(path, "rt", encoding="utf-8") if path.suffix == ".gz" else open(path, "r", encoding="utf-8")
+
+
+def _open_binary(path: Path):
+    return gzip.open(path, "rb") if path.suffix == ".gz" else open(path, "rb")
+
+
+def to_year(value: Any) -> Optional[int]:
+    match = re.search(r"(19|20)\d{2}", str(value or ""))
+    return int(match.group(0)) if match else None
+
+
+# ==========================================
+# 书目格式解析器 (均为流式，支持 .gz)
+# ==========================================
+def iter_dblp_xml(path: Path) -> Iterator[Dict[str, Any]]:
+    """解析 DBLP XML dump，只取会议论文和期刊论文"""
+    parser = ET.XMLParser()
+    # dblp.xml 使用 dblp.dtd 中定义的 HTML 实体 (如 &uuml;)，这里直接注入，无需下载 DTD
+    parser.entity.update({name: chr(code) for name, code in html.entities.name2codepoint.items()})
+
+    with _open_binary(path) as f:
+        root, depth = None, 0
+        for event, elem in ET.iterparse(f, events=("start", "end"), parser=parser):
+            if event == "start":
+                if root is None:
+                    root = elem
+                depth += 1
+                continue
+            depth -= 1
+            if depth != 1:
+                continue  # 记录内部的子元素 (author / title ...)，等整条记录结束再处理
+            # <dblp> 的直接子元素 = 一条记录；无论什么类型都清空并从根上摘掉，内存不随文件大小增长
+            if elem.tag in ("inproceedings", "article"):
+                title = "".join(elem.find("title").itertext()) if elem.find("title") is not None else ""
+                venue = elem.findtext("booktitle") or elem.findtext("journal")
+                if title:
+                    yield {
+                        "title": title.rstrip("."),
+                        "year": to_year(elem.findtext("year")),
+                        "venue": venue,
+                        "authors": [a.text for a in elem.findall("author") if a.text],
+                        "doi": None,
+                    }
+            elem.clear()
+            root.clear()
+
+
+def iter_crossref_jsonl(path: Path) -> Iterator[Dict[str, Any]]:
+    """解析 Crossref works JSONL (每行一个 work)"""
+    with _open_text(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                work = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            titles = work.get("title") or []
+            if not titles:
+                continue
+            containers = work.get("short-container-title") or work.get("container-title") or []
+            date_parts = ((work.get("issued") or work.get("published") or {}).get("date-parts") or [[None]])[0]
+            yield {
+                "title": titles[0],
+                "year": to_year(date_parts[0] if date_parts else None),
+                "venue": containers[0] if containers else None,
+                "authors": [
+                    " ".join(filter(None, [a.get("given"), a.get("family")]))
+                    for a in work.get("author", [])
+                ],
+                "doi": work.get("DOI"),
+            }
+
+
+def _bibtex_entries(text: str) -> Iterator[Dict[str, str]]:
+    """极简 BibTeX 解析：支持 {...} 嵌套与 "..." 两种字段值"""
+    for match in re.finditer(r"@(\w+)\s*\{", text):
+        if match.group(1).lower() in ("comment", "preamble", "string"):
+            continue
+        pos = match.end()
+        # 跳过 citation key
+        comma = text.find(",", pos)
+        if comma < 0:
+            break
+        pos = comma + 1
+        fields: Dict[str, str] = {}
+        while pos < len(text):
+            field_match = re.compile(r"\s*(\w[\w-]*)\s*=\s*").match(text, pos)
+            if not field_match:
+                break
+            name = field_match.group(1).lower()
+            pos = field_match.end()
+            if pos < len(text) and text[pos] == "{":
+                depth, start = 0, pos
+                while pos < len(text):
+                    if text[pos] == "{":
+                        depth += 1
+                    elif text[pos] == "}":
+                        depth -= 1
+                        if depth == 0:
+                            break
+                    pos += 1
+                value = text[start + 1:pos]
+                pos += 1
+            elif pos < len(text) and text[pos] == '"':
+                end = text.find('"', pos + 1)
+                value = text[pos + 1:end]
+                pos = end + 1
+            else:
+                value_match = re.compile(r"[^,}\s]+").match(text, pos)
+                value = value_match.group(0) if value_match else ""
+                pos = value_match.end() if value_match else pos
+            # 去掉用于保护大小写的内层花括号，如 {ICLR} / {GAN}
+            fields[name] = " ".join(value.replace("{", "").replace("}", "").split())
+            rest = re.compile(r"\s*,?").match(text, pos)
+            pos = rest.end()
+            if pos < len(text) and text[pos] == "}":
+                break
+        yield fields
+
+
+def iter_bibtex(path: Path) -> Iterator[Dict[str, Any]]:
+    """解析用户提供的 .bib 文件"""
+    with _open_text(path) as f:
+        text = f.read()
+    for fields in _bibtex_entries(text):
+        if not fields.get("title"):
+            continue
+        yield {
+            "title": fields["title"],
+            "year": to_year(fields.get("year")),
+            "venue": fields.get("booktitle") or fields.get("journal") or fields.get("publisher"),
+            "authors": [a.strip() for a in fields.get("author", "").split(" and ") if a.strip()],
+            "doi": fields.get("doi"),
+        }
+
+
+_READERS = {
+    "dblp": iter_dblp_xml,
+    "crossref": iter_crossref_jsonl,
+    "bibtex": iter_bibtex,
+}
+
+
+class BibResolver:
+    """
+    本地书目库
+    - import_records: 批量导入 + 重建 FTS 索引
+    - resolve: 标题精确匹配 -> FTS 候选 + 相似度打分
+    """
+
+    def __init__(self, db_path: Path, min_similarity: float = 0.92):
+        self.db_path = Path(db_path)
+        self.min_similarity = min_similarity
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path)
+        conn.executescript(_SCHEMA)
+        return conn
+
+    @property
+    def available(self) -> bool:
+        return self.db_path.exists()
+
+    def import_records(self, records: Iterable[Dict[str, Any]], source: str, batch_size: int = 10000) -> int:
+        """导入书目记录，返回新增条数"""
+        conn = self._connect()
+        before = conn.execute("SELECT COUNT(*) FROM papers").fetchone()[0]
+        rows: List[tuple] = []
+
+        def flush():
+            conn.executemany(
+                "INSERT OR IGNORE INTO papers (title, norm_title, year, venue, authors, doi, source) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            conn.commit()
+            rows.clear()
+
+        for rec in records:
+            norm = normalize_title(rec["title"])
+            if not norm:
+                continue
+            rows.append((
+                rec["title"], norm, rec.get("year"), rec.get("venue"),
+                json.dumps(rec.get("authors") or [], ensure_ascii=False), rec.get("doi"), source
+            ))
+            if len(rows) >= batch_size:
+                flush()
+                logger.info(f"   📥 Imported {conn.execute('SELECT COUNT(*) FROM papers').fetchone()[0] - before} records...")
+        flush()
+
+        logger.info("   🗂️ Rebuilding full-text index...")
+        conn.execute("INSERT INTO papers_fts (papers_fts) VALUES ('rebuild')")
+        conn.commit()
+        added = conn.execute("SELECT COUNT(*) FROM papers").fetchone()[0] - before
+        conn.close()
+        logger.info(f"✅ Imported {added} new records from {source}")
+        return added
+
+    def import_file(self, path: str, fmt: str) -> int:
+        if fmt not in _READERS:
+            raise ValueError(f"Unknown bibliography format: {fmt} (choose from {list(_READERS)})")
+        path = Path(path)
+        logger.info(f"📚 Importing {fmt} bibliography from {path}...")
+        return self.import_records(_READERS[fmt](path), source=f"{fmt}:{path.name}")
+
+    def _candidates(self, conn: sqlite3.Connection, norm: str, limit: int = 20) -> List[sqlite3.Row]:
+        rows = conn.execute("SELECT * FROM papers WHERE norm_title = ?", (norm,)).fetchall()
+        if rows:
+            return rows
+        # FTS5: 任意词命中即召回，按 bm25 排序后再用字符串相似度精排
+        tokens = [t for t in norm.split() if len(t) > 2] or norm.split()
+        query = " OR ".join(f'"{t}"' for t in tokens[:32])
+        return conn.execute(
+            "SELECT papers.* FROM papers_fts JOIN papers ON papers.id = papers_fts.rowid "
+            "WHERE papers_fts MATCH ? ORDER BY bm25(papers_fts) LIMIT ?",
+            (query, limit)
+        ).fetchall()
+
+    def resolve(self, title: str) -> Optional[Dict[str, Any]]:
+        """
+        按标题查找论文的正式发表信息
+        :return: {"title", "venue", "year", "authors", "doi", "similarity"} 或 None
+        """
+        norm = normalize_title(title)
+        if not norm or not self.available:
+            return None
+
+        conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
+        conn.row_factory = sqlite3.Row
+        try:
+            candidates = self._candidates(conn, norm)
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ Offline bibliography lookup failed: {e}")
+            return None
+        finally:
+            conn.close()
+
+        scored = []
+        for row in candidates:
+            similarity = SequenceMatcher(None, norm, row["norm_title"]).ratio()
+            if similarity >= self.min_similarity:
+                # 相似度相同时：正式发表 > 预印本，新版本 > 旧版本
+                scored.append((similarity, not is_preprint(row["venue"]), row["year"] or 0, row))
+        if not scored:
+            return None
+
+        similarity, _, _, best = max(scored, key=lambda x: x[:3])
+        return {
+            "title": best["title"],
+            "venue": best["venue"],
+            "year": best["year"],
+            "authors": json.loads(best["authors"] or "[]"),
+            "doi": best["doi"],
+            "similarity": round(similarity, 3),
+        }
+
+
+# 单例
+bib_resolver = BibResolver(settings.BIBLIOGRAPHY_DB)
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Offline bibliography resolver")
+    sub = arg_parser.add_subparsers(dest="command", required=True)
+
+    import_cmd = sub.add_parser("import", help="Import a bibliography dump")
+    import_cmd.add_argument("path")
+    import_cmd.add_argument("--format", choices=sorted(_READERS), required=True)
+
+    lookup_cmd = sub.add_parser("lookup", help="Look up a paper title")
+    lookup_cmd.add_argument("title")
+
+    args = arg_parser.parse_args()
+    if args.command == "import":
+        bib_resolver.import_file(args.path, args.format)
+    else:
+        result = bib_resolver.resolve(args.title)
+        print(json.dumps(result, ensure_ascii=False, indent=2) if result else "❌ Not found")
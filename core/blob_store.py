@@ -0,0 +1,67 @@
+"""
+Blob 存储模块
+将渲染后的页面图片等大对象落盘，Graph State / Checkpoint 中只保存轻量的引用 (key)
+"""
+
+import base64
+import hashlib
+from pathlib import Path
+from typing import Iterable
+
+from config.settings import settings
+from utils.logger import logger
+
+
+class BlobStore:
+    """
+    基于本地文件系统的内容寻址存储
+    key 为内容的 sha256，相同内容只存一份
+    """
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key: str) -> Path:
+        # 两级目录，避免单目录下文件过多
+        return self.root / key[:2] / key
+
+    def put(self, data: bytes) -> str:
+        """写入数据，返回引用 key"""
+        key = hashlib.sha256(data).hexdigest()
+        path = self._path(key)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(".tmp")
+            tmp_path.write_bytes(data)
+            tmp_path.replace(path)  # 原子替换，防止读到写了一半的文件
+        return key
+
+    def get(self, key: str) -> bytes:
+        path = self._path(key)
+        if not path.exists():
+            raise KeyError(f"Blob not found: {key}")
+        return path.read_bytes()
+
+    def get_b64(self, key: str) -> str:
+        """读取并转为 Base64 字符串 (供视觉模型使用)"""
+        return base64.b64encode(self.get(key)).decode("utf-8")
+
+    def exists(self, key: str) -> bool:
+        return self._path(key).exists()
+
+    def delete(self, keys: Iterable[str]) -> int:
+        """删除一批 blob，返回实际删除的数量"""
+        removed = 0
+        for key in keys:
+            path = self._path(key)
+            if path.exists():
+                path.unlink()
+                removed += 1
+        if removed:
+            logger.info(f"🧹 Removed {removed} blobs from {self.root}")
+        return removed
+
+
+# 单例
+blob_store = BlobStore(settings.BLOB_DIR)
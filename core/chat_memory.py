@@ -0,0 +1,162 @@
+"""
+窗口化对话记忆
+- 最近 N 轮对话原样保留
+- 更早的对话由后台线程增量合并进滚动摘要，持久化在 SQLite (按 thread_id)
+"""
+
+import sqlite3
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import yaml
+from langchain_core.messages import AnyMessage, HumanMessage, SystemMessage
+
+from config.settings import settings
+from core.llm import get_extractor_llm
+from utils.logger import logger
+
+# Writer 在回答末尾追加的参考文献区块，存入对话历史前去掉
+REFERENCES_MARKER = "\n\n---\n### 📚 References"
+
+
+def strip_references(text: str) -> str:
+    """去掉回答末尾的参考文献样板"""
+    return text.split(REFERENCES_MARKER, 1)[0].rstrip()
+
+
+def format_turns(messages: Sequence[AnyMessage]) -> str:
+    lines = []
+    for msg in messages:
+        role = "User" if isinstance(msg, HumanMessage) else "Assistant"
+        lines.append(f"{role}: {strip_references(msg.content)}")
+    return "\n".join(lines)
+
+
+def split_window(history: Sequence[AnyMessage], window_turns: int) -> Tuple[List[AnyMessage], List[AnyMessage]]:
+    """
+    按轮次切分历史消息 (一轮 = 一条用户消息及其后的回复)
+    :return: (滑出窗口的旧消息, 窗口内的最近消息)
+    """
+    human_positions = [i for i, msg in enumerate(history) if isinstance(msg, HumanMessage)]
+    if window_turns <= 0:
+        return list(history), []
+    if len(human_positions) <= window_turns:
+        return [], list(history)
+    start = human_positions[-window_turns]
+    return list(history[:start]), list(history[start:])
+
+
+class ChatMemory:
+    """
+    用法:
+        summary, recent = chat_memory.load(thread_id, history)   # 构造 Prompt
+        chat_memory.schedule_update(thread_id, history)          # 回答后后台更新摘要
+    """
+
+    def __init__(self, db_path: Path, window_turns: int = 3):
+        self.db_path = Path(db_path)
+        self.window_turns = window_turns
+        # 单线程执行器：同一会话的摘要更新按顺序进行，不会互相覆盖
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="chat-memory")
+        self._pending: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._prompt_cfg = None
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS conversation_summary (
+                    thread_id TEXT PRIMARY KEY,
+                    summary TEXT NOT NULL,
+                    covered INTEGER NOT NULL  -- 摘要已覆盖的消息条数 (从头开始计)
+                )
+                """
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=10)
+
+    def _prompt(self) -> dict:
+        if self._prompt_cfg is None:
+            with open(settings.PROMPTS_DIR / "research.yaml", "r", encoding="utf-8") as f:
+                self._prompt_cfg = yaml.safe_load(f)["summarize_history"]
+        return self._prompt_cfg
+
+    # ---------- 读 ----------
+    def get_summary(self, thread_id: str) -> Tuple[str, int]:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT summary, covered FROM conversation_summary WHERE thread_id = ?", (thread_id,)
+            ).fetchone()
+        return (row[0], row[1]) if row else ("", 0)
+
+    def load(self, thread_id: str, history: Sequence[AnyMessage]) -> Tuple[str, List[AnyMessage]]:
+        """
+        :param history: 不含当前问题的历史消息
+        :return: (旧对话摘要, 窗口内的最近消息)
+        如果后台摘要还没追上，窗口外未被覆盖的消息会并入 recent，保证不丢上下文
+        """
+        older, recent = split_window(history, self.window_turns)
+        summary, covered = self.get_summary(thread_id)
+        if covered < len(older):
+            recent = list(older[covered:]) + recent
+        return summary, recent
+
+    # ---------- 写 ----------
+    def _update(self, thread_id: str, history: Sequence[AnyMessage]):
+        older, _ = split_window(history, self.window_turns)
+        summary, covered = self.get_summary(thread_id)
+        new_messages = older[covered:]
+        if not new_messages:
+            return
+
+        prompt_cfg = self._prompt()
+        messages = [
+            SystemMessage(content=prompt_cfg["system"]),
+            HumanMessage(content=prompt_cfg["user"].format(
+                summary=summary or "(无)",
+                new_turns=format_turns(new_messages)
+            ))
+        ]
+        try:
+            new_summary = get_extractor_llm().invoke(messages).content.strip()
+        except Exception as e:
+            logger.error(f"❌ Summary update failed for {thread_id}: {e}")
+            return
+
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO conversation_summary (thread_id, summary, covered) VALUES (?, ?, ?)",
+                (thread_id, new_summary, len(older))
+            )
+        logger.info(f"🧠 Summary updated for {thread_id}: {len(older)} messages covered")
+
+    def schedule_update(self, thread_id: str, history: Sequence[AnyMessage]) -> Optional[Future]:
+        """把滑出窗口的旧消息提交给后台线程合并进摘要"""
+        older, _ = split_window(history, self.window_turns)
+        if len(older) <= self.get_summary(thread_id)[1]:
+            return None
+        future = self._executor.submit(self._update, thread_id, list(history))
+        with self._lock:
+            self._pending[thread_id] = future
+        return future
+
+    def wait(self, thread_id: str, timeout: Optional[float] = None):
+        """等待某个会话的后台摘要完成 (测试 / 退出前使用)"""
+        with self._lock:
+            future = self._pending.get(thread_id)
+        if future:
+            future.result(timeout=timeout)
+
+    def delete(self, thread_id: Optional[str] = None):
+        """删除某个会话的摘要；thread_id 为空时清空全部"""
+        with self._connect() as conn:
+            if thread_id is None:
+                conn.execute("DELETE FROM conversation_summary")
+            else:
+                conn.execute("DELETE FROM conversation_summary WHERE thread_id = ?", (thread_id,))
+
+
+# 单例
+chat_memory = ChatMemory(settings.CHAT_MEMORY_DB, window_turns=settings.CHAT_MEMORY_WINDOW_TURNS)
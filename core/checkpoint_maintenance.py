@@ -0,0 +1,306 @@
+"""
+Research Checkpoint 数据库维护
+- 每个会话只保留最近 N 个 Checkpoint (及其 writes)
+- 长期不活跃的会话整体压缩归档到冷存储，打开时再恢复
+- WAL checkpoint + 增量 VACUUM，把删除腾出的空间还给文件系统
+- 顺带清理 doc_store 中超过保存期限的联网结果 / 上传论文摘要
+维护在后台守护线程里分小批执行，每批一个短事务，不阻塞正在进行的对话
+"""
+
+import base64
+import gzip
+import json
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional, Sequence
+
+from config.settings import settings
+from core.doc_store import doc_store
+from core.thread_catalog import thread_catalog
+from utils.logger import logger
+
+CHECKPOINT_TABLES = ("checkpoints", "writes")
+DELETE_BATCH_SIZE = 500  # 每个删除事务最多处理的行数，控制写锁持有时间
+# 切换到增量 auto_vacuum 需要一次完整 VACUUM (重写整个文件并独占数据库)：
+# 后台线程只对不超过该大小的数据库自动切换，更大的数据库请在空闲时手动执行 (见 __main__)
+AUTO_CONVERT_MAX_BYTES = 64 * 1024 * 1024
+
+
+@dataclass
+class MaintenanceReport:
+    size_before: int = 0
+    size_after: int = 0
+    pruned_checkpoints: int = 0
+    pruned_writes: int = 0
+    archived_threads: int = 0
+    pruned_documents: int = 0
+    seconds: float = 0.0
+
+    def format(self) -> str:
+        mb = 1024 * 1024
+        return (
+            f"{self.size_before / mb:.2f} MB -> {self.size_after / mb:.2f} MB | "
+            f"pruned {self.pruned_checkpoints} checkpoints / {self.pruned_writes} writes | "
+            f"archived {self.archived_threads} threads | pruned {self.pruned_documents} documents | {self.seconds:.1f}s"
+        )
+
+
+def _encode_row(row: sqlite3.Row) -> Dict:
+    return {k: ({"__b64__": base64.b64encode(row[k]).decode("ascii")} if isinstance(row[k], bytes) else row[k]) for k in row.keys()}
+
+
+def _decode_value(value):
+    if isinstance(value, dict) and "__b64__" in value:
+        return base64.b64decode(value["__b64__"])
+    return value
+
+
+class CheckpointMaintainer:
+    def __init__(
+        self,
+        db_path: Path,
+        archive_dir: Path,
+        keep_last: int = 10,
+        archive_after_days: float = 30,
+        interval_seconds: float = 3600,
+        doc_retention_days: float = 0
+    ):
+        self.db_path = Path(db_path)
+        self.archive_dir = Path(archive_dir)
+        self.keep_last = keep_last
+        self.archive_after_days = archive_after_days
+        self.interval_seconds = interval_seconds
+        self.doc_retention_days = doc_retention_days
+        self._run_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._convert_hinted = False
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _has_tables(self, conn: sqlite3.Connection) -> bool:
+        rows = conn.execute(
+            "SELECT name FROM sqlite_master WHERE type='table' AND name IN ('checkpoints', 'writes')"
+        ).fetchall()
+        return len(rows) == len(CHECKPOINT_TABLES)
+
+    # ---------- 尺寸 ----------
+    def db_size(self) -> int:
+        """数据库文件 + WAL 文件的总字节数"""
+        return sum(p.stat().st_size for p in (self.db_path, Path(f"{self.db_path}-wal")) if p.exists())
+
+    # ---------- 删除 ----------
+    def _delete_rowids(self, conn: sqlite3.Connection, table: str, rowids: Sequence[int]) -> int:
+        deleted = 0
+        for i in range(0, len(rowids), DELETE_BATCH_SIZE):
+            batch = rowids[i:i + DELETE_BATCH_SIZE]
+            with conn:
+                deleted += conn.execute(
+                    f"DELETE FROM {table} WHERE rowid IN ({','.join('?' * len(batch))})", batch
+                ).rowcount
+        return deleted
+
+    def delete_threads(self, thread_ids: Optional[Sequence[str]] = None):
+        """
+        删除会话的全部 Checkpoint；thread_ids 为空时清空全部
+        两张表的主键都以 thread_id 开头，按会话删除走索引
+        """
+        if not self.db_path.exists():
+            return
+        with self._connect() as conn:
+            if not self._has_tables(conn):
+                return
+            for table in CHECKPOINT_TABLES:
+                if thread_ids is None:
+                    conn.execute(f"DELETE FROM {table}")
+                else:
+                    conn.executemany(f"DELETE FROM {table} WHERE thread_id = ?", [(t,) for t in thread_ids])
+        # 空间回收交给后台维护线程
+        self.request_run()
+
+    def prune(self, keep_last: Optional[int] = None) -> Dict[str, int]:
+        """每个 (thread_id, checkpoint_ns) 只保留最近 keep_last 个 Checkpoint，并删除孤立的 writes"""
+        keep_last = keep_last or self.keep_last
+        with self._connect() as conn:
+            if not self._has_tables(conn):
+                return {"checkpoints": 0, "writes": 0}
+            # checkpoint_id 是按时间递增的 UUID6，倒序即最新优先
+            stale = [row[0] for row in conn.execute(
+                """
+                SELECT rowid FROM (
+                    SELECT rowid, ROW_NUMBER() OVER (
+                        PARTITION BY thread_id, checkpoint_ns ORDER BY checkpoint_id DESC
+                    ) AS rn
+                    FROM checkpoints
+                ) WHERE rn > ?
+                """,
+                (keep_last,)
+            )]
+            pruned_checkpoints = self._delete_rowids(conn, "checkpoints", stale)
+
+            orphaned = [row[0] for row in conn.execute(
+                """
+                SELECT w.rowid FROM writes w
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM checkpoints c
+                    WHERE c.thread_id = w.thread_id AND c.checkpoint_ns = w.checkpoint_ns AND c.checkpoint_id = w.checkpoint_id
+                )
+                """
+            )]
+            pruned_writes = self._delete_rowids(conn, "writes", orphaned)
+        return {"checkpoints": pruned_checkpoints, "writes": pruned_writes}
+
+    # ---------- 归档 ----------
+    def _archive_path(self, thread_id: str) -> Path:
+        return self.archive_dir / f"{thread_id}.json.gz"
+
+    def archive_thread(self, thread_id: str) -> bool:
+        """把一个会话的 Checkpoint 导出为 gzip JSON 并从数据库删除"""
+        with self._connect() as conn:
+            if not self._has_tables(conn):
+                return False
+            dump = {
+                table: [_encode_row(row) for row in conn.execute(f"SELECT * FROM {table} WHERE thread_id = ?", (thread_id,))]
+                for table in CHECKPOINT_TABLES
+            }
+            if not dump["checkpoints"]:
+                return False
+
+            self.archive_dir.mkdir(parents=True, exist_ok=True)
+            path = self._archive_path(thread_id)
+            tmp = path.with_suffix(".tmp")
+            with gzip.open(tmp, "wt", encoding="utf-8") as f:
+                json.dump(dump, f)
+            tmp.replace(path)  # 先落盘成功，再删除数据库中的行
+
+            with conn:
+                for table in CHECKPOINT_TABLES:
+                    conn.execute(f"DELETE FROM {table} WHERE thread_id = ?", (thread_id,))
+        thread_catalog.set_archived(thread_id, True)
+        return True
+
+    def archive_idle(self, archive_after_days: Optional[float] = None) -> int:
+        days = archive_after_days if archive_after_days is not None else self.archive_after_days
+        if days <= 0:
+            return 0
+        archived = 0
+        for thread_id in thread_catalog.idle_threads(time.time() - days * 86400):
+            try:
+                archived += self.archive_thread(thread_id)
+            except Exception as e:
+                logger.error(f"❌ Failed to archive thread {thread_id}: {e}")
+        return archived
+
+    def restore_thread(self, thread_id: str) -> bool:
+        """从冷存储恢复会话 (打开已归档的会话时调用)"""
+        path = self._archive_path(thread_id)
+        if not path.exists():
+            thread_catalog.set_archived(thread_id, False)
+            return False
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            dump = json.load(f)
+        with self._connect() as conn:
+            for table in CHECKPOINT_TABLES:
+                for row in dump.get(table, []):
+                    columns = list(row)
+                    conn.execute(
+                        f"INSERT OR IGNORE INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                        [_decode_value(row[c]) for c in columns]
+                    )
+        path.unlink()
+        thread_catalog.set_archived(thread_id, False)
+        logger.info(f"📦 Restored archived thread {thread_id}")
+        return True
+
+    def drop_archive(self, thread_id: Optional[str] = None):
+        """删除归档文件；thread_id 为空时删除全部"""
+        paths = [self._archive_path(thread_id)] if thread_id else self.archive_dir.glob("*.json.gz")
+        for path in paths:
+            path.unlink(missing_ok=True)
+
+    # ---------- 空间回收 ----------
+    def compact(self, convert: bool = False):
+        """
+        WAL checkpoint + 增量 VACUUM
+        :param convert: 数据库还不是增量 auto_vacuum 时，是否不论大小都做一次完整 VACUUM 完成切换
+        """
+        with self._connect() as conn:
+            # auto_vacuum 只能在 VACUUM 时切换：小数据库直接切换，大数据库只在显式要求时切换，
+            # 否则跳过 (incremental_vacuum 在非增量模式下是空操作，只剩 WAL checkpoint)
+            if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+                if convert or self.db_size() <= AUTO_CONVERT_MAX_BYTES:
+                    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+                    conn.execute("VACUUM")
+                elif not self._convert_hinted:
+                    self._convert_hinted = True
+                    logger.warning(
+                        f"⚠️ {self.db_path.name} is too large to switch to incremental auto_vacuum in the background. "
+                        "Run `python -m core.checkpoint_maintenance vacuum` while the app is idle."
+                    )
+            # incremental_vacuum 每 step 释放一页，execute() 不会把它执行完，要用 executescript
+            conn.executescript("PRAGMA incremental_vacuum;")
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+
+    # ---------- 调度 ----------
+    def run_once(self, convert: bool = False) -> MaintenanceReport:
+        """:param convert: 见 compact()"""
+        with self._run_lock:
+            t0 = time.perf_counter()
+            report = MaintenanceReport(size_before=self.db_size())
+            if self.db_path.exists():
+                pruned = self.prune()
+                report.pruned_checkpoints, report.pruned_writes = pruned["checkpoints"], pruned["writes"]
+                report.archived_threads = self.archive_idle()
+                self.compact(convert)
+            if self.doc_retention_days > 0:
+                report.pruned_documents = doc_store.prune(self.doc_retention_days * 86400)
+            report.size_after = self.db_size()
+            report.seconds = time.perf_counter() - t0
+        logger.info(f"🧹 Checkpoint maintenance: {report.format()}")
+        return report
+
+    def _loop(self):
+        while True:
+            self._wakeup.wait(timeout=self.interval_seconds)
+            self._wakeup.clear()
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"❌ Checkpoint maintenance failed: {e}")
+
+    def start(self):
+        """启动后台维护线程 (守护线程，重复调用无副作用)"""
+        if self.interval_seconds <= 0 or (self._thread and self._thread.is_alive()):
+            return
+        self._thread = threading.Thread(target=self._loop, name="checkpoint-maintenance", daemon=True)
+        self._thread.start()
+        self.request_run()  # 启动后先跑一轮
+
+    def request_run(self):
+        """唤醒后台线程立即维护一次 (例如清空历史之后)"""
+        self._wakeup.set()
+
+
+# 单例
+checkpoint_maintainer = CheckpointMaintainer(
+    db_path=settings.CHECKPOINT_DB_PATH,
+    archive_dir=settings.CHECKPOINT_ARCHIVE_DIR,
+    keep_last=settings.CHECKPOINT_KEEP_LAST,
+    archive_after_days=settings.CHECKPOINT_ARCHIVE_AFTER_DAYS,
+    interval_seconds=settings.CHECKPOINT_MAINTENANCE_INTERVAL,
+    doc_retention_days=settings.DOC_STORE_RETENTION_DAYS
+)
+
+
+if __name__ == "__main__":
+    # 运行: python -m core.checkpoint_maintenance  (手动执行一轮维护)
+    # 大数据库首次切换到增量 auto_vacuum (完整 VACUUM，请在空闲时执行): python -m core.checkpoint_maintenance vacuum
+    import sys
+
+    print(checkpoint_maintainer.run_once(convert=sys.argv[1:] == ["vacuum"]).format())
@@ -0,0 +1,120 @@
+"""
+线程安全的 SQLite Checkpointer
+官方 SqliteSaver 只持有一个连接，所有读写都串行在一把全局锁上；
+Streamlit 的每个会话跑在各自的线程里，多个会话同时对话时会互相阻塞甚至报 "database is locked"。
+
+PooledSqliteSaver 改为连接池：
+- WAL 模式：读写互不阻塞，多个读者可以并发
+- busy_timeout：写写冲突时由 SQLite 等待重试，而不是立刻报错
+- 每次 cursor() 从池里借一个连接，用完归还；同一线程内嵌套调用复用同一个连接
+"""
+
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+from langgraph.checkpoint.serde.base import SerializerProtocol
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+from config.settings import settings
+
+
+class PooledSqliteSaver(SqliteSaver):
+    def __init__(
+        self,
+        db_path: Path,
+        pool_size: int = settings.CHECKPOINT_POOL_SIZE,
+        busy_timeout_ms: int = settings.SQLITE_BUSY_TIMEOUT_MS,
+        *,
+        serde: Optional[SerializerProtocol] = None
+    ):
+        self.db_path = Path(db_path)
+        self.pool_size = max(1, pool_size)
+        self.busy_timeout_ms = busy_timeout_ms
+        self._pool: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._created = 0
+        self._pool_lock = threading.Lock()
+        self._setup_lock = threading.Lock()
+        self._local = threading.local()
+        super().__init__(self._new_connection(), serde=serde)
+        # 父类的 self.conn 只在池外使用 (例如 setup)，这里把它也放进池里复用
+        self._pool.put(self._fallback_conn)
+        self._created = 1
+
+    # ---------- 连接管理 ----------
+    def _new_connection(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.db_path,
+            check_same_thread=False,  # 连接会在线程间借用，但同一时刻只属于一个线程
+            timeout=self.busy_timeout_ms / 1000
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+        conn.execute("PRAGMA synchronous=NORMAL")  # WAL 下 NORMAL 已足够安全，写入更快
+        return conn
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """当前线程借到的连接；不在 cursor() 中时返回池外的默认连接"""
+        stack: List[sqlite3.Connection] = getattr(self._local, "stack", None)
+        if stack:
+            return stack[-1]
+        return self._fallback_conn
+
+    @conn.setter
+    def conn(self, value: sqlite3.Connection):
+        # 父类 __init__ 会赋值 self.conn
+        self._fallback_conn = value
+
+    def _acquire(self) -> sqlite3.Connection:
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            pass
+        with self._pool_lock:
+            if self._created < self.pool_size:
+                self._created += 1
+                return self._new_connection()
+        return self._pool.get()  # 池满：等待其它线程归还
+
+    def setup(self) -> None:
+        if self.is_setup:
+            return
+        with self._setup_lock:
+            super().setup()
+
+    @contextmanager
+    def cursor(self, transaction: bool = True) -> Iterator[sqlite3.Cursor]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+
+        # 同一线程内嵌套调用 (例如 list() 迭代过程中再 get_tuple) 复用已借到的连接
+        reuse = bool(stack)
+        conn = stack[-1] if reuse else self._acquire()
+        stack.append(conn)
+        try:
+            self.setup()
+            cur = conn.cursor()
+            try:
+                yield cur
+            finally:
+                if transaction:
+                    conn.commit()
+                cur.close()
+        finally:
+            stack.pop()
+            if not reuse:
+                self._pool.put(conn)
+
+    def close(self):
+        """关闭池中所有空闲连接"""
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+
@@ -0,0 +1,186 @@
+"""
+全文分块索引 (可选，FULLTEXT_INDEX)
+主集合里一篇论文只有一个摘要点，回答不了实验设置 / 具体数值这类细节问题。
+开启后入库时额外抽取 PDF 文本层，用 core.text_splitter 切块并批量 Embedding，
+写入独立的分块集合 ({主集合名}_chunks)，每个分块的 metadata.paper_id 指向主集合中的论文点
+检索分两级：先在主集合找论文，再在这些论文的分块里找最相关的片段
+"""
+
+import hashlib
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.documents import Document
+from qdrant_client import models
+
+from config.settings import settings
+from core.ingest_sink import BatchIngestionSink
+from core.pdf_loader import load_pdf_text
+from core.qdrant import qdrant_manager
+from core.retriever import SearchFilters, SearchMode, search_points
+from core.text_splitter import get_text_splitter
+from utils.logger import logger
+
+CHUNK_CONTENT_TYPE = "fulltext_chunk"
+# 分块继承的论文元数据 (渲染参考文献 + 结构化过滤)
+INHERITED_FIELDS = ("title", "year", "venue", "authors")
+# 页眉 / 页码 / 孤立公式等碎片不值得单独入库
+MIN_CHUNK_CHARS = 80
+
+
+def paper_point_id(pdf_path: str) -> str:
+    """
+    论文在主集合中的 point id：按 PDF 文件内容生成 uuid5
+    分块靠它关联到论文；同一文件重复入库会覆盖原有的点，而不是多出一条
+    """
+    try:
+        digest = hashlib.sha256(Path(pdf_path).read_bytes()).hexdigest()
+    except OSError:
+        digest = str(pdf_path)
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"academic-agent/paper/{digest}"))
+
+
+class ChunkIndex:
+    def __init__(
+        self,
+        collection_name: Optional[str] = None,
+        chunk_size: int = 1000,
+        chunk_overlap: int = 200,
+        max_pages: Optional[int] = None
+    ):
+        """
+        :param collection_name: 分块集合名，默认 {QDRANT_COLLECTION_NAME}_chunks
+        :param max_pages: 每篇论文最多抽取的页数，None 表示全部
+        """
+        self.collection_name = collection_name or f"{settings.QDRANT_COLLECTION_NAME}_chunks"
+        self.splitter = get_text_splitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+        self.max_pages = max_pages
+        self.sink = BatchIngestionSink(collection_name=self.collection_name)
+        self._ready = False
+
+    # ---------- 集合 ----------
+    def exists(self) -> bool:
+        if not self._ready:
+            self._ready = qdrant_manager.client.collection_exists(self.collection_name)
+        return self._ready
+
+    def ensure_collection(self, vector_size: int):
+        """分块集合沿用当前配置档 / 截断维度 / 稀疏向量，不带分段向量 (分块没有标题 / 摘要之分)"""
+        if self.exists():
+            return
+        qdrant_manager.create_collection(self.collection_name, vector_size, sections=False)
+        self._ready = True
+        logger.info(f"✅ Chunk collection '{self.collection_name}' created (size={vector_size})")
+
+    # ---------- 入库 ----------
+    def split_paper(self, paper_id: str, pdf_path: str, metadata: Dict[str, Any]) -> List[Document]:
+        """按页切块 (分块不跨页，便于在参考文献里标注页码)"""
+        inherited = {k: metadata[k] for k in INHERITED_FIELDS if metadata.get(k) not in (None, "", [])}
+        docs = []
+        for page_no, text in enumerate(load_pdf_text(pdf_path, self.max_pages), start=1):
+            for chunk in self.splitter.split_text(text):
+                chunk = chunk.strip()
+                if len(chunk) < MIN_CHUNK_CHARS:
+                    continue
+                docs.append(Document(
+                    page_content=chunk,
+                    metadata={
+                        **inherited,
+                        "paper_id": paper_id,
+                        "chunk_index": len(docs),
+                        "page": page_no,
+                        "source": str(pdf_path),
+                        "content_type": CHUNK_CONTENT_TYPE
+                    }
+                ))
+        return docs
+
+    def delete_papers(self, paper_ids: Sequence[str]):
+        """删除这些论文已有的分块 (重新入库时分块数可能变少，只覆盖会留下旧分块)"""
+        if not paper_ids or not self.exists():
+            return
+        qdrant_manager.client.delete(
+            collection_name=self.collection_name,
+            points_selector=models.FilterSelector(filter=SearchFilters(paper_ids=list(paper_ids)).to_qdrant()),
+            wait=True
+        )
+
+    def index_papers(self, papers: Sequence[Tuple[str, str, Dict[str, Any]]]) -> int:
+        """
+        抽取文本 -> 切块 -> 批量 Embedding -> 写入分块集合
+        :param papers: [(paper_id, pdf_path, metadata), ...]，多篇论文的分块一起攒批请求 Embedding
+        :return: 写入的分块数
+        """
+        docs: List[Document] = []
+        for paper_id, pdf_path, metadata in papers:
+            chunks = self.split_paper(paper_id, pdf_path, metadata)
+            if not chunks:
+                logger.warning(f"⚠️ No text layer in {pdf_path} (scanned PDF?). Skipping full-text index.")
+            docs.extend(chunks)
+
+        self.delete_papers([paper_id for paper_id, _, _ in papers])
+        if not docs:
+            return 0
+        vectors = self.sink.embed_documents(docs)
+        self.ensure_collection(len(vectors[0]))
+        self.sink.upsert_points(self.sink.make_points(docs, vectors, [
+            str(uuid.uuid5(uuid.UUID(doc.metadata["paper_id"]), str(doc.metadata["chunk_index"]))) for doc in docs
+        ]))
+        logger.info(f"📑 Indexed {len(docs)} full-text chunks for {len(papers)} papers.")
+        return len(docs)
+
+    # ---------- 检索 ----------
+    def search(
+        self,
+        query_vector: Sequence[float],
+        paper_ids: Sequence[str],
+        limit: int = 4,
+        per_paper: int = 2,
+        query_text: Optional[str] = None,
+        mode: Optional[SearchMode] = None
+    ) -> List[Document]:
+        """
+        第二级检索：只在给定论文的分块里找最相关的片段
+        :param per_paper: 同一篇论文最多取几个分块，避免上下文被一篇论文占满
+        """
+        if not paper_ids or not self.exists():
+            return []
+        points = search_points(
+            query_vector,
+            limit=limit * per_paper,
+            collection_name=self.collection_name,
+            filters=SearchFilters(paper_ids=[str(pid) for pid in paper_ids]),
+            query_text=query_text,
+            mode=mode
+        )
+        chunks, taken = [], {}
+        for point in points:
+            paper_id = point.document.metadata.get("paper_id")
+            if taken.get(paper_id, 0) >= per_paper:
+                continue
+            taken[paper_id] = taken.get(paper_id, 0) + 1
+            chunks.append(point.document)
+            if len(chunks) >= limit:
+                break
+        return chunks
+
+
+# 单例
+chunk_index = ChunkIndex(
+    chunk_size=settings.FULLTEXT_CHUNK_SIZE,
+    chunk_overlap=settings.FULLTEXT_CHUNK_OVERLAP,
+    max_pages=settings.FULLTEXT_MAX_PAGES
+)
+
+
+if __name__ == "__main__":
+    # 运行: python -m core.chunk_index path/to/paper.pdf  (只切块，不写入 Qdrant)
+    import sys
+
+    pdf = sys.argv[1]
+    pid = paper_point_id(pdf)
+    chunks = chunk_index.split_paper(pid, pdf, {"title": Path(pdf).stem})
+    print(f"paper_id={pid}, {len(chunks)} chunks")
+    for chunk in chunks[:3]:
+        print(f"--- p.{chunk.metadata['page']} #{chunk.metadata['chunk_index']} ---\n{chunk.page_content[:200]}")
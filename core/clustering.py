@@ -23,6 +23,10 @@ try:
 except ImportError:
     HDBSCAN_AVAILABLE = False
 
+from config.settings import settings
+from qdrant_client import models
+
+from core.doc_store import load_bodies
 from core.qdrant import qdrant_manager
 from core.llm import get_critic_llm
 from utils.logger import logger
@@ -54,7 +58,10 @@ class ClusteringService:
                     limit=100,
                     offset=offset,
                     with_vectors=True,
-                    with_payload=True
+                    # 聚类只需要元数据：正文和引言全文不走网络 (摘要留给簇标签生成)
+                    with_payload=models.PayloadSelectorExclude(
+                        exclude=["page_content", "metadata.introduction", "metadata.introduction_summary"]
+                    )
                 )
                 
                 points, offset = result
@@ -62,6 +69,7 @@ class ClusteringService:
                 if not points:
                     break
                 
+                layout = qdrant_manager.vector_layout(self.collection_name)
                 for point in points:
                     payload = point.payload or {}
                     # 兼容 LangChain 的 metadata 嵌套结构
@@ -69,7 +77,10 @@ class ClusteringService:
                     
                     papers.append({
                         "id": point.id,
-                        "vector": point.vector,
+                        # 带分段向量的集合按 SECTION_WEIGHTS 融合成单一向量再聚类
+                        "vector": qdrant_manager.fuse_section_vectors(
+                            point.vector, settings.SECTION_WEIGHTS, layout=layout
+                        ),
                         "metadata": meta
                     })
                 
@@ -197,9 +208,15 @@ class ClusteringService:
             
             # 取前 N 篇论文的标题和摘要
             sample_papers = papers[:max_papers_per_cluster]
-            paper_info = "\n".join([
-                f"- Title: {p['metadata'].get('title', 'Unknown')}\n  Abstract: {p['metadata'].get('abstract', '')[:300]}..."
+            # 精简 payload 下摘要不在 Qdrant 里，只为参与生成标签的论文从本地取回
+            bodies = load_bodies([p["id"] for p in sample_papers if "abstract" not in p["metadata"]])
+            abstracts = [
+                p["metadata"].get("abstract") or (bodies[str(p["id"])].metadata.get("abstract") if str(p["id"]) in bodies else "")
                 for p in sample_papers
+            ]
+            paper_info = "\n".join([
+                f"- Title: {p['metadata'].get('title', 'Unknown')}\n  Abstract: {(abstract or '')[:300]}..."
+                for p, abstract in zip(sample_papers, abstracts)
             ])
             
             prompt = f"""Analyze the following academic papers and generate keyword tags with relevance scores.
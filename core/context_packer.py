@@ -0,0 +1,229 @@
+"""
+Writer 上下文打包器
+按 Token 预算把 上传论文 / 知识库文档 / 联网结果 / 对话历史 装进 Prompt，
+超出预算时先截断、再丢弃价值最低的片段
+"""
+
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence
+
+from langchain_core.documents import Document
+from langchain_core.messages import AnyMessage, HumanMessage
+
+from config.settings import settings
+from core.chat_memory import strip_references
+from utils.logger import logger
+
+# 各来源占可用预算的比例；某个来源用不完的额度会在第二轮分给其它来源
+SOURCE_BUDGET_SHARES = {
+    "uploaded": 0.35,
+    "papers": 0.40,
+    "web": 0.15,
+    "history": 0.10,
+}
+# 截断后剩余不足该 Token 数的片段直接丢弃，避免塞进没有信息量的残句
+MIN_CHUNK_TOKENS = 64
+WEB_SECTION_SEP = "\n---\n"
+# 每篇文档的 "--- Reference N (title) ---" 标题行预留的 Token
+HEADER_TOKENS = 24
+
+
+# ==========================================
+# Token 计数
+# ==========================================
+@lru_cache(maxsize=1)
+def _get_encoding():
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(settings.TOKENIZER_ENCODING)
+    except Exception as e:
+        # 离线环境拿不到 BPE 文件时按字符数估算 (中英混合约 2 字符 / Token)
+        logger.warning(f"⚠️ tiktoken encoding unavailable ({e}). Falling back to character estimate.")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    enc = _get_encoding()
+    if enc is None:
+        return (len(text) + 1) // 2
+    return len(enc.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """截断到 max_tokens 以内，末尾加省略标记"""
+    if max_tokens <= 0:
+        return ""
+    enc = _get_encoding()
+    if enc is None:
+        limit = max_tokens * 2
+        return text if len(text) <= limit else text[:limit] + " …"
+    tokens = enc.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return enc.decode(tokens[:max_tokens]) + " …"
+
+
+# ==========================================
+# 打包
+# ==========================================
+@dataclass
+class _Chunk:
+    source: str           # uploaded / papers / web / history
+    rank: int             # 来源内的排序，越小价值越高
+    text: str
+    tokens: int
+    doc_index: Optional[int] = None
+    kept_tokens: int = 0
+
+    @property
+    def kept_text(self) -> str:
+        return self.text if self.kept_tokens >= self.tokens else truncate_tokens(self.text, self.kept_tokens)
+
+
+@dataclass
+class PackedContext:
+    """打包结果"""
+    docs: List[Document]          # 保留下来的文档 (内容可能已截断)，与 Reference 编号一一对应
+    chat_history: str
+    packed_tokens: int = 0
+    dropped_tokens: int = 0
+    per_source: Dict[str, int] = field(default_factory=dict)
+
+    def format_context(self) -> str:
+        context_str = ""
+        for i, doc in enumerate(self.docs):
+            source = doc.metadata.get("title", "Web Search")
+            # 标记上传的文件
+            if doc.metadata.get("source") == "uploaded_file":
+                source = "[User Uploaded PDF]"
+            elif doc.metadata.get("page"):
+                source += f", full text p. {doc.metadata['page']}"  # 全文分块
+            context_str += f"\n--- Reference {i+1} ({source}) ---\n{doc.page_content}\n"
+        return context_str
+
+
+class ContextPacker:
+    def __init__(self, max_tokens: Optional[int] = None, shares: Optional[Dict[str, float]] = None):
+        """
+        :param max_tokens: 整个 System Prompt 的 Token 上限，默认取 settings.WRITER_PROMPT_MAX_TOKENS
+        :param shares: 各来源的预算比例，默认 SOURCE_BUDGET_SHARES
+        """
+        self.max_tokens = max_tokens or settings.WRITER_PROMPT_MAX_TOKENS
+        self.shares = shares or SOURCE_BUDGET_SHARES
+
+    @staticmethod
+    def _split(docs: Sequence[Document], history: Sequence[AnyMessage], summary: str = "") -> List[_Chunk]:
+        chunks: List[_Chunk] = []
+        paper_rank = 0
+        for i, doc in enumerate(docs):
+            source = doc.metadata.get("source")
+            if source == "uploaded_file":
+                chunks.append(_Chunk("uploaded", 0, doc.page_content, count_tokens(doc.page_content), i))
+            elif source == "web_search":
+                # 联网结果已按相关度排好序，逐条作为独立片段
+                for rank, section in enumerate(doc.page_content.split(WEB_SECTION_SEP)):
+                    if section.strip():
+                        chunks.append(_Chunk("web", rank, section, count_tokens(section), i))
+            else:
+                # 知识库文档保持检索返回的相似度顺序
+                chunks.append(_Chunk("papers", paper_rank, doc.page_content, count_tokens(doc.page_content), i))
+                paper_rank += 1
+
+        # 对话历史：越新的轮次价值越高
+        for rank, msg in enumerate(reversed(history)):
+            role = "User" if isinstance(msg, HumanMessage) else "Assistant"
+            line = f"{role}: {strip_references(msg.content)}\n"
+            chunks.append(_Chunk("history", rank, line, count_tokens(line)))
+        # 更早对话的滚动摘要排在所有原文之后 (最先被截断)
+        if summary:
+            line = f"[Earlier conversation summary]: {summary}\n"
+            chunks.append(_Chunk("history", len(history), line, count_tokens(line)))
+        return chunks
+
+    @staticmethod
+    def _fill(chunks: List[_Chunk], budget: int) -> int:
+        """按价值顺序给片段分配 Token，返回用掉的预算"""
+        used = 0
+        for chunk in sorted(chunks, key=lambda c: c.rank):
+            remaining = budget - used
+            want = chunk.tokens - chunk.kept_tokens
+            if want <= 0:
+                continue
+            if remaining <= 0:
+                break
+            grant = min(want, remaining)
+            # 截断后太短的片段不值得保留
+            if chunk.kept_tokens + grant < min(chunk.tokens, MIN_CHUNK_TOKENS):
+                continue
+            chunk.kept_tokens += grant
+            used += grant
+        return used
+
+    def pack(
+        self,
+        docs: Sequence[Document],
+        history: Sequence[AnyMessage],
+        reserved_text: str = "",
+        summary: str = ""
+    ) -> PackedContext:
+        """
+        :param docs: state["context"]
+        :param history: 不含当前问题的历史消息
+        :param reserved_text: Prompt 模板和问题等固定部分，会先从预算中扣除
+        :param summary: 窗口外旧对话的滚动摘要 (windowed 记忆模式)
+        """
+        budget = max(0, self.max_tokens - count_tokens(reserved_text) - HEADER_TOKENS * len(docs))
+        chunks = self._split(docs, history, summary)
+        by_source = {name: [c for c in chunks if c.source == name] for name in self.shares}
+
+        # 第一轮：按比例分配
+        leftover = budget
+        for name, share in self.shares.items():
+            leftover -= self._fill(by_source[name], int(budget * share))
+
+        # 第二轮：剩余预算按来源优先级再分配给被截断 / 丢弃的片段
+        for name in self.shares:
+            if leftover <= 0:
+                break
+            leftover -= self._fill(by_source[name], leftover)
+
+        # 重新组装：保持原有文档顺序，Web 文档内保持排名顺序
+        packed_docs: List[Document] = []
+        for i, doc in enumerate(docs):
+            parts = [c.kept_text for c in chunks if c.doc_index == i and c.kept_tokens > 0]
+            if not parts:
+                continue
+            content = WEB_SECTION_SEP.join(parts) if doc.metadata.get("source") == "web_search" else parts[0]
+            packed_docs.append(Document(page_content=content, metadata=doc.metadata))
+
+        history_chunks = sorted(by_source["history"], key=lambda c: c.rank, reverse=True)
+        chat_history = "".join(c.kept_text for c in history_chunks if c.kept_tokens > 0)
+
+        packed = sum(c.kept_tokens for c in chunks)
+        total = sum(c.tokens for c in chunks)
+        result = PackedContext(
+            docs=packed_docs,
+            chat_history=chat_history,
+            packed_tokens=packed,
+            dropped_tokens=total - packed,
+            per_source={name: sum(c.kept_tokens for c in cs) for name, cs in by_source.items()},
+        )
+        logger.info(
+            f"   📦 Context packed: {packed} tokens kept, {total - packed} dropped "
+            f"(budget {budget}, {len(packed_docs)}/{len(docs)} docs) {result.per_source}"
+        )
+        return result
+
+
+if __name__ == "__main__":
+    docs = [
+        Document(page_content="Uploaded summary " * 400, metadata={"source": "uploaded_file"}),
+        *[Document(page_content=f"Paper {i} " * 300, metadata={"title": f"Paper {i}"}) for i in range(10)],
+        Document(page_content=WEB_SECTION_SEP.join(f"来源: u{i}\n内容: " + "web " * 200 for i in range(3)),
+                 metadata={"source": "web_search"}),
+    ]
+    history = [HumanMessage(content="Q " * 100), HumanMessage(content="Q2 " * 100)]
+    packed = ContextPacker(max_tokens=4000).pack(docs, history)
+    print(f"Docs kept: {len(packed.docs)} | packed={packed.packed_tokens} dropped={packed.dropped_tokens}")
+    assert packed.packed_tokens <= 4000
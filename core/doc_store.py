@@ -0,0 +1,285 @@
+"""
+本地文档存储 (SQLite + zlib)
+Research Graph 的 State 里只保留文档引用 (Qdrant point id / 本地 key + 摘要信息)，
+完整文档在需要时从 Qdrant 或这里取回，避免每个 superstep 都把大段文本写进 Checkpoint
+Payload 精简模式 (QDRANT_LEAN_PAYLOAD) 下，知识库论文的正文 / 摘要 / 引言也存在这里 (key 为 point id)，
+Qdrant 只保留过滤和展示字段，正文只为真正进入 Writer 的文档取回
+"""
+
+import hashlib
+import json
+import sqlite3
+import time
+import uuid
+import zlib
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from langchain_core.documents import Document
+from qdrant_client import models
+
+from config.settings import settings
+from core.qdrant import PAYLOAD_INDEXES, qdrant_manager
+from utils.logger import logger
+
+# 引用里保留的元数据字段：足够渲染参考文献列表，又不会把正文带进 State
+DIGEST_FIELDS = ("title", "venue", "year", "authors", "source", "query", "content_type", "page")
+# Payload 精简模式下留在 Qdrant 的元数据字段：过滤字段 (Payload 索引) + 展示字段 + 全文分块的关联字段
+# 其余字段 (abstract / introduction / introduction_summary) 和 page_content 只存本地
+PAYLOAD_FIELDS = tuple(dict.fromkeys([
+    *(key.removeprefix("metadata.") for key in PAYLOAD_INDEXES), *DIGEST_FIELDS, "chunk_index"
+]))
+# 正文在本地存储中的 key 前缀 (其余 key 是内容哈希)
+BODY_KEY_PREFIX = "point:"
+
+
+class DocStore:
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS documents (
+                    key TEXT PRIMARY KEY,
+                    data BLOB NOT NULL,
+                    created_at REAL NOT NULL
+                )
+                """
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=10)
+
+    @staticmethod
+    def make_key(doc: Document) -> str:
+        raw = json.dumps({"page_content": doc.page_content, "metadata": doc.metadata}, ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def put(self, doc: Document, key: Optional[str] = None) -> str:
+        """保存文档，返回 key (默认按内容哈希，重复写入同一文档只存一份)"""
+        return self.put_many([doc], [key] if key else None)[0]
+
+    def put_many(self, docs: Sequence[Document], keys: Optional[Sequence[str]] = None) -> List[str]:
+        keys = list(keys) if keys else [self.make_key(doc) for doc in docs]
+        now = time.time()
+        rows = [
+            (
+                key,
+                zlib.compress(json.dumps({"page_content": doc.page_content, "metadata": doc.metadata}, ensure_ascii=False, default=str).encode("utf-8")),
+                now,
+            )
+            for key, doc in zip(keys, docs)
+        ]
+        with self._connect() as conn:
+            conn.executemany("INSERT OR REPLACE INTO documents (key, data, created_at) VALUES (?, ?, ?)", rows)
+        return keys
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, Document]:
+        if not keys:
+            return {}
+        found = {}
+        with self._connect() as conn:
+            for i in range(0, len(keys), 500):  # SQLite 变量个数上限
+                batch = list(keys[i:i + 500])
+                placeholders = ",".join("?" * len(batch))
+                for key, data in conn.execute(f"SELECT key, data FROM documents WHERE key IN ({placeholders})", batch):
+                    obj = json.loads(zlib.decompress(data).decode("utf-8"))
+                    found[key] = Document(page_content=obj["page_content"], metadata=obj["metadata"])
+        return found
+
+    def get(self, key: str) -> Optional[Document]:
+        return self.get_many([key]).get(key)
+
+    def delete(self, keys: Iterable[str]) -> int:
+        keys = list(keys)
+        with self._connect() as conn:
+            return conn.executemany("DELETE FROM documents WHERE key = ?", [(k,) for k in keys]).rowcount
+
+    def prune(self, older_than_seconds: float) -> int:
+        """删除超过保存期限的文档 (联网结果 / 上传论文摘要)；知识库论文的正文不过期"""
+        with self._connect() as conn:
+            return conn.execute(
+                "DELETE FROM documents WHERE created_at < ? AND key NOT LIKE ?",
+                (time.time() - older_than_seconds, BODY_KEY_PREFIX + "%")
+            ).rowcount
+
+
+# 单例
+doc_store = DocStore(settings.DOC_STORE_DB)
+
+
+# ==========================================
+# Payload 精简模式：正文存本地，按 point id 取回
+# ==========================================
+def body_key(point_id: Any) -> str:
+    """Qdrant 返回的 UUID 带连字符，写入时可能是 32 位 hex，统一成标准格式"""
+    try:
+        return BODY_KEY_PREFIX + str(uuid.UUID(str(point_id)))
+    except ValueError:
+        return BODY_KEY_PREFIX + str(point_id)
+
+
+def lean_payload(doc: Document) -> Dict[str, Any]:
+    """只保留 PAYLOAD_FIELDS 的 payload (不带 page_content，检索端据此识别精简点)"""
+    return {"metadata": {k: doc.metadata[k] for k in PAYLOAD_FIELDS if k in doc.metadata}}
+
+
+def put_bodies(docs: Sequence[Document], point_ids: Sequence[Any]):
+    """入库时把完整文档 (正文 + 全部元数据) 按 point id 写入本地存储"""
+    doc_store.put_many(docs, [body_key(pid) for pid in point_ids])
+
+
+def load_bodies(point_ids: Sequence[Any]) -> Dict[str, Document]:
+    """按 point id 批量取回完整文档，返回 {str(point_id): Document}，本地没有的不出现"""
+    keys = {body_key(pid): str(pid) for pid in point_ids}
+    return {keys[key]: doc for key, doc in doc_store.get_many(list(keys)).items()}
+
+
+def hydrate_documents(docs: Sequence[Document]) -> List[Document]:
+    """把检索得到的精简文档补全为完整文档 (非精简文档原样返回)，只应对真正进入 Writer 的文档调用"""
+    lean = [doc.metadata["_id"] for doc in docs if doc.metadata.get("_lean")]
+    if not lean:
+        return list(docs)
+    bodies = load_bodies(lean)
+    hydrated, missing = [], 0
+    for doc in docs:
+        body = bodies.get(str(doc.metadata.get("_id"))) if doc.metadata.get("_lean") else None
+        if body is None:
+            missing += bool(doc.metadata.get("_lean"))
+            hydrated.append(doc)
+            continue
+        hydrated.append(Document(
+            page_content=body.page_content,
+            metadata={**body.metadata, "_id": doc.metadata["_id"], "_collection_name": doc.metadata.get("_collection_name")}
+        ))
+    if missing:
+        logger.warning(f"⚠️ {missing} lean documents have no local body (ingested on another machine?).")
+    return hydrated
+
+
+def slim_collection(collection_name: Optional[str] = None, batch_size: int = 256) -> int:
+    """
+    把已有集合改写为精简 payload：完整文档先写入本地存储，再覆盖 Qdrant 中的 payload
+    :return: 改写的点数
+    """
+    name = collection_name or qdrant_manager.collection_name
+    slimmed, offset = 0, None
+    while True:
+        points, offset = qdrant_manager.client.scroll(
+            collection_name=name, limit=batch_size, offset=offset, with_payload=True, with_vectors=False
+        )
+        full = [p for p in points if "page_content" in (p.payload or {})]
+        if full:
+            docs = [Document(page_content=p.payload["page_content"], metadata=p.payload.get("metadata") or {}) for p in full]
+            put_bodies(docs, [p.id for p in full])
+            qdrant_manager.client.batch_update_points(
+                collection_name=name,
+                update_operations=[
+                    models.OverwritePayloadOperation(
+                        overwrite_payload=models.SetPayload(payload=lean_payload(doc), points=[p.id])
+                    )
+                    for p, doc in zip(full, docs)
+                ],
+                wait=True
+            )
+            slimmed += len(full)
+        if offset is None:
+            break
+    logger.info(f"🪶 Slimmed payloads of {slimmed} points in '{name}'.")
+    return slimmed
+
+
+# ==========================================
+# State 引用 <-> Document
+# ==========================================
+def make_context_refs(docs: Sequence[Document]) -> List[Dict[str, Any]]:
+    """
+    把 Document 列表转换成可以放进 State 的轻量引用
+    - 来自 Qdrant 的文档 (metadata 带 _id) 只记 point id
+    - 联网结果 / 上传论文等临时文档写入本地 doc_store
+    """
+    refs = []
+    local_docs = []
+    for doc in docs:
+        meta = doc.metadata
+        digest = {k: meta[k] for k in DIGEST_FIELDS if meta.get(k) not in (None, "", [])}
+        if meta.get("_id") is not None:
+            refs.append({
+                "kind": "qdrant",
+                "id": str(meta["_id"]),
+                "collection": meta.get("_collection_name", settings.QDRANT_COLLECTION_NAME),
+                "digest": digest,
+            })
+        else:
+            refs.append({"kind": "local", "id": None, "digest": digest})
+            local_docs.append((len(refs) - 1, doc))
+
+    if local_docs:
+        keys = doc_store.put_many([doc for _, doc in local_docs])
+        for (i, _), key in zip(local_docs, keys):
+            refs[i]["id"] = key
+    return refs
+
+
+def point_to_document(point: Any, collection_name: str) -> Document:
+    """Qdrant point (langchain_qdrant payload 格式) -> Document，与 QdrantVectorStore 的返回一致"""
+    payload = point.payload or {}
+    metadata = dict(payload.get("metadata") or {})
+    metadata["_id"] = point.id
+    metadata["_collection_name"] = collection_name
+    if "page_content" not in payload:
+        metadata["_lean"] = True  # 精简 payload：正文在本地存储，进入 Writer 前由 hydrate_documents 补全
+    return Document(page_content=payload.get("page_content", ""), metadata=metadata)
+
+
+def rehydrate_context(refs: Sequence[Dict[str, Any]]) -> List[Document]:
+    """
+    按引用取回完整文档，保持原有顺序
+    Qdrant 文档先查本地正文 (精简模式入库的论文)，没有的再按集合批量 retrieve；
+    本地文档一次查询取回；取不到的文档跳过并告警
+    """
+    docs: List[Optional[Document]] = [None] * len(refs)
+
+    # 1. Qdrant 文档：本地有正文的直接用，不走网络
+    bodies = load_bodies([ref["id"] for ref in refs if ref["kind"] == "qdrant"])
+    by_collection: Dict[str, List[int]] = {}
+    for i, ref in enumerate(refs):
+        if ref["kind"] != "qdrant":
+            continue
+        body = bodies.get(ref["id"])
+        if body is not None:
+            docs[i] = Document(
+                page_content=body.page_content,
+                metadata={**body.metadata, "_id": ref["id"], "_collection_name": ref["collection"]}
+            )
+        else:
+            by_collection.setdefault(ref["collection"], []).append(i)
+    for collection, indices in by_collection.items():
+        try:
+            points = qdrant_manager.client.retrieve(
+                collection_name=collection,
+                ids=[refs[i]["id"] for i in indices],
+                with_payload=True,
+                with_vectors=False
+            )
+            by_id = {str(p.id): p for p in points}
+            for i in indices:
+                point = by_id.get(refs[i]["id"])
+                if point is not None:
+                    docs[i] = point_to_document(point, collection)
+                    if docs[i].metadata.get("_lean"):
+                        docs[i] = None  # 精简点在本机没有正文，不能给 Writer 一个空文档
+        except Exception as e:
+            logger.error(f"❌ Failed to rehydrate {len(indices)} documents from '{collection}': {e}")
+
+    # 2. 本地文档
+    local = doc_store.get_many([ref["id"] for ref in refs if ref["kind"] == "local"])
+    for i, ref in enumerate(refs):
+        if ref["kind"] == "local":
+            docs[i] = local.get(ref["id"])
+
+    missing = sum(doc is None for doc in docs)
+    if missing:
+        logger.warning(f"⚠️ {missing}/{len(refs)} context documents could not be rehydrated.")
+    return [doc for doc in docs if doc is not None]
@@ -0,0 +1,307 @@
+"""
+批量入库 Sink
+收集多篇论文的 Document -> 自适应批量 Embedding -> 并行批量 Upsert 到 Qdrant
+"""
+
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Union
+
+from langchain_core.documents import Document
+from qdrant_client import models
+
+from config.settings import settings
+from core.doc_store import lean_payload, put_bodies
+from core.llm import get_embeddings
+from core.qdrant import DENSE_VECTOR, qdrant_manager, section_texts
+from utils.logger import logger
+
+
+@dataclass
+class SinkStats:
+    """Sink 运行统计"""
+    embedded: int = 0
+    upserted: int = 0
+    embed_requests: int = 0
+    embed_retries: int = 0
+    upsert_requests: int = 0
+    embed_seconds: float = 0.0
+    upsert_seconds: float = 0.0
+    wall_seconds: float = 0.0
+
+    @property
+    def points_per_sec(self) -> float:
+        return self.upserted / self.wall_seconds if self.wall_seconds > 0 else 0.0
+
+    def format(self) -> str:
+        return (
+            f"{self.upserted} points in {self.wall_seconds:.1f}s ({self.points_per_sec:.1f} points/sec) | "
+            f"embed: {self.embed_requests} requests, {self.embed_retries} retries, {self.embed_seconds:.1f}s | "
+            f"upsert: {self.upsert_requests} requests, {self.upsert_seconds:.1f}s"
+        )
+
+
+class AdaptiveBatcher:
+    """
+    自适应批大小 (AIMD)
+    - 请求失败 (批太大 / 限流) -> 批大小减半
+    - 连续成功 -> 批大小 +1，直到服务商上限
+    同时保证每批的总字符数不超过 max_chars
+    """
+
+    def __init__(self, max_size: int, max_chars: int, grow_after: int = 3):
+        self.max_size = max(1, max_size)
+        self.max_chars = max_chars
+        self.grow_after = grow_after
+        self.size = self.max_size
+        self._successes = 0
+        self._lock = threading.Lock()
+
+    def split(self, texts: Sequence[str], groups: Optional[Sequence[Sequence[int]]] = None) -> List[List[int]]:
+        """
+        按当前批大小和字符预算把文本下标切成若干批
+        :param groups: 需要放进同一批的下标分组 (例如同一篇论文的整体文本和各分段文本)；
+                       分组本身超过批大小 / 字符预算时才拆开
+        """
+        groups = groups or [[i] for i in range(len(texts))]
+        batches, current, chars = [], [], 0
+        size = self.size
+        for group in groups:
+            group_chars = sum(len(texts[i]) for i in group)
+            items = [list(group)] if len(group) <= size and group_chars <= self.max_chars else [[i] for i in group]
+            for item in items:
+                item_chars = sum(len(texts[i]) for i in item)
+                if current and (len(current) + len(item) > size or chars + item_chars > self.max_chars):
+                    batches.append(current)
+                    current, chars = [], 0
+                current.extend(item)
+                chars += item_chars
+        if current:
+            batches.append(current)
+        return batches
+
+    def on_success(self):
+        with self._lock:
+            self._successes += 1
+            if self._successes >= self.grow_after and self.size < self.max_size:
+                self.size += 1
+                self._successes = 0
+
+    def on_failure(self):
+        with self._lock:
+            self._successes = 0
+            self.size = max(1, self.size // 2)
+
+
+class BatchIngestionSink:
+    """
+    批量入库 Sink
+    用法:
+        sink = BatchIngestionSink()
+        for doc in docs:
+            sink.add(doc)       # 攒够 flush_size 自动 flush
+        sink.flush()
+        print(sink.stats.format())
+    """
+
+    def __init__(
+        self,
+        collection_name: Optional[str] = None,
+        embed_workers: int = 4,
+        upsert_batch_size: int = 256,
+        upsert_workers: int = 4,
+        flush_size: int = 512,
+        max_retries: int = 4
+    ):
+        self.collection_name = collection_name or settings.QDRANT_COLLECTION_NAME
+        self.embed_workers = embed_workers
+        self.upsert_batch_size = upsert_batch_size
+        self.upsert_workers = upsert_workers
+        self.flush_size = flush_size
+        self.max_retries = max_retries
+        self.batcher = AdaptiveBatcher(settings.EMBEDDING_BATCH_SIZE, settings.EMBEDDING_BATCH_MAX_CHARS)
+        self.stats = SinkStats()
+        self._buffer: List[Document] = []
+        self._buffer_ids: List[str] = []
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._started_at: Optional[float] = None
+        self._collection_ready = False
+
+    # ---------- Embedding ----------
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        """单个批次的 Embedding 请求，失败时缩小批大小后拆分重试"""
+        for attempt in range(self.max_retries + 1):
+            t0 = time.perf_counter()
+            try:
+                vectors = get_embeddings(chunk_size=len(texts)).embed_documents(texts)
+                with self._stats_lock:
+                    self.stats.embed_requests += 1
+                    self.stats.embed_seconds += time.perf_counter() - t0
+                self.batcher.on_success()
+                return vectors
+            except Exception as e:
+                self.batcher.on_failure()
+                with self._stats_lock:
+                    self.stats.embed_retries += 1
+                if attempt >= self.max_retries:
+                    raise
+                logger.warning(f"⚠️ Embedding batch of {len(texts)} failed ({e}). Shrinking to {self.batcher.size} and retrying...")
+                # 批太大时拆成两半分别请求
+                if len(texts) > self.batcher.size:
+                    mid = len(texts) // 2
+                    return self._embed_batch(texts[:mid]) + self._embed_batch(texts[mid:])
+                time.sleep(min(2 ** attempt, 10))  # 可能是限流，退避后重试
+
+    def embed_documents(self, docs: Sequence[Document]) -> List[List[float]]:
+        """按自适应批大小切分，多个批次并发请求"""
+        vectors = self._embed_texts([doc.page_content for doc in docs])
+        with self._stats_lock:
+            self.stats.embedded += len(docs)
+        return vectors
+
+    def embed_papers(self, docs: Sequence[Document]) -> List[Dict[str, List[float]]]:
+        """
+        整体文本 + 集合中存在的分段 (title / abstract / intro) 一起 Embedding
+        同一篇论文的几段文本放进同一个请求，请求数与只算整体向量时相当
+        :return: 每篇论文一个 {"dense": 整体向量, "title": ..., ...}，缺失的分段不出现
+        """
+        self._ensure_collection()
+        sections = qdrant_manager.section_vectors(self.collection_name)
+        texts, keys, groups = [], [], []
+        for doc_index, doc in enumerate(docs):
+            parts = {DENSE_VECTOR: doc.page_content}
+            parts.update({k: v for k, v in section_texts(doc.metadata).items() if k in sections})
+            groups.append(list(range(len(texts), len(texts) + len(parts))))
+            for name, text in parts.items():
+                texts.append(text)
+                keys.append((doc_index, name))
+
+        vectors = self._embed_texts(texts, groups)
+        results: List[Dict[str, List[float]]] = [{} for _ in docs]
+        for (doc_index, name), vector in zip(keys, vectors):
+            results[doc_index][name] = vector
+        with self._stats_lock:
+            self.stats.embedded += len(docs)
+        return results
+
+    def _embed_texts(self, texts: List[str], groups: Optional[List[List[int]]] = None) -> List[List[float]]:
+        if not texts:
+            return []
+        batches = self.batcher.split(texts, groups)
+        vectors: List[Optional[List[float]]] = [None] * len(texts)
+
+        def run(indices: List[int]):
+            for i, vector in zip(indices, self._embed_batch([texts[i] for i in indices])):
+                vectors[i] = vector
+
+        with ThreadPoolExecutor(max_workers=max(1, min(self.embed_workers, len(batches)))) as pool:
+            list(pool.map(run, batches))
+        return vectors
+
+    # ---------- Upsert ----------
+    def make_point(
+        self,
+        doc: Document,
+        vector: Union[List[float], Dict[str, List[float]]],
+        point_id: Optional[str] = None,
+        layout: Optional[Dict[str, int]] = None
+    ) -> models.PointStruct:
+        """
+        :param vector: 整体向量，或 embed_papers 返回的 {"dense": ..., "title": ..., ...}
+        :param layout: 集合的向量布局，make_points 每批读一次传进来；为空时现查
+        精简模式下 payload 不带正文，正文需写入本地存储 (用 make_points 批量构造时会一并处理)
+        """
+        # payload 结构与 langchain_qdrant 保持一致，检索端无需区分
+        # 向量结构按集合布局生成 (旧集合为单一向量，新集合为 dense + dense_mini + 分段向量 + sparse)
+        self._ensure_collection()
+        sections = None
+        if isinstance(vector, dict):
+            sections, vector = vector, vector[DENSE_VECTOR]
+        return models.PointStruct(
+            id=point_id or uuid.uuid4().hex,
+            vector=qdrant_manager.make_vectors(vector, self.collection_name, text=doc.page_content, sections=sections, layout=layout),
+            payload=lean_payload(doc) if settings.QDRANT_LEAN_PAYLOAD else {"page_content": doc.page_content, "metadata": doc.metadata}
+        )
+
+    def make_points(
+        self,
+        docs: Sequence[Document],
+        vectors: Sequence[Union[List[float], Dict[str, List[float]]]],
+        point_ids: Optional[Sequence[str]] = None
+    ) -> List[models.PointStruct]:
+        """批量构造 points；精简模式下先把完整文档写入本地存储 (一次事务)，保证点可见时正文已经在本地"""
+        ids = list(point_ids) if point_ids else [uuid.uuid4().hex for _ in docs]
+        if settings.QDRANT_LEAN_PAYLOAD:
+            put_bodies(docs, ids)
+        self._ensure_collection()
+        layout = qdrant_manager.vector_layout(self.collection_name)
+        return [self.make_point(doc, vector, pid, layout) for doc, vector, pid in zip(docs, vectors, ids)]
+
+    def _ensure_collection(self):
+        # 只负责主集合；其他集合 (如全文分块集合) 由调用方按需创建
+        if not self._collection_ready:
+            if self.collection_name == qdrant_manager.collection_name:
+                qdrant_manager.ensure_collection_exists()
+            self._collection_ready = True
+
+    def upsert_points(self, points: List[models.PointStruct]):
+        """把 points 切成大批次，多个 worker 并行写入"""
+        if not points:
+            return
+        self._ensure_collection()
+        client = qdrant_manager.client
+        batches = [points[i:i + self.upsert_batch_size] for i in range(0, len(points), self.upsert_batch_size)]
+
+        def run(batch: List[models.PointStruct]):
+            t0 = time.perf_counter()
+            client.upsert(collection_name=self.collection_name, points=batch, wait=True)
+            with self._stats_lock:
+                self.stats.upsert_requests += 1
+                self.stats.upsert_seconds += time.perf_counter() - t0
+                self.stats.upserted += len(batch)
+
+        with ThreadPoolExecutor(max_workers=max(1, min(self.upsert_workers, len(batches)))) as pool:
+            list(pool.map(run, batches))
+        # 集合内容变了：让依赖集合版本号的缓存失效
+        qdrant_manager.bump_version(self.collection_name)
+
+    # ---------- Sink 接口 ----------
+    def add(self, doc: Document, point_id: Optional[str] = None) -> str:
+        """加入缓冲区，返回 point id；缓冲区满时自动 flush"""
+        point_id = point_id or uuid.uuid4().hex
+        with self._lock:
+            if self._started_at is None:
+                self._started_at = time.perf_counter()
+            self._buffer.append(doc)
+            self._buffer_ids.append(point_id)
+            should_flush = len(self._buffer) >= self.flush_size
+        if should_flush:
+            self.flush()
+        return point_id
+
+    def write(self, docs: Sequence[Document], point_ids: Optional[Sequence[str]] = None) -> List[str]:
+        """直接 embed + upsert 一批文档 (不经过缓冲区)"""
+        if not docs:
+            return []
+        if self._started_at is None:
+            self._started_at = time.perf_counter()
+        ids = list(point_ids) if point_ids else [uuid.uuid4().hex for _ in docs]
+        vectors = self.embed_papers(docs)
+        self.upsert_points(self.make_points(docs, vectors, ids))
+        self.stats.wall_seconds = time.perf_counter() - self._started_at
+        return ids
+
+    def flush(self) -> int:
+        """把缓冲区中的文档全部写入，返回写入数量"""
+        with self._lock:
+            docs, ids = self._buffer, self._buffer_ids
+            self._buffer, self._buffer_ids = [], []
+        if not docs:
+            return 0
+        self.write(docs, ids)
+        logger.info(f"📦 Sink flushed: {self.stats.format()}")
+        return len(docs)
@@ -1,5 +1,7 @@
 import sys
+from functools import lru_cache
 from pathlib import Path
+from typing import Tuple
 
 # 防止路径引用错误 (同 qdrant.py 的逻辑)
 current_file_path = Path(__file__).resolve()
@@ -39,9 +41,10 @@ def get_extractor_llm() -> ChatOpenAI:
         max_retries=3,
     )
 
-def get_embeddings() -> OpenAIEmbeddings:
+def get_embeddings(chunk_size: int = settings.EMBEDDING_BATCH_SIZE) -> OpenAIEmbeddings:
     """
     获取向量模型 (Qwen / DashScope)
+    :param chunk_size: 单次请求的文本条数，不能超过服务商限制 (EMBEDDING_BATCH_SIZE)
     """
     return OpenAIEmbeddings(
         model=settings.EMBEDDING_MODEL_NAME,
@@ -50,9 +53,17 @@ def get_embeddings() -> OpenAIEmbeddings:
         # ⚠️ 关键设置: 阿里模型 Tokenizer 可能与 OpenAI 不同，禁用客户端检查避免报错
         check_embedding_ctx_length=False, 
         dimensions=2048,
-        chunk_size=10
+        chunk_size=min(chunk_size, settings.EMBEDDING_BATCH_SIZE)
     )
 
+@lru_cache(maxsize=256)
+def embed_query(text: str) -> Tuple[float, ...]:
+    """
+    问题向量 (进程内缓存)
+    同一轮对话里答案缓存查询、检索、写入缓存都要用同一个问题向量，只请求一次 Embedding
+    """
+    return tuple(get_embeddings().embed_query(text))
+
 def get_critic_llm(temperature: float = 0.5) -> ChatOpenAI:
     """
     获取 Critic 模型 (如 Qwen3-Max)
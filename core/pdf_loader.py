@@ -1,40 +1,73 @@
 import fitz  # PyMuPDF
 import base64
 from pathlib import Path
-from typing import List
+from typing import Iterator, List, Optional
+from core.blob_store import blob_store
 from utils.logger import logger
 
-def load_pdf_as_images(file_path: str, max_pages: int = 5) -> List[str]:
+def _render_pages(file_path: str, max_pages: int) -> Iterator[bytes]:
     """
-    将 PDF 的前 N 页转换为 Base64 编码的 PNG 图片列表。
-    让视觉大模型直接“看”论文。
+    逐页将 PDF 渲染为 PNG 字节流 (生成器，避免一次性把所有页面留在内存里)
     """
     path = Path(file_path)
     if not path.exists():
         raise FileNotFoundError(f"PDF file not found: {file_path}")
 
     logger.info(f"🖼️ Rendering first {max_pages} pages of {path.name} to images...")
-    
-    base64_images = []
+
     try:
         # 打开 PDF
         doc = fitz.open(path)
-        read_limit = min(len(doc), max_pages)
-        
-        for i in range(read_limit):
-            page = doc.load_page(i)
-            # 设置渲染分辨率 (zoom=2 表示 2 倍清晰度，这对小字很重要)
-            pix = page.get_pixmap(matrix=fitz.Matrix(4, 4))
-            img_bytes = pix.tobytes("png")
-            
-            # 转为 Base64 字符串
-            img_b64 = base64.b64encode(img_bytes).decode("utf-8")
-            base64_images.append(img_b64)
-            
-        doc.close()
-        logger.info(f"✅ Successfully rendered {len(base64_images)} pages as images.")
-        return base64_images
-    
+        try:
+            read_limit = min(len(doc), max_pages)
+            for i in range(read_limit):
+                page = doc.load_page(i)
+                # 设置渲染分辨率 (zoom=2 表示 2 倍清晰度，这对小字很重要)
+                pix = page.get_pixmap(matrix=fitz.Matrix(4, 4))
+                yield pix.tobytes("png")
+        finally:
+            doc.close()
+
     except Exception as e:
         logger.error(f"❌ Error rendering PDF to images: {e}")
-        raise RuntimeError(f"Error rendering PDF: {e}")
\ No newline at end of file
+        raise RuntimeError(f"Error rendering PDF: {e}")
+
+def load_pdf_as_images(file_path: str, max_pages: int = 5) -> List[str]:
+    """
+    将 PDF 的前 N 页转换为 Base64 编码的 PNG 图片列表。
+    让视觉大模型直接“看”论文。
+    """
+    # 转为 Base64 字符串
+    base64_images = [
+        base64.b64encode(img_bytes).decode("utf-8")
+        for img_bytes in _render_pages(file_path, max_pages)
+    ]
+    logger.info(f"✅ Successfully rendered {len(base64_images)} pages as images.")
+    return base64_images
+
+def load_pdf_as_image_refs(file_path: str, max_pages: int = 5) -> List[str]:
+    """
+    将 PDF 的前 N 页渲染后写入 Blob 存储，只返回引用 key 列表。
+    用于需要进入 Graph State / Checkpoint 的场景，避免在状态里保存大体积的 Base64。
+    """
+    refs = [blob_store.put(img_bytes) for img_bytes in _render_pages(file_path, max_pages)]
+    logger.info(f"✅ Successfully rendered {len(refs)} pages into blob store.")
+    return refs
+
+def load_pdf_text(file_path: str, max_pages: Optional[int] = None) -> List[str]:
+    """
+    抽取 PDF 的文本层，返回每页的纯文本 (下标即页码 - 1)。
+    扫描版 PDF 没有文本层，对应页面为空字符串。
+    """
+    path = Path(file_path)
+    if not path.exists():
+        raise FileNotFoundError(f"PDF file not found: {file_path}")
+
+    doc = fitz.open(path)
+    try:
+        read_limit = len(doc) if max_pages is None else min(len(doc), max_pages)
+        pages = [doc.load_page(i).get_text("text") for i in range(read_limit)]
+    finally:
+        doc.close()
+    logger.info(f"📝 Extracted text layer of {len(pages)} pages from {path.name} ({sum(map(len, pages))} chars).")
+    return pages
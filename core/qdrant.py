@@ -1,14 +1,220 @@
+import sqlite3
 import sys
-from typing import Optional
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
 
-from qdrant_client import QdrantClient, models
+import numpy as np
+from qdrant_client import AsyncQdrantClient, QdrantClient, models
 from qdrant_client.http.exceptions import UnexpectedResponse
 
 # 将项目根目录加入路径，确保能导入 config
 sys.path.append("..") 
 from config.settings import settings
+from core.sparse import sparse_encoder
 from utils.logger import logger  # 假设你之后会创建这个，现在先用 print 代替也可以
 
+
+# ==========================
+# 命名向量
+# ==========================
+# 新建集合使用命名向量；旧的单一无名向量集合仍可直接使用 (布局从集合信息中自动识别)
+DENSE_VECTOR = "dense"        # 完整维度向量：只用于重排，不建 HNSW 索引
+MINI_VECTOR = "dense_mini"    # Matryoshka 截断向量：驱动 ANN 检索
+SPARSE_VECTOR = "sparse"      # BM25 风格稀疏向量 (core.sparse)：精确词项匹配，与稠密检索结果 RRF 融合
+# 分段向量：同一个点里按论文章节分别存向量 {向量名: metadata 字段}
+# 标题类查询匹配 title，方法细节类查询匹配 abstract / intro，不必都去匹配整体文本的"平均"向量
+SECTION_VECTORS = {
+    "title": "title",
+    "abstract": "abstract",
+    "intro": "introduction_summary",
+}
+
+
+def truncate_vector(vector: Sequence[float], dim: int) -> List[float]:
+    """Matryoshka 截断：取前 dim 维并重新归一化"""
+    vec = np.asarray(vector[:dim], dtype=np.float32)
+    norm = np.linalg.norm(vec)
+    return (vec / norm if norm > 0 else vec).tolist()
+
+
+def section_texts(metadata: Dict) -> Dict[str, str]:
+    """从论文 metadata 中取出各分段的文本 (缺失 / 为空的分段不返回)"""
+    texts = {}
+    for name, field_name in SECTION_VECTORS.items():
+        value = metadata.get(field_name)
+        if isinstance(value, str) and value.strip():
+            texts[name] = value.strip()
+    return texts
+
+
+# ==========================
+# Payload 索引
+# ==========================
+# ingest_to_qdrant_node 写入的 metadata 字段 (langchain payload 格式，嵌套在 metadata 下)
+# venue / authors 用全文索引：按单词匹配，"CVPR" 能命中 "CVPR 2024"、"Proceedings of CVPR"
+PAYLOAD_INDEXES: Dict[str, models.PayloadSchemaParams] = {
+    "metadata.year": models.PayloadSchemaType.INTEGER,
+    "metadata.venue": models.TextIndexParams(
+        type=models.TextIndexType.TEXT, tokenizer=models.TokenizerType.WORD, lowercase=True, min_token_len=2
+    ),
+    "metadata.authors": models.TextIndexParams(
+        type=models.TextIndexType.TEXT, tokenizer=models.TokenizerType.WORD, lowercase=True, min_token_len=2
+    ),
+    "metadata.content_type": models.PayloadSchemaType.KEYWORD,
+    # 全文分块集合 (core.chunk_index) 按所属论文过滤
+    "metadata.paper_id": models.PayloadSchemaType.KEYWORD,
+}
+
+
+# ==========================
+# 集合配置档 (Collection Profiles)
+# ==========================
+@dataclass(frozen=True)
+class CollectionProfile:
+    """
+    一套集合存储配置：量化方式 + 原始向量 / 索引放内存还是磁盘 + HNSW 参数
+    量化后的向量常驻内存做 ANN，原始 float32 向量放磁盘，只在重排 (rescore) 时读取
+    """
+    name: str
+    description: str
+    quantization: Optional[str] = None      # None / "scalar" / "binary"
+    vectors_on_disk: bool = False           # 原始向量是否放磁盘 (mmap)
+    quantized_always_ram: bool = True       # 量化向量是否常驻内存
+    hnsw_m: int = 16
+    hnsw_ef_construct: int = 100
+    hnsw_on_disk: bool = False
+    payload_on_disk: bool = False
+    oversampling: float = 1.0               # 量化检索时先多取 limit * oversampling 个候选再用原始向量重排
+
+    def vectors_config(
+        self,
+        vector_size: int,
+        mini_dim: int = 0,
+        sections: bool = False
+    ) -> Union[models.VectorParams, Dict[str, models.VectorParams]]:
+        """
+        :param mini_dim: Matryoshka 截断维度，0 表示不使用两阶段布局
+        :param sections: 是否带 title / abstract / intro 分段向量 (维度与截断向量相同，没有截断向量时为完整维度)
+        两阶段布局下量化 / HNSW 参数作用在截断向量 (和分段向量) 上；
+        完整向量只在重排时按 ID 读取少量候选，不建索引且始终放磁盘
+        """
+        if mini_dim <= 0 and not sections:
+            # 旧布局：单一无名向量
+            return models.VectorParams(size=vector_size, distance=models.Distance.COSINE, on_disk=self.vectors_on_disk)
+
+        if mini_dim > 0:
+            config = {
+                DENSE_VECTOR: models.VectorParams(
+                    size=vector_size, distance=models.Distance.COSINE, on_disk=True,
+                    hnsw_config=models.HnswConfigDiff(m=0)
+                ),
+                MINI_VECTOR: models.VectorParams(
+                    size=mini_dim, distance=models.Distance.COSINE, quantization_config=self.quantization_config()
+                )
+            }
+        else:
+            config = {
+                DENSE_VECTOR: models.VectorParams(size=vector_size, distance=models.Distance.COSINE, on_disk=self.vectors_on_disk)
+            }
+        if sections:
+            section_dim = mini_dim if mini_dim > 0 else vector_size
+            for name in SECTION_VECTORS:
+                config[name] = models.VectorParams(
+                    size=section_dim, distance=models.Distance.COSINE,
+                    quantization_config=self.quantization_config() if mini_dim > 0 else None
+                )
+        return config
+
+    def quantization_config(self) -> Optional[models.QuantizationConfig]:
+        if self.quantization == "scalar":
+            return models.ScalarQuantization(scalar=models.ScalarQuantizationConfig(
+                type=models.ScalarType.INT8, quantile=0.99, always_ram=self.quantized_always_ram
+            ))
+        if self.quantization == "binary":
+            return models.BinaryQuantization(binary=models.BinaryQuantizationConfig(always_ram=self.quantized_always_ram))
+        return None
+
+    def hnsw_config(self) -> models.HnswConfigDiff:
+        return models.HnswConfigDiff(m=self.hnsw_m, ef_construct=self.hnsw_ef_construct, on_disk=self.hnsw_on_disk)
+
+    def sparse_vectors_config(self) -> Dict[str, models.SparseVectorParams]:
+        # IDF 由 Qdrant 按集合统计，客户端只提供 BM25 词频部分
+        return {SPARSE_VECTOR: models.SparseVectorParams(
+            modifier=models.Modifier.IDF, index=models.SparseIndexParams(on_disk=self.hnsw_on_disk)
+        )}
+
+    def search_params(
+        self,
+        hnsw_ef: Optional[int] = None,
+        oversampling: Optional[float] = None,
+        exact: bool = False
+    ) -> Optional[models.SearchParams]:
+        """
+        量化集合检索时开启 rescore；未量化且没有额外要求时不需要参数
+        :param hnsw_ef: HNSW 搜索宽度，None 使用服务端默认值
+        :param oversampling: 覆盖配置档的 oversampling
+        :param exact: 精确检索 (暴力计算，不走 HNSW，也不用量化向量)
+        """
+        if exact:
+            quantization = models.QuantizationSearchParams(ignore=True) if self.quantization else None
+            return models.SearchParams(exact=True, quantization=quantization)
+        quantization = None
+        if self.quantization:
+            quantization = models.QuantizationSearchParams(
+                ignore=False, rescore=True, oversampling=oversampling or self.oversampling
+            )
+        if hnsw_ef is None and quantization is None:
+            return None
+        return models.SearchParams(hnsw_ef=hnsw_ef, quantization=quantization)
+
+    def estimate_ram_bytes(self, num_points: int, vector_size: int, mini_dim: int = 0) -> int:
+        """向量部分常驻内存的粗略估算 (含 HNSW 图，不含 payload)"""
+        graph = 0 if self.hnsw_on_disk else num_points * self.hnsw_m * 2 * 4
+        # 两阶段布局：完整向量在磁盘，索引 (及量化) 建在常驻内存的截断向量上
+        indexed_dim = mini_dim if mini_dim > 0 else vector_size
+        if mini_dim > 0:
+            raw = num_points * mini_dim * 4
+        else:
+            raw = 0 if self.vectors_on_disk else num_points * vector_size * 4
+        quantized = 0
+        if self.quantization and self.quantized_always_ram:
+            quantized = num_points * (indexed_dim if self.quantization == "scalar" else indexed_dim // 8)
+        return raw + quantized + graph
+
+
+COLLECTION_PROFILES: Dict[str, CollectionProfile] = {
+    profile.name: profile for profile in (
+        # 与之前的行为一致：float32 全部在内存，HNSW 默认参数
+        CollectionProfile(name="default", description="float32 vectors in RAM, default HNSW"),
+        # int8 标量量化：内存约为原来的 1/4，召回几乎无损
+        CollectionProfile(
+            name="scalar", description="int8 scalar quantization in RAM, originals on disk",
+            quantization="scalar", vectors_on_disk=True, payload_on_disk=True, oversampling=2.0
+        ),
+        # 二值量化：内存约为原来的 1/32，2048 维这种高维向量效果较好，需要更大的 oversampling 重排
+        CollectionProfile(
+            name="binary", description="binary quantization in RAM, originals on disk",
+            quantization="binary", vectors_on_disk=True, payload_on_disk=True, oversampling=3.0
+        ),
+        # 最省内存：量化向量、HNSW 图也放磁盘，适合冷数据 / 小规格实例
+        CollectionProfile(
+            name="disk", description="scalar quantization, vectors and HNSW graph all on disk",
+            quantization="scalar", vectors_on_disk=True, quantized_always_ram=False,
+            hnsw_m=8, hnsw_ef_construct=64, hnsw_on_disk=True, payload_on_disk=True, oversampling=2.0
+        ),
+    )
+}
+
+
+def get_profile(name: Optional[str] = None) -> CollectionProfile:
+    name = name or settings.QDRANT_COLLECTION_PROFILE
+    if name not in COLLECTION_PROFILES:
+        raise ValueError(f"Unknown collection profile '{name}'. Available: {', '.join(COLLECTION_PROFILES)}")
+    return COLLECTION_PROFILES[name]
+
+
 class QdrantManager:
     """
     Qdrant 数据库管理器
@@ -16,37 +222,280 @@ class QdrantManager:
     """
     def __init__(self):
         self._client: Optional[QdrantClient] = None
+        self._async_client: Optional[AsyncQdrantClient] = None
+        # 多个线程 (流水线 worker / Streamlit 会话) 同时首次访问时只建一个连接
+        self._client_lock = threading.Lock()
         self.collection_name = settings.QDRANT_COLLECTION_NAME
+        self._layouts: Dict[str, Tuple[int, Dict[str, int]]] = {}  # {集合名: (集合版本号, 向量布局)}
+        self._counts: Dict[str, Tuple[int, int]] = {}  # {集合名: (集合版本号, 点数)}
+        # 版本号每次检索都要读好几次：共用一个长连接，不必每次重新打开文件、建表
+        self._state_conn: Optional[sqlite3.Connection] = None
+        self._state_lock = threading.Lock()
+
+    @staticmethod
+    def connection_kwargs(prefer_grpc: Optional[bool] = None, mode: Optional[str] = None) -> Dict[str, Any]:
+        """
+        QdrantClient / AsyncQdrantClient 共用的连接参数
+        :param prefer_grpc: 是否走 gRPC，默认 QDRANT_PREFER_GRPC；
+                            gRPC 用 protobuf 二进制传输向量，大批量 scroll(with_vectors=True) 比 REST 的 JSON 小得多
+        :param mode: remote / embedded，默认 QDRANT_MODE
+        """
+        mode = mode or settings.QDRANT_MODE
+        if mode == "embedded":
+            # 进程内存储，没有网络传输，gRPC / 超时 / API Key 都不适用
+            path = settings.QDRANT_EMBEDDED_PATH
+            return {"location": path} if path == ":memory:" else {"path": path}
+        if mode != "remote":
+            raise ValueError(f"Unknown QDRANT_MODE '{mode}'. Available: remote, embedded")
+        if not settings.QDRANT_URL:
+            raise ValueError("QDRANT_URL is required when QDRANT_MODE=remote (or set QDRANT_MODE=embedded)")
+
+        prefer_grpc = settings.QDRANT_PREFER_GRPC if prefer_grpc is None else prefer_grpc
+        kwargs: Dict[str, Any] = {"url": settings.QDRANT_URL, "timeout": settings.QDRANT_TIMEOUT}
+        # 区分本地模式和云端模式
+        if settings.QDRANT_API_KEY:
+            kwargs["api_key"] = settings.QDRANT_API_KEY
+        if prefer_grpc:
+            kwargs.update(prefer_grpc=True, grpc_port=settings.QDRANT_GRPC_PORT)
+        return kwargs
+
+    def make_client(self, prefer_grpc: Optional[bool] = None, mode: Optional[str] = None) -> QdrantClient:
+        """
+        新建一个同步客户端并测试连接 (单例之外的场景，例如传输方式基准测试、嵌入式 <-> 远程迁移)
+        注意：嵌入式存储目录有文件锁，同一目录在整个进程里只能打开一个客户端
+        """
+        kwargs = self.connection_kwargs(prefer_grpc, mode)
+        if "url" in kwargs:
+            transport = "gRPC" if kwargs.get("prefer_grpc") else "REST"
+            where = "Qdrant Cloud" if settings.QDRANT_API_KEY else "Local Qdrant"
+            logger.info(f"🔌 Connecting to {where} ({transport}): {settings.QDRANT_URL}...")
+        else:
+            logger.info(f"🔌 Opening embedded Qdrant: {settings.QDRANT_EMBEDDED_PATH}...")
+        try:
+            client = QdrantClient(**kwargs)
+            # 测试连接
+            client.get_collections()
+            logger.info("✅ Qdrant Connection Successful!")
+            return client
+        except Exception as e:
+            logger.error(f"❌ Failed to connect to Qdrant: {e}")
+            raise e
 
     @property
     def client(self) -> QdrantClient:
         """
-        获取 QdrantClient 单例 (Lazy Loading)
+        获取 QdrantClient 单例 (Lazy Loading，线程安全)
         """
         if self._client is None:
-            try:
-                # 区分本地模式和云端模式
-                if settings.QDRANT_API_KEY:
-                    logger.info(f"🔌 Connecting to Qdrant Cloud: {settings.QDRANT_URL}...")
-                    self._client = QdrantClient(
-                        url=settings.QDRANT_URL,
-                        api_key=settings.QDRANT_API_KEY,
-                    )
-                else:
-                    logger.info(f"🔌 Connecting to Local Qdrant: {settings.QDRANT_URL}...")
-                    self._client = QdrantClient(url=settings.QDRANT_URL)
-                
-                # 测试连接
-                self._client.get_collections()
-                logger.info("✅ Qdrant Connection Successful!")
-            except Exception as e:
-                logger.error(f"❌ Failed to connect to Qdrant: {e}")
-                raise e
+            with self._client_lock:
+                # 双重检查：等锁期间可能已被其他线程建好
+                if self._client is None:
+                    self._client = self.make_client()
         return self._client
 
+    @property
+    def async_client(self) -> AsyncQdrantClient:
+        """
+        获取 AsyncQdrantClient 单例 (Lazy Loading，线程安全)
+        与同步客户端使用相同的连接参数；创建时不做连通性测试 (需要在事件循环里 await)
+        嵌入式模式下存储目录已被同步客户端锁住，且本地调用没有网络等待，不提供异步客户端
+        """
+        if settings.QDRANT_MODE == "embedded":
+            raise RuntimeError("Async Qdrant client is not available in embedded mode; use qdrant_manager.client")
+        if self._async_client is None:
+            with self._client_lock:
+                if self._async_client is None:
+                    self._async_client = AsyncQdrantClient(**self.connection_kwargs())
+                    logger.info(f"🔌 Async Qdrant client ready: {settings.QDRANT_URL}")
+        return self._async_client
+
+    @property
+    def profile(self) -> CollectionProfile:
+        """当前配置的集合配置档 (QDRANT_COLLECTION_PROFILE)"""
+        return get_profile()
+
+    def create_collection(
+        self,
+        collection_name: str,
+        vector_size: int = 2048,
+        profile: Optional[CollectionProfile] = None,
+        mini_dim: Optional[int] = None,
+        sparse: Optional[bool] = None,
+        sections: Optional[bool] = None
+    ):
+        """
+        按配置档创建集合
+        :param mini_dim: Matryoshka 截断维度，默认 EMBEDDING_MINI_DIM；0 表示旧布局
+        :param sparse: 是否带稀疏向量 (混合检索)，默认 HYBRID_SEARCH
+        :param sections: 是否带分段向量，默认 SECTION_VECTORS
+        """
+        profile = profile or self.profile
+        mini_dim = settings.EMBEDDING_MINI_DIM if mini_dim is None else mini_dim
+        if mini_dim >= vector_size:
+            mini_dim = 0  # 截断维度不小于完整维度时没有意义，退回单向量布局
+        sparse = settings.HYBRID_SEARCH if sparse is None else sparse
+        sections = settings.SECTION_VECTORS if sections is None else sections
+        self.client.create_collection(
+            collection_name=collection_name,
+            vectors_config=profile.vectors_config(vector_size, mini_dim, sections),
+            sparse_vectors_config=profile.sparse_vectors_config() if sparse else None,
+            # 两阶段布局的量化配置在截断向量上单独设置
+            quantization_config=profile.quantization_config() if mini_dim <= 0 else None,
+            hnsw_config=profile.hnsw_config(),
+            on_disk_payload=profile.payload_on_disk
+        )
+        self._layouts.pop(collection_name, None)
+        self.ensure_payload_indexes(collection_name)
+
+    # ---------- Payload 索引 ----------
+    def ensure_payload_indexes(self, collection_name: Optional[str] = None):
+        """为过滤字段建立 Payload 索引 (已存在的跳过)；过滤检索在 ANN 阶段生效，需要索引才能高效"""
+        name = collection_name or self.collection_name
+        existing = self.client.get_collection(name).payload_schema or {}
+        for field_name, schema in PAYLOAD_INDEXES.items():
+            if field_name in existing:
+                continue
+            self.client.create_payload_index(collection_name=name, field_name=field_name, field_schema=schema, wait=True)
+            logger.info(f"🗂️ Created payload index on '{field_name}' ({name})")
+
+    def normalize_year_payloads(self, collection_name: Optional[str] = None, batch_size: int = 256) -> int:
+        """
+        旧数据中 year 可能是字符串 ("2023" / "CVPR 2023")，整数索引匹配不到，统一改写为整数
+        :return: 改写的点数
+        """
+        from core.bib_resolver import to_year
+
+        name = collection_name or self.collection_name
+        fixed, offset = 0, None
+        while True:
+            points, offset = self.client.scroll(
+                collection_name=name, limit=batch_size, offset=offset, with_payload=["metadata.year"], with_vectors=False
+            )
+            for point in points:
+                year = ((point.payload or {}).get("metadata") or {}).get("year")
+                if year is not None and not isinstance(year, int):
+                    self.client.set_payload(
+                        collection_name=name, payload={"year": to_year(year)}, points=[point.id], key="metadata"
+                    )
+                    fixed += 1
+            if offset is None:
+                break
+        return fixed
+
+    # ---------- 向量布局 ----------
+    def vector_layout(self, collection_name: Optional[str] = None) -> Dict[str, int]:
+        """
+        集合的向量布局 {向量名: 维度}；旧的无名向量集合返回 {"": 维度}，稀疏向量的维度记为 0
+        结果按集合版本号缓存：其他进程迁移集合 (别名切到新布局) 后版本号 +1，这里随之重新读取
+        """
+        name = collection_name or self.collection_name
+        version = self.get_version(name)
+        cached = self._layouts.get(name)
+        if cached is None or cached[0] != version:
+            params = self.client.get_collection(name).config.params
+            if isinstance(params.vectors, dict):
+                layout = {key: vector_params.size for key, vector_params in params.vectors.items()}
+            else:
+                layout = {"": params.vectors.size}
+            layout.update({key: 0 for key in (params.sparse_vectors or {})})
+            cached = (version, layout)
+            self._layouts[name] = cached
+        return cached[1]
+
+    def point_count(self, collection_name: Optional[str] = None) -> int:
+        """集合点数 (近似)，按集合版本号缓存，检索时判断"集合够小可以精确检索"不必每次多一次请求"""
+        name = collection_name or self.collection_name
+        version = self.get_version(name)
+        cached = self._counts.get(name)
+        if cached is None or cached[0] != version:
+            cached = (version, self.client.count(name, exact=False).count)
+            self._counts[name] = cached
+        return cached[1]
+
+    def full_dim(self, collection_name: Optional[str] = None) -> int:
+        layout = self.vector_layout(collection_name)
+        return layout.get(DENSE_VECTOR, layout.get("", 0))
+
+    def make_vectors(
+        self,
+        vector: Sequence[float],
+        collection_name: Optional[str] = None,
+        text: Optional[str] = None,
+        sparse: Optional[models.SparseVector] = None,
+        sections: Optional[Dict[str, Sequence[float]]] = None,
+        layout: Optional[Dict[str, int]] = None
+    ):
+        """
+        把完整维度的 Embedding 转成集合需要的向量结构 (只写集合里存在的向量)
+        :param text: 文档正文，集合带稀疏向量时用来计算 BM25 词频
+        :param sparse: 已有的稀疏向量 (例如迁移时从源集合读出)，优先于 text
+        :param sections: 分段向量 {title / abstract / intro: 向量}，缺失的分段不写
+        :param layout: 已读出的向量布局；批量构造时每批读一次传进来，不必每个点查一次
+        """
+        layout = layout or self.vector_layout(collection_name)
+        if list(layout) == [""]:
+            return list(vector)
+        vectors = {}
+        for name in ("", DENSE_VECTOR):
+            if name in layout:
+                vectors[name] = list(vector)
+        if MINI_VECTOR in layout:
+            vectors[MINI_VECTOR] = truncate_vector(vector, layout[MINI_VECTOR])
+        for name, section_vector in (sections or {}).items():
+            # 迁移时源集合的分段向量可能比目标集合的维度短 (截断维度改小过)，无法还原，跳过
+            if name in SECTION_VECTORS and name in layout and len(section_vector or []) >= layout[name]:
+                vectors[name] = truncate_vector(section_vector, layout[name])
+        if SPARSE_VECTOR in layout:
+            if sparse is None:
+                sparse = sparse_encoder.encode_document(text or "")
+            if sparse.indices:
+                vectors[SPARSE_VECTOR] = sparse
+        return vectors
+
+    @staticmethod
+    def full_vector(point_vector) -> Optional[List[float]]:
+        """从查询结果的 vector 字段取出完整维度向量 (兼容无名 / 命名向量)"""
+        if isinstance(point_vector, dict):
+            return point_vector.get(DENSE_VECTOR, point_vector.get(""))
+        return point_vector
+
+    def section_vectors(self, collection_name: Optional[str] = None, layout: Optional[Dict[str, int]] = None) -> List[str]:
+        """集合中存在的分段向量名"""
+        layout = layout or self.vector_layout(collection_name)
+        return [name for name in SECTION_VECTORS if name in layout]
+
+    def fuse_section_vectors(
+        self,
+        point_vector,
+        weights: Dict[str, float],
+        collection_name: Optional[str] = None,
+        layout: Optional[Dict[str, int]] = None
+    ) -> Optional[np.ndarray]:
+        """
+        按权重融合一篇论文的整体向量和各分段向量 (用于聚类等需要单一向量的场景)
+        融合在分段向量的维度上进行 (整体向量做 Matryoshka 截断)，缺失的分段直接跳过，保证所有论文维度一致
+        :param layout: 已读出的向量布局；逐点融合时由调用方每批读一次传进来
+        """
+        layout = layout or self.vector_layout(collection_name)
+        full = self.full_vector(point_vector)
+        names = self.section_vectors(layout=layout)
+        if full is None or not names or not isinstance(point_vector, dict):
+            return np.asarray(full, dtype=np.float32) if full is not None else None
+
+        dim = layout[names[0]]
+        fused = weights.get(DENSE_VECTOR, 1.0) * np.asarray(truncate_vector(full, dim), dtype=np.float32)
+        for name in names:
+            if point_vector.get(name):
+                fused += weights.get(name, 0.0) * np.asarray(truncate_vector(point_vector[name], dim), dtype=np.float32)
+        norm = np.linalg.norm(fused)
+        return fused / norm if norm > 0 else fused
+
+    def search_params(self) -> Optional[models.SearchParams]:
+        return self.profile.search_params()
+
     def ensure_collection_exists(self, vector_size: int = 2048):
         """
-        检查集合是否存在，不存在则创建
+        检查集合是否存在，不存在则按当前配置档创建
         :param vector_size: 向量维度。
                             Qwen-v4 = 2048
                             请务必确认你的 Embedding 模型输出维度！
@@ -57,36 +506,204 @@ class QdrantManager:
         if not exists:
             logger.warning(f"⚠️ Collection '{self.collection_name}' not found. Creating...")
             try:
-                client.create_collection(
-                    collection_name=self.collection_name,
-                    vectors_config=models.VectorParams(
-                        size=vector_size,
-                        distance=models.Distance.COSINE
-                    )
-                )
-                logger.info(f"✅ Collection '{self.collection_name}' created (size={vector_size})")
+                self.create_collection(self.collection_name, vector_size)
+                logger.info(f"✅ Collection '{self.collection_name}' created (size={vector_size}, profile={self.profile.name})")
             except Exception as e:
                 logger.error(f"❌ Failed to create collection: {e}")
                 raise
         else:
             logger.info(f"✅ Collection '{self.collection_name}' exists.")
+            # 旧集合也补建过滤字段的索引
+            self.ensure_payload_indexes()
 
     def delete_collection(self):
         """危险操作：删除集合"""
         self.client.delete_collection(self.collection_name)
+        self._layouts.pop(self.collection_name, None)
+        self.bump_version()
         logger.warning(f"🗑️ Collection '{self.collection_name}' deleted.")
 
+    # ---------- 集合版本号 ----------
+    # 每次写入 / 删除集合都 +1，依赖集合内容的缓存 (如 core.answer_cache) 用它判断是否过期
+    def _state_db(self) -> sqlite3.Connection:
+        """版本号库的长连接 (首次使用时打开并建表)；多线程共用，调用方需持有 _state_lock"""
+        if self._state_conn is None:
+            conn = sqlite3.connect(settings.QDRANT_STATE_DB, timeout=10, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS collection_versions (name TEXT PRIMARY KEY, version INTEGER NOT NULL)")
+            conn.commit()
+            self._state_conn = conn
+        return self._state_conn
+
+    def get_version(self, collection_name: Optional[str] = None) -> int:
+        with self._state_lock:
+            row = self._state_db().execute(
+                "SELECT version FROM collection_versions WHERE name = ?", (collection_name or self.collection_name,)
+            ).fetchone()
+        return row[0] if row else 0
+
+    def bump_version(self, collection_name: Optional[str] = None) -> int:
+        name = collection_name or self.collection_name
+        with self._state_lock, self._state_db() as conn:
+            conn.execute(
+                "INSERT INTO collection_versions (name, version) VALUES (?, 1) "
+                "ON CONFLICT(name) DO UPDATE SET version = version + 1",
+                (name,)
+            )
+            return conn.execute("SELECT version FROM collection_versions WHERE name = ?", (name,)).fetchone()[0]
+
     def get_info(self):
         """获取集合统计信息"""
         return self.client.get_collection(self.collection_name)
 
+    # ---------- 配置档迁移 ----------
+    def resolve_alias(self, name: Optional[str] = None) -> Optional[str]:
+        """别名指向的物理集合；name 不是别名时返回 None"""
+        name = name or self.collection_name
+        for alias in self.client.get_aliases().aliases:
+            if alias.alias_name == name:
+                return alias.collection_name
+        return None
+
+    def copy_points(self, source: str, target: str, batch_size: int = 256, limit: Optional[int] = None) -> int:
+        """把 source 的点 (向量 + payload，保留原 ID) 分批复制到 target"""
+        from core.doc_store import load_bodies
+
+        copied, offset = 0, None
+        while True:
+            page = batch_size if limit is None else min(batch_size, limit - copied)
+            if page <= 0:
+                break
+            points, offset = self.client.scroll(
+                collection_name=source, limit=page, offset=offset, with_vectors=True, with_payload=True
+            )
+            if not points:
+                break
+            # 精简 payload 的点没有正文，需要补算稀疏向量时从本地存储取
+            bodies = load_bodies([p.id for p in points if "page_content" not in (p.payload or {})])
+            layout = self.vector_layout(target)
+            self.client.upsert(
+                collection_name=target,
+                points=[
+                    models.PointStruct(
+                        id=p.id,
+                        vector=self.make_vectors(
+                            self.full_vector(p.vector), target,
+                            text=(p.payload or {}).get("page_content") or getattr(bodies.get(str(p.id)), "page_content", None),
+                            sparse=p.vector.get(SPARSE_VECTOR) if isinstance(p.vector, dict) else None,
+                            sections={k: v for k, v in p.vector.items() if k in SECTION_VECTORS} if isinstance(p.vector, dict) else None,
+                            layout=layout
+                        ),
+                        payload=p.payload
+                    )
+                    for p in points
+                ],
+                wait=True
+            )
+            copied += len(points)
+            if offset is None:
+                break
+        return copied
+
+    def point_alias(self, target: str, alias: Optional[str] = None):
+        """
+        把别名 (默认 QDRANT_COLLECTION_NAME) 指向 target；别名已存在时删除 + 新建在同一个请求里原子完成
+        迁移中途失败时也可以用它手动恢复: python -m core.qdrant alias <物理集合名>
+        """
+        alias = alias or self.collection_name
+        operations = []
+        if self.resolve_alias(alias) is not None:
+            operations.append(models.DeleteAliasOperation(delete_alias=models.DeleteAlias(alias_name=alias)))
+        operations.append(models.CreateAliasOperation(create_alias=models.CreateAlias(collection_name=target, alias_name=alias)))
+        self.client.update_collection_aliases(change_aliases_operations=operations)
+        self._layouts.pop(alias, None)
+        # 其他进程 (Streamlit) 缓存的向量布局 / 答案缓存 / 会话工作集按版本号失效
+        self.bump_version(alias)
+
+    def migrate_collection(self, profile_name: str, batch_size: int = 256, keep_old: bool = False) -> str:
+        """
+        按新的配置档重建集合：复制到新的物理集合，再把别名切过去
+        新集合的向量布局按当前 EMBEDDING_MINI_DIM / HYBRID_SEARCH 生成，
+        旧的无名向量集合也借此升级为两阶段布局并补上稀疏向量 (从 payload 正文计算)；
+        分段向量需要重新 Embedding，迁移不会补算，旧数据只参与整体向量 / 稀疏检索
+        对外的集合名 (QDRANT_COLLECTION_NAME) 从此是一个别名，检索 / 写入代码无需改动
+        - 已经是别名：别名切换是原子操作，不影响线上检索
+        - 还是物理集合：别名不能与集合同名，只能先删旧集合再建别名，中间有极短的不可用窗口；
+          keep_old=True 时先把旧集合原样复制为 {alias}__backup_<时间戳> 再删除
+        注意：迁移期间的新写入不会被复制，请在入库空闲时执行
+        :param keep_old: 是否保留旧数据 (已是别名时保留旧物理集合，否则保留备份副本)
+        :return: 新的物理集合名
+        """
+        from core.qdrant_transfer import copy_collection, recreate_collection
+
+        profile = get_profile(profile_name)
+        alias = self.collection_name
+        source = self.resolve_alias(alias) or alias
+        vector_size = self.full_dim(alias)
+        stamp = int(time.time())
+
+        target = f"{alias}__{profile.name}_{stamp}"
+        logger.info(f"🚚 Migrating '{source}' -> '{target}' (profile={profile.name})...")
+        self.create_collection(target, vector_size, profile)
+        copied = self.copy_points(source, target, batch_size=batch_size)
+
+        if source == alias:
+            if keep_old:
+                backup = f"{alias}__backup_{stamp}"
+                logger.info(f"💾 Backing up '{source}' -> '{backup}' before dropping the name...")
+                recreate_collection(self.client, self.client, source, target_name=backup)
+                backed_up = copy_collection(self.client, self.client, source, batch_size, target_name=backup)
+                if backed_up != copied:
+                    raise RuntimeError(
+                        f"Backup '{backup}' has {backed_up} points but '{source}' had {copied}; "
+                        f"refusing to drop '{source}'. Migrated data is in '{target}'."
+                    )
+            self.client.delete_collection(source)
+
+        try:
+            self.point_alias(target, alias)
+        except Exception as e:
+            logger.error(
+                f"❌ Failed to point alias '{alias}' at '{target}': {e}. "
+                + (f"'{source}' is unchanged; " if source != alias else f"'{alias}' currently resolves to nothing; ")
+                + f"the migrated data is in '{target}'. Retry with: python -m core.qdrant alias {target}"
+            )
+            raise
+        if source != alias and not keep_old:
+            self.client.delete_collection(source)
+
+        logger.info(f"✅ Migrated {copied} points. Alias '{alias}' -> '{target}'. "
+                    f"Set QDRANT_COLLECTION_PROFILE={profile.name} to match.")
+        return target
+
 # 实例化单例
 qdrant_manager = QdrantManager()
 
 if __name__ == "__main__":
     # --- 简单的测试脚本 ---
     # 在命令行运行: python -m core.qdrant
-    
+    # 迁移配置档: python -m core.qdrant migrate scalar [--keep-old]
+    # 迁移中途失败时手动把别名指向新集合: python -m core.qdrant alias <物理集合名>
+    # 补建过滤索引 / 规范化旧数据的 year: python -m core.qdrant index
+    # 把已有数据改写为精简 payload (正文移到本地 doc_store): python -m core.qdrant slim
+    # 嵌入式 <-> 远程之间搬运集合: python -m core.qdrant_transfer remote embedded
+    if len(sys.argv) in (3, 4) and sys.argv[1] == "migrate":
+        qdrant_manager.migrate_collection(sys.argv[2], keep_old=sys.argv[3:] == ["--keep-old"])
+        sys.exit(0)
+    if len(sys.argv) == 3 and sys.argv[1] == "alias":
+        qdrant_manager.point_alias(sys.argv[2])
+        print(f"✅ Alias '{qdrant_manager.collection_name}' -> '{sys.argv[2]}'")
+        sys.exit(0)
+    if len(sys.argv) == 2 and sys.argv[1] == "index":
+        qdrant_manager.ensure_payload_indexes()
+        print(f"✅ Normalized year on {qdrant_manager.normalize_year_payloads()} points")
+        sys.exit(0)
+    if len(sys.argv) == 2 and sys.argv[1] == "slim":
+        from core.doc_store import slim_collection
+
+        print(f"✅ Slimmed {slim_collection()} points. Set QDRANT_LEAN_PAYLOAD=true to keep new points lean.")
+        sys.exit(0)
+
     # 为了测试，我们临时定义一个 logger
     import logging
     logging.basicConfig(level=logging.INFO)
@@ -0,0 +1,172 @@
+"""
+Qdrant 集合导出 / 导入：嵌入式 (QDRANT_MODE=embedded，本地目录) <-> 远程 (自建 / Qdrant Cloud)
+按源集合的向量布局 (命名向量 / 稀疏向量 / 各向量的量化参数) 在目标端重建集合，
+再分批 scroll + upsert 复制点 (向量 + payload，保留原 ID)，最后同步指向这些集合的别名
+- 点 ID 不变：精简 payload 的正文仍能在本地 doc_store 中按 point id 取回
+- 嵌入式存储不保存 HNSW / 集合级量化 / payload 落盘等配置，导出到远程时按当前配置档补齐
+- 嵌入式存储目录同一时间只能被一个进程打开：迁移前先停掉使用它的应用
+运行:
+  python -m core.qdrant_transfer remote embedded                       # 远程 -> 嵌入式 (全部集合)
+  python -m core.qdrant_transfer embedded remote --collections academic_knowledge --overwrite
+"""
+
+import argparse
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+from qdrant_client import QdrantClient, models
+
+# 确保能导入项目模块
+current_file_path = Path(__file__).resolve()
+project_root = current_file_path.parent.parent
+sys.path.append(str(project_root))
+
+from core.qdrant import MINI_VECTOR, PAYLOAD_INDEXES, get_profile, qdrant_manager
+from utils.logger import logger
+
+MODES = ("remote", "embedded")
+# 基准测试的临时集合不需要搬运
+SKIP_MARKER = "__bench_"
+
+
+def list_collections(client: QdrantClient) -> List[str]:
+    return [c.name for c in client.get_collections().collections if SKIP_MARKER not in c.name]
+
+
+def recreate_collection(
+    source: QdrantClient,
+    target: QdrantClient,
+    name: str,
+    overwrite: bool = False,
+    target_name: Optional[str] = None
+):
+    """
+    在 target 上按 source 中集合的配置新建集合
+    :param overwrite: 目标端已存在同名集合时是否删除重建，否则报错 (避免误覆盖线上数据)
+    :param target_name: 目标集合名，默认与源集合同名 (同一个客户端内做备份副本时指定)
+    """
+    target_name = target_name or name
+    if target.collection_exists(target_name):
+        if not overwrite:
+            raise RuntimeError(f"Collection '{target_name}' already exists in the target. Pass overwrite=True to replace it.")
+        target.delete_collection(target_name)
+
+    info = source.get_collection(name)
+    params = info.config.params
+    profile = get_profile()
+    # 嵌入式存储返回的集合级 HNSW / 量化配置是默认值，按当前配置档补齐；
+    # 两阶段布局的量化在截断向量自身的配置里，已随 vectors 一起复制
+    two_stage = isinstance(params.vectors, dict) and MINI_VECTOR in params.vectors
+    target.create_collection(
+        collection_name=target_name,
+        vectors_config=params.vectors,
+        sparse_vectors_config=params.sparse_vectors,
+        quantization_config=info.config.quantization_config or (None if two_stage else profile.quantization_config()),
+        hnsw_config=profile.hnsw_config(),
+        on_disk_payload=params.on_disk_payload if params.on_disk_payload is not None else profile.payload_on_disk
+    )
+
+    # Payload 索引：源集合已有的 + 本项目的过滤字段 (嵌入式存储不记录索引)
+    schemas = {field: schema.data_type for field, schema in (info.payload_schema or {}).items()}
+    schemas.update(PAYLOAD_INDEXES)
+    for field_name, schema in schemas.items():
+        target.create_payload_index(collection_name=target_name, field_name=field_name, field_schema=schema, wait=True)
+
+
+def copy_collection(
+    source: QdrantClient,
+    target: QdrantClient,
+    name: str,
+    batch_size: int = 256,
+    target_name: Optional[str] = None
+) -> int:
+    """原样复制点 (全部命名向量 + payload)；布局与源集合一致，不需要像 copy_points 那样重算向量"""
+    copied, offset = 0, None
+    while True:
+        points, offset = source.scroll(
+            collection_name=name, limit=batch_size, offset=offset, with_vectors=True, with_payload=True
+        )
+        if points:
+            target.upsert(
+                collection_name=target_name or name,
+                points=[models.PointStruct(id=p.id, vector=p.vector, payload=p.payload) for p in points],
+                wait=True
+            )
+            copied += len(points)
+        if not points or offset is None:
+            break
+    return copied
+
+
+def copy_aliases(source: QdrantClient, target: QdrantClient, names: Sequence[str]) -> List[str]:
+    """把 source 中指向这些集合的别名在 target 上重建 (已存在的同名别名会被改指)"""
+    existing = {alias.alias_name for alias in target.get_aliases().aliases}
+    copied = []
+    for alias in source.get_aliases().aliases:
+        if alias.collection_name not in names:
+            continue
+        operations = []
+        if alias.alias_name in existing:
+            operations.append(models.DeleteAliasOperation(delete_alias=models.DeleteAlias(alias_name=alias.alias_name)))
+        operations.append(models.CreateAliasOperation(
+            create_alias=models.CreateAlias(collection_name=alias.collection_name, alias_name=alias.alias_name)
+        ))
+        target.update_collection_aliases(change_aliases_operations=operations)
+        copied.append(alias.alias_name)
+    return copied
+
+
+def transfer(
+    source_mode: str,
+    target_mode: str,
+    collections: Optional[Sequence[str]] = None,
+    batch_size: int = 256,
+    overwrite: bool = False
+) -> Dict[str, int]:
+    """
+    :param source_mode / target_mode: remote / embedded (连接参数分别取自 QDRANT_URL 等和 QDRANT_PATH)
+    :param collections: 要搬运的物理集合，默认源端全部集合
+    :return: {集合名: 复制的点数}
+    """
+    if source_mode == target_mode:
+        raise ValueError("Source and target mode must differ (remote <-> embedded).")
+
+    source = qdrant_manager.make_client(mode=source_mode)
+    try:
+        target = qdrant_manager.make_client(mode=target_mode)
+        try:
+            names = list(collections) if collections else list_collections(source)
+            copied = {}
+            for name in names:
+                logger.info(f"🚚 Transferring '{name}' ({source_mode} -> {target_mode})...")
+                recreate_collection(source, target, name, overwrite)
+                copied[name] = copy_collection(source, target, name, batch_size)
+                logger.info(f"✅ Copied {copied[name]} points of '{name}'.")
+            aliases = copy_aliases(source, target, names)
+        finally:
+            target.close()
+    finally:
+        source.close()
+
+    # 目标端内容变了：依赖集合内容的缓存 (答案缓存等) 按新版本号失效
+    for name in [*names, *aliases]:
+        qdrant_manager.bump_version(name)
+    if aliases:
+        logger.info(f"🔗 Aliases recreated: {', '.join(aliases)}")
+    logger.info(f"🎉 Transfer finished. Set QDRANT_MODE={target_mode} to use the {target_mode} store.")
+    return copied
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move Qdrant collections between embedded and remote modes")
+    parser.add_argument("source", choices=MODES)
+    parser.add_argument("target", choices=MODES)
+    parser.add_argument("--collections", nargs="+", default=None, help="要搬运的集合 (默认全部)")
+    parser.add_argument("--batch", type=int, default=256, help="每批复制的点数")
+    parser.add_argument("--overwrite", action="store_true", help="目标端已有同名集合时删除重建")
+    args = parser.parse_args()
+
+    result = transfer(args.source, args.target, args.collections, args.batch, args.overwrite)
+    for collection, count in result.items():
+        print(f"{collection:<40} {count:>8} points")
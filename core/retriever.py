@@ -0,0 +1,357 @@
+"""
+知识库检索 (直接调用 Qdrant query_points)
+相比 QdrantVectorStore.similarity_search，可以一并取回向量，供线程级工作集本地重排使用
+集合带 dense_mini 向量时走两阶段检索：截断向量 ANN 取候选 -> 完整向量重排 (一次请求内完成)
+集合带 sparse / 分段向量时走混合检索：整体稠密、各分段 (title / abstract / intro)、稀疏 (BM25) 多路候选按加权 RRF 融合
+支持按 year / venue / authors / content_type 过滤 (对应 QdrantManager 建立的 Payload 索引)；
+全文分块集合额外按 paper_id 过滤，实现"先找论文、再找论文内片段"的两级检索 (core.chunk_index)
+检索档位 (fast / balanced / exhaustive) 按请求设置 hnsw_ef、量化重排的 oversampling，小集合直接精确检索
+"""
+
+import json
+import re
+import threading
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from qdrant_client import models
+
+from config.settings import settings
+from core.doc_store import point_to_document
+from core.bib_resolver import to_year
+from core.qdrant import (
+    DENSE_VECTOR, MINI_VECTOR, SECTION_VECTORS, SPARSE_VECTOR, CollectionProfile, qdrant_manager, truncate_vector
+)
+from core.sparse import sparse_encoder
+
+# 启发式解析问题时识别的会议 / 期刊缩写 (Router 的 LLM 解析失败时使用)
+KNOWN_VENUES = (
+    "CVPR", "ICCV", "ECCV", "NeurIPS", "NIPS", "ICML", "ICLR", "AAAI", "IJCAI", "ACL", "EMNLP", "NAACL",
+    "COLING", "KDD", "WWW", "SIGIR", "WSDM", "CIKM", "SIGGRAPH", "ICRA", "IROS", "CoRL", "RSS", "MICCAI",
+    "TPAMI", "IJCV", "TIP", "JMLR", "TMLR", "TACL"
+)
+
+_YEAR = r"((?:19|20)\d{2})"
+_YEAR_RANGE = re.compile(_YEAR + r"\s*(?:-|–|~|to|到|至)\s*" + _YEAR, re.IGNORECASE)
+_YEAR_BETWEEN = re.compile(r"between\s+" + _YEAR + r"\s+and\s+" + _YEAR, re.IGNORECASE)
+_YEAR_SINCE = re.compile(r"(?:since|from|starting|after)\s+" + _YEAR + r"|" + _YEAR + r"\s*年?\s*(?:以来|之后|以后|起|后|onwards|or later|and later)", re.IGNORECASE)
+_YEAR_BEFORE = re.compile(r"(?:before|until|prior to)\s+" + _YEAR + r"|" + _YEAR + r"\s*年?\s*(?:之前|以前|前)", re.IGNORECASE)
+_YEAR_IN = re.compile(r"\bin\s+" + _YEAR + r"\b|" + _YEAR + r"\s*年", re.IGNORECASE)
+_AUTHOR_BY = re.compile(r"\bby\s+([A-Z][a-z]+(?:[ -][A-Z][a-z]+)+)")
+
+@dataclass(frozen=True)
+class SearchMode:
+    """
+    检索档位：在延迟和召回之间取舍，每个请求单独指定 (集合配置档决定存储，档位决定怎么查)
+    """
+    name: str
+    description: str
+    hnsw_ef: Optional[int] = None           # HNSW 搜索宽度，None 使用服务端默认值
+    oversampling: Optional[float] = None    # 量化重排的 oversampling，None 使用配置档的值
+    rescore_factor: Optional[int] = None    # 每路候选数 = limit * rescore_factor，None 使用 QDRANT_RESCORE_FACTOR
+    exact_max_points: int = 0               # 集合点数不超过该值时直接精确检索，0 表示从不
+
+    def search_params(self, profile: CollectionProfile, exact: bool = False) -> Optional[models.SearchParams]:
+        return profile.search_params(hnsw_ef=self.hnsw_ef, oversampling=self.oversampling, exact=exact)
+
+
+SEARCH_MODES: Dict[str, SearchMode] = {
+    mode.name: mode for mode in (
+        # 即时回答：窄搜索宽度、不额外重排，召回略降
+        SearchMode(name="fast", description="Lowest latency, approximate", hnsw_ef=32, oversampling=1.0, rescore_factor=2),
+        # 与之前的行为一致；几千篇以内的小库暴力计算也只要几毫秒，直接精确检索
+        SearchMode(name="balanced", description="Default HNSW settings, exact on small libraries", exact_max_points=2000),
+        # 文献综述：宽搜索、多取候选重排，中等规模的库也精确检索
+        SearchMode(
+            name="exhaustive", description="Highest recall for literature reviews",
+            hnsw_ef=512, oversampling=4.0, rescore_factor=10, exact_max_points=50000
+        ),
+    )
+}
+
+
+def get_search_mode(name: Optional[str] = None) -> SearchMode:
+    name = name or settings.SEARCH_MODE
+    if name not in SEARCH_MODES:
+        raise ValueError(f"Unknown search mode '{name}'. Available: {', '.join(SEARCH_MODES)}")
+    return SEARCH_MODES[name]
+
+
+class LatencyTracker:
+    """按检索档位记录最近的检索耗时 (进程内滑动窗口)，供 UI 展示各档位的实测延迟"""
+
+    def __init__(self, window: int = 200):
+        self.window = window
+        self._samples: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+
+    def record(self, mode: str, ms: float):
+        with self._lock:
+            self._samples.setdefault(mode, deque(maxlen=self.window)).append(ms)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """:return: {档位: {"count", "p50", "p95"}} (毫秒)"""
+        with self._lock:
+            samples = {mode: list(values) for mode, values in self._samples.items() if values}
+        return {
+            mode: {"count": len(values), "p50": float(np.percentile(values, 50)), "p95": float(np.percentile(values, 95))}
+            for mode, values in samples.items()
+        }
+
+
+# 单例
+search_latency = LatencyTracker()
+
+# 去掉停用词后词项数不超过该值的查询视为"标题类"查询 (例如直接输入论文名 / 方法名)，提高 title 分段的权重
+TITLE_QUERY_MAX_TERMS = 6
+TITLE_QUERY_BOOST = 2.0
+
+
+@dataclass
+class SearchFilters:
+    """
+    结构化检索条件 (同一字段内多个值为 OR，不同字段之间为 AND)
+    venue / authors 走全文索引，"CVPR" 能匹配 "CVPR 2024" / "Proceedings of CVPR"
+    """
+    year_from: Optional[int] = None
+    year_to: Optional[int] = None
+    venues: List[str] = field(default_factory=list)
+    authors: List[str] = field(default_factory=list)
+    content_types: List[str] = field(default_factory=list)
+    paper_ids: List[str] = field(default_factory=list)  # 全文分块检索时限定所属论文 (主集合 point id)
+
+    def is_empty(self) -> bool:
+        return not (self.year_from or self.year_to or self.venues or self.authors or self.content_types or self.paper_ids)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @property
+    def key(self) -> str:
+        """用于比较两组过滤条件是否相同 (例如会话工作集)"""
+        return json.dumps(self.to_dict(), sort_keys=True)
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Any]]) -> "SearchFilters":
+        """宽松解析 (LLM 输出 / State)，非法值直接丢弃"""
+        data = data or {}
+
+        def str_list(value) -> List[str]:
+            if isinstance(value, str):
+                value = [value]
+            return [str(v).strip() for v in (value or []) if str(v).strip()]
+
+        filters = cls(
+            year_from=to_year(data.get("year_from")),
+            year_to=to_year(data.get("year_to")),
+            venues=str_list(data.get("venues")),
+            authors=str_list(data.get("authors")),
+            content_types=str_list(data.get("content_types")),
+            paper_ids=str_list(data.get("paper_ids"))
+        )
+        if filters.year_from and filters.year_to and filters.year_from > filters.year_to:
+            filters.year_from, filters.year_to = filters.year_to, filters.year_from
+        return filters
+
+    @classmethod
+    def from_question(cls, question: str) -> "SearchFilters":
+        """启发式解析问题中的年份 / 会议 / 作者 (不调用 LLM)"""
+        filters = cls()
+        if m := (_YEAR_RANGE.search(question) or _YEAR_BETWEEN.search(question)):
+            filters.year_from, filters.year_to = sorted((int(m.group(1)), int(m.group(2))))
+        elif m := _YEAR_SINCE.search(question):
+            year = int(m.group(1) or m.group(2))
+            filters.year_from = year + 1 if m.group(0).lower().startswith("after") else year
+        elif m := _YEAR_BEFORE.search(question):
+            year = int(m.group(1) or m.group(2))
+            filters.year_to = year if m.group(0).lower().startswith("until") else year - 1
+        elif m := _YEAR_IN.search(question):
+            filters.year_from = filters.year_to = int(m.group(1) or m.group(2))
+
+        for venue in KNOWN_VENUES:
+            if re.search(rf"(?<![A-Za-z]){venue}(?![A-Za-z])", question, re.IGNORECASE):
+                filters.venues.append(venue)
+        filters.authors = _AUTHOR_BY.findall(question)
+        return filters
+
+    def to_qdrant(self) -> Optional[models.Filter]:
+        if self.is_empty():
+            return None
+        must: List[Any] = []
+        if self.year_from or self.year_to:
+            must.append(models.FieldCondition(
+                key="metadata.year", range=models.Range(gte=self.year_from, lte=self.year_to)
+            ))
+        for key, values in (("metadata.venue", self.venues), ("metadata.authors", self.authors)):
+            if values:
+                must.append(models.Filter(should=[
+                    models.FieldCondition(key=key, match=models.MatchText(text=value)) for value in values
+                ]))
+        if self.content_types:
+            must.append(models.FieldCondition(key="metadata.content_type", match=models.MatchAny(any=self.content_types)))
+        if self.paper_ids:
+            must.append(models.FieldCondition(key="metadata.paper_id", match=models.MatchAny(any=self.paper_ids)))
+        return models.Filter(must=must)
+
+    def describe(self) -> str:
+        parts = []
+        if self.year_from or self.year_to:
+            parts.append(f"year {self.year_from or '...'}-{self.year_to or '...'}")
+        if self.venues:
+            parts.append("venue " + " | ".join(self.venues))
+        if self.authors:
+            parts.append("authors " + " | ".join(self.authors))
+        if self.content_types:
+            parts.append("type " + " | ".join(self.content_types))
+        if self.paper_ids:
+            parts.append(f"{len(self.paper_ids)} papers")
+        return ", ".join(parts) or "none"
+
+
+@dataclass
+class RetrievedPoint:
+    document: Document
+    vector: Optional[np.ndarray]  # 已归一化；with_vectors=False 时为 None
+    score: float
+
+
+def normalize(vector: Sequence[float]) -> np.ndarray:
+    vec = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm > 0 else vec
+
+
+def branch_weights(query_text: Optional[str]) -> Dict[str, float]:
+    """
+    各路检索结果的融合权重 (SECTION_WEIGHTS)，按查询形态调整：
+    短查询多半是在找某篇论文 / 某个方法名，title 分段权重加倍；长查询 (方法细节) 保持 abstract / intro 为主
+    """
+    weights = dict(settings.SECTION_WEIGHTS)
+    if query_text and len(sparse_encoder.tokenize(query_text)) <= TITLE_QUERY_MAX_TERMS:
+        weights["title"] = weights.get("title", 0.0) * TITLE_QUERY_BOOST
+    return weights
+
+
+def fusion_branches(layout: Dict[str, int], query_text: Optional[str] = None) -> List[str]:
+    """
+    search_points 在该集合上会融合的检索分路 (顺序与 RRF 权重一致)
+    只有 [DENSE_VECTOR] 一路时，结果就是完整向量的余弦排序，可以在本地用候选向量复现
+    """
+    weights = branch_weights(query_text)
+    branches = [DENSE_VECTOR]
+    branches.extend(name for name in SECTION_VECTORS if name in layout and weights.get(name, 0) > 0)
+    if settings.HYBRID_SEARCH and query_text and SPARSE_VECTOR in layout and sparse_encoder.encode_query(query_text).indices:
+        branches.append(SPARSE_VECTOR)
+    return branches
+
+
+def search_points(
+    query_vector: Sequence[float],
+    limit: int,
+    with_vectors: bool = False,
+    collection_name: Optional[str] = None,
+    profile: Optional[CollectionProfile] = None,
+    filters: Optional[SearchFilters] = None,
+    query_text: Optional[str] = None,
+    mode: Optional[SearchMode] = None
+) -> List[RetrievedPoint]:
+    """
+    向量检索，返回按相似度降序排列的结果
+    :param query_vector: 完整维度的问题向量
+    :param profile: 检索参数所用的配置档，默认 QDRANT_COLLECTION_PROFILE
+    :param filters: 结构化过滤条件，在 ANN 阶段生效 (走 Payload 索引)，不是检索后再筛
+    :param query_text: 问题原文；集合带稀疏向量且开启 HYBRID_SEARCH 时用于稀疏检索
+    :param mode: 检索档位，默认 SEARCH_MODE
+    """
+    collection_name = collection_name or settings.QDRANT_COLLECTION_NAME
+    mode = mode or get_search_mode()
+    exact = mode.exact_max_points > 0 and qdrant_manager.point_count(collection_name) <= mode.exact_max_points
+    params = mode.search_params(profile or qdrant_manager.profile, exact=exact)
+    layout = qdrant_manager.vector_layout(collection_name)
+    query_filter = filters.to_qdrant() if filters else None
+    candidates = limit * (mode.rescore_factor or settings.QDRANT_RESCORE_FACTOR)
+    vector_selector = ([DENSE_VECTOR] if DENSE_VECTOR in layout else True) if with_vectors else False
+
+    # 稠密检索：两阶段布局先在截断向量上取候选，再用完整向量重排；旧布局直接查完整向量
+    if MINI_VECTOR in layout:
+        dense = models.Prefetch(
+            prefetch=models.Prefetch(
+                query=truncate_vector(query_vector, layout[MINI_VECTOR]),
+                using=MINI_VECTOR,
+                limit=candidates,
+                params=params,
+                filter=query_filter
+            ),
+            query=list(query_vector),
+            using=DENSE_VECTOR,
+            limit=candidates
+        )
+    else:
+        dense = models.Prefetch(
+            query=list(query_vector),
+            using=DENSE_VECTOR if DENSE_VECTOR in layout else None,
+            limit=candidates,
+            params=params,
+            filter=query_filter
+        )
+
+    branches: List[Tuple[str, models.Prefetch]] = [(DENSE_VECTOR, dense)]
+    weights = branch_weights(query_text)
+    for name in fusion_branches(layout, query_text)[1:]:
+        if name == SPARSE_VECTOR:
+            branches.append((name, models.Prefetch(
+                query=sparse_encoder.encode_query(query_text), using=SPARSE_VECTOR, limit=candidates, filter=query_filter
+            )))
+        else:
+            branches.append((name, models.Prefetch(
+                query=truncate_vector(query_vector, layout[name]),
+                using=name,
+                limit=candidates,
+                params=params,
+                filter=query_filter
+            )))
+
+    if len(branches) > 1:
+        # 多路候选按排名倒数加权融合 (RRF)，不需要对齐余弦相似度和 BM25 分数的量纲
+        response = qdrant_manager.client.query_points(
+            collection_name=collection_name,
+            prefetch=[prefetch for _, prefetch in branches],
+            query=models.RrfQuery(rrf=models.Rrf(weights=[weights.get(name, 1.0) for name, _ in branches])),
+            limit=limit,
+            with_payload=True,
+            with_vectors=vector_selector
+        )
+    elif dense.prefetch is not None:
+        response = qdrant_manager.client.query_points(
+            collection_name=collection_name,
+            prefetch=dense.prefetch,
+            query=dense.query,
+            using=dense.using,
+            limit=limit,
+            with_payload=True,
+            with_vectors=vector_selector
+        )
+    else:
+        response = qdrant_manager.client.query_points(
+            collection_name=collection_name,
+            query=list(query_vector),
+            using=dense.using,
+            limit=limit,
+            with_payload=True,
+            with_vectors=vector_selector,
+            search_params=params,
+            query_filter=query_filter
+        )
+
+    results = []
+    for point in response.points:
+        vector = qdrant_manager.full_vector(point.vector) if with_vectors else None
+        results.append(RetrievedPoint(
+            document=point_to_document(point, collection_name),
+            vector=normalize(vector) if vector is not None else None,
+            score=point.score
+        ))
+    return results
@@ -1,35 +1,283 @@
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
 from tavily import TavilyClient
 from config.settings import settings
 from utils.logger import logger
 
+# 不同用途的缓存有效期 (秒)
+# - metadata: 论文的 venue / year 几乎不会变，可以缓存很久
+# - research: 用户的研究问题需要相对新鲜的结果
+CACHE_TTL_SECONDS = {
+    "metadata": 30 * 24 * 3600,
+    "research": 6 * 3600,
+}
+DEFAULT_TTL_SECONDS = 24 * 3600
+
+# 两段内容的 shingle Jaccard 相似度超过该阈值视为近似重复 (转载 / 镜像站)
+NEAR_DUPLICATE_THRESHOLD = 0.8
+
+
+def normalize_query(query: str) -> str:
+    """统一大小写与空白，去掉首尾标点，让等价的查询命中同一条缓存"""
+    query = " ".join(query.lower().split())
+    return re.sub(r"^[\W_]+|[\W_]+$", "", query)
+
+
+def _shingles(text: str, size: int = 5) -> set:
+    """按词切 n-gram shingle，用于近似重复检测"""
+    words = re.findall(r"\w+", text.lower())
+    if len(words) <= size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def _normalize_url(url: str) -> str:
+    """去掉协议、www、锚点和结尾斜杠，http/https 等价链接视为同一个 URL"""
+    url = re.sub(r"^https?://(www\.)?", "", url.strip().lower())
+    return url.split("#", 1)[0].rstrip("/")
+
+
+def dedupe_results(results: Sequence[Dict[str, Any]], threshold: float = NEAR_DUPLICATE_THRESHOLD) -> List[Dict[str, Any]]:
+    """
+    合并多个查询的搜索结果：按 URL 去重，再按内容 shingle 相似度去掉近似重复
+    多个查询都命中的结果会提高排名 (score 取最大值，hits 计数)
+    :return: 按 (hits, score) 降序排列的结果列表
+    """
+    by_url: Dict[str, Dict[str, Any]] = {}
+    for res in results:
+        key = _normalize_url(res.get("url", ""))
+        if key in by_url:
+            kept = by_url[key]
+            hits = kept["hits"] + 1
+            # 同一 URL 保留得分更高的那份摘录
+            if res.get("score", 0.0) > kept["score"]:
+                kept.update(res)
+            kept["hits"] = hits
+        else:
+            by_url[key] = {**res, "score": res.get("score", 0.0), "hits": 1}
+
+    ranked = sorted(by_url.values(), key=lambda r: (r["hits"], r["score"]), reverse=True)
+
+    unique: List[Dict[str, Any]] = []
+    unique_shingles: List[set] = []
+    for res in ranked:
+        shingles = _shingles(res.get("content", ""))
+        duplicate = False
+        for kept, kept_shingles in zip(unique, unique_shingles):
+            union = shingles | kept_shingles
+            if union and len(shingles & kept_shingles) / len(union) >= threshold:
+                kept["hits"] += res["hits"]
+                duplicate = True
+                break
+        if not duplicate:
+            unique.append(res)
+            unique_shingles.append(shingles)
+
+    return sorted(unique, key=lambda r: (r["hits"], r["score"]), reverse=True)
+
+
+def format_results(results: Sequence[Dict[str, Any]]) -> str:
+    """把搜索结果拼接成给 LLM 阅读的文本"""
+    return "\n---\n".join(f"来源: {res['url']}\n内容: {res['content']}" for res in results)
+
+
+class SearchCache:
+    """
+    Tavily 搜索结果的持久化缓存 (SQLite)
+    key = (规范化查询, search_depth, max_results)，按用途设置 TTL，超过容量按最近访问时间淘汰
+    """
+
+    def __init__(self, db_path: Path, max_entries: int = 5000):
+        self.db_path = Path(db_path)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS search_cache (
+                    key TEXT PRIMARY KEY,
+                    query TEXT NOT NULL,
+                    results TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL,
+                    hit_count INTEGER NOT NULL DEFAULT 0
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_search_cache_access ON search_cache (last_access)")
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=10)
+
+    @staticmethod
+    def make_key(query: str, search_depth: str, max_results: int) -> str:
+        raw = f"{normalize_query(query)}|{search_depth}|{max_results}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str, ttl: float) -> Optional[List[Dict[str, Any]]]:
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT results FROM search_cache WHERE key = ? AND created_at > ?",
+                (key, now - ttl)
+            ).fetchone()
+            if row:
+                conn.execute(
+                    "UPDATE search_cache SET last_access = ?, hit_count = hit_count + 1 WHERE key = ?",
+                    (now, key)
+                )
+        with self._lock:
+            if row:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return json.loads(row[0]) if row else None
+
+    def put(self, key: str, query: str, results: List[Dict[str, Any]]):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO search_cache (key, query, results, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, query, json.dumps(results, ensure_ascii=False), now, now)
+            )
+            # 超过容量：淘汰最久未访问的条目
+            conn.execute(
+                "DELETE FROM search_cache WHERE key IN ("
+                "  SELECT key FROM search_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?"
+                ")",
+                (self.max_entries,)
+            )
+
+    @property
+    def hit_rate(self) -> float:
+        """本进程内的命中率，只读内存计数器，命中路径上打日志用"""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        """带条目数的完整统计 (多一次 COUNT 查询，供 UI 展示)"""
+        with self._connect() as conn:
+            entries = conn.execute("SELECT COUNT(*) FROM search_cache").fetchone()[0]
+        return {
+            "entries": entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hit_rate,
+        }
+
+
 class SearchTool:
     def __init__(self):
         self.client = TavilyClient(api_key=settings.TAVILY_API_KEY)
+        self.cache = SearchCache(settings.SEARCH_CACHE_DB, max_entries=settings.SEARCH_CACHE_MAX_ENTRIES)
 
-    def search(self, query: str, max_results: int = 3) -> str:
+    def search_results(
+        self,
+        query: str,
+        max_results: int = 3,
+        search_depth: str = "advanced",
+        use_case: str = "research",
+        timeout: float = 60
+    ) -> List[Dict[str, Any]]:
         """
-        执行联网搜索并返回拼接好的字符串结果
+        执行联网搜索并返回原始结果列表 [{url, title, content, score}]
+        :param use_case: 决定缓存 TTL，见 CACHE_TTL_SECONDS
+        :param timeout: 单次 Tavily 请求的超时 (秒)
         """
+        key = self.cache.make_key(query, search_depth, max_results)
+        cached = self.cache.get(key, CACHE_TTL_SECONDS.get(use_case, DEFAULT_TTL_SECONDS))
+        if cached is not None:
+            logger.info(f"⚡ Search cache hit: {query} (hit rate {self.cache.hit_rate:.0%})")
+            return cached
+
         logger.info(f"🔍 Searching Web: {query}")
         try:
             # search_depth="advanced" 会深入抓取内容，适合找年份
             response = self.client.search(
-                query=query, 
-                search_depth="advanced", 
-                max_results=max_results
+                query=query,
+                search_depth=search_depth,
+                max_results=max_results,
+                timeout=timeout
             )
-            
-            results = []
-            for res in response.get('results', []):
-                snippet = res.get('content', '')
-                url = res.get('url', '')
-                results.append(f"来源: {url}\n内容: {snippet}")
-            
-            return "\n---\n".join(results)
-        
         except Exception as e:
             logger.error(f"❌ Search failed: {e}")
-            return ""
+            return []
+
+        results = [
+            {
+                "url": res.get("url", ""),
+                "title": res.get("title", ""),
+                "content": res.get("content", ""),
+                "score": res.get("score", 0.0),
+            }
+            for res in response.get("results", [])
+        ]
+        # 失败的请求不缓存，成功 (包括空结果) 才缓存
+        self.cache.put(key, query, results)
+        return results
+
+    def search(
+        self,
+        query: str,
+        max_results: int = 3,
+        search_depth: str = "advanced",
+        use_case: str = "research"
+    ) -> str:
+        """
+        执行联网搜索并返回拼接好的字符串结果
+        """
+        return format_results(self.search_results(query, max_results, search_depth, use_case))
+
+    def multi_search(
+        self,
+        queries: Sequence[str],
+        max_results: int = 3,
+        search_depth: str = "advanced",
+        use_case: str = "research",
+        timeout: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        并发执行多个查询，合并去重后按相关度排序
+        总耗时约等于最慢的一次搜索；超时的查询直接丢弃，不阻塞其它结果
+        :param timeout: 每个查询的超时 (秒)，默认取 settings.WEB_SEARCH_TIMEOUT
+        """
+        queries = list(dict.fromkeys(q for q in queries if q.strip()))
+        if not queries:
+            return []
+        timeout = timeout or settings.WEB_SEARCH_TIMEOUT
+
+        pool = ThreadPoolExecutor(max_workers=len(queries))
+        futures = {
+            pool.submit(self.search_results, q, max_results, search_depth, use_case, timeout): q
+            for q in queries
+        }
+        # 所有查询同时发出，因此统一的截止时间就是每个查询的超时
+        done, not_done = wait(futures, timeout=timeout)
+        pool.shutdown(wait=False, cancel_futures=True)
+
+        for future in not_done:
+            logger.warning(f"⏱️ Search timed out after {timeout}s: {futures[future]}")
+
+        results = []
+        for future in futures:  # 按查询顺序合并，保证结果稳定
+            if future in done:
+                results.extend(future.result())  # search_results 内部已捕获异常
+
+        merged = dedupe_results(results)
+        logger.info(f"🧹 Merged {len(results)} results from {len(done)}/{len(queries)} queries into {len(merged)} unique")
+        return merged
 
 # 单例
-search_tool = SearchTool()
\ No newline at end of file
+search_tool = SearchTool()
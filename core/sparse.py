@@ -0,0 +1,94 @@
+"""
+本地稀疏向量编码 (BM25 风格)
+方法名 / 数据集名 / 缩写这类精确词，稠密向量往往匹配不好；稀疏向量按词项精确命中
+- 文档端：BM25 的词频饱和 + 文档长度归一化，在入库时本地计算
+- 查询端：每个词项权重为 1
+- IDF 由 Qdrant 的 sparse 向量 (modifier=IDF) 在服务端按集合统计，新文档入库后自动更新
+不依赖额外模型，词项用 crc32 哈希到 sparse 向量的下标
+"""
+
+import re
+import zlib
+from collections import Counter
+from typing import Dict, List
+
+from qdrant_client import models
+
+from config.settings import settings
+
+# 英文 / 数字词 (保留 "resnet-50"、"gpt-4o"、"t5.1" 这类复合词)，中文连续片段
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[-_.+][a-z0-9]+)*|[一-鿿]+")
+COMPOUND_SPLIT = re.compile(r"[-_.+]")
+
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were which with "
+    "we our you your what how why when where who do does can could should would about into than then there "
+    "these those their they them using use used based via paper papers".split()
+)
+
+
+class SparseEncoder:
+    def __init__(self, k1: float = 1.2, b: float = 0.75, avg_doc_length: float = 300):
+        """
+        :param k1: 词频饱和参数
+        :param b: 文档长度归一化强度
+        :param avg_doc_length: 平均文档长度 (词项数) 的估计值
+        """
+        self.k1 = k1
+        self.b = b
+        self.avg_doc_length = avg_doc_length
+
+    @staticmethod
+    def tokenize(text: str) -> List[str]:
+        """
+        小写切词：复合词同时保留整体和各部分 ("vit-b" -> vit-b, vit, b)；
+        中文没有分词器，用相邻二字组 (bigram) 近似
+        """
+        tokens = []
+        for match in TOKEN_PATTERN.finditer((text or "").lower()):
+            token = match.group(0)
+            if "一" <= token[0] <= "鿿":
+                tokens.extend([token] if len(token) == 1 else [token[i:i + 2] for i in range(len(token) - 1)])
+                continue
+            if token in STOPWORDS:
+                continue
+            tokens.append(token)
+            parts = COMPOUND_SPLIT.split(token)
+            if len(parts) > 1:
+                tokens.extend(p for p in parts if p and p not in STOPWORDS)
+        return tokens
+
+    @staticmethod
+    def term_index(token: str) -> int:
+        return zlib.crc32(token.encode("utf-8"))
+
+    def _to_vector(self, weights: Dict[int, float]) -> models.SparseVector:
+        indices = sorted(weights)
+        return models.SparseVector(indices=indices, values=[float(weights[i]) for i in indices])
+
+    def encode_document(self, text: str) -> models.SparseVector:
+        tokens = self.tokenize(text)
+        if not tokens:
+            return models.SparseVector(indices=[], values=[])
+        norm = self.k1 * (1 - self.b + self.b * len(tokens) / self.avg_doc_length)
+        weights: Dict[int, float] = {}
+        for token, tf in Counter(tokens).items():
+            index = self.term_index(token)
+            # crc32 冲突时累加 (概率极低)
+            weights[index] = weights.get(index, 0.0) + tf * (self.k1 + 1) / (tf + norm)
+        return self._to_vector(weights)
+
+    def encode_query(self, text: str) -> models.SparseVector:
+        return self._to_vector({self.term_index(token): 1.0 for token in set(self.tokenize(text))})
+
+
+# 单例
+sparse_encoder = SparseEncoder(avg_doc_length=settings.SPARSE_AVG_DOC_LENGTH)
+
+
+if __name__ == "__main__":
+    # 运行: python -m core.sparse
+    sample = "We propose ViT-B/16 pretrained on ImageNet-21k; 在 COCO 数据集上的目标检测 mAP 提升明显"
+    print(SparseEncoder.tokenize(sample))
+    vec = sparse_encoder.encode_document(sample)
+    print(f"{len(vec.indices)} terms, max weight {max(vec.values):.3f}")
@@ -0,0 +1,150 @@
+"""
+Research Assistant 的会话目录
+每个会话一行 (thread_id, title, created_at, last_active)，侧边栏用一次带索引的分页查询渲染历史列表，
+不再对 checkpoints 表做 GROUP BY、也不需要为了标题逐个反序列化 State
+"""
+
+import sqlite3
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Any, List, Optional
+
+from langchain_core.messages import HumanMessage
+
+from config.settings import settings
+from utils.logger import logger
+
+TITLE_MAX_CHARS = 100
+
+
+@dataclass
+class ThreadInfo:
+    thread_id: str
+    title: str
+    created_at: float
+    last_active: float
+    archived: bool = False  # Checkpoint 已归档到冷存储 (core.checkpoint_maintenance)
+
+
+def make_title(text: str) -> str:
+    text = " ".join(text.split())
+    return text[:TITLE_MAX_CHARS]
+
+
+class ThreadCatalog:
+    def __init__(self, db_path: Path):
+        # 与 Research Graph 的 Checkpointer 共用同一个数据库文件，删除会话时一起处理
+        self.db_path = Path(db_path)
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS thread_catalog (
+                    thread_id TEXT PRIMARY KEY,
+                    title TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_active REAL NOT NULL
+                )
+                """
+            )
+            # 旧版本的目录表没有 archived 列，这里补上
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(thread_catalog)")}
+            if "archived" not in columns:
+                conn.execute("ALTER TABLE thread_catalog ADD COLUMN archived INTEGER NOT NULL DEFAULT 0")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_thread_catalog_active ON thread_catalog (last_active DESC)")
+            conn.execute("CREATE TABLE IF NOT EXISTS thread_catalog_meta (key TEXT PRIMARY KEY, value TEXT)")
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=settings.SQLITE_BUSY_TIMEOUT_MS / 1000)
+
+    def touch(self, thread_id: str, title: str, at: Optional[float] = None):
+        """记录一轮对话：新会话插入一行 (标题取首个问题)，已有会话只更新 last_active"""
+        at = at or time.time()
+        with self._connect() as conn:
+            conn.execute(
+                """
+                INSERT INTO thread_catalog (thread_id, title, created_at, last_active) VALUES (?, ?, ?, ?)
+                ON CONFLICT(thread_id) DO UPDATE SET last_active = MAX(last_active, excluded.last_active)
+                """,
+                (thread_id, make_title(title), at, at)
+            )
+
+    def list_threads(self, limit: int = 20, offset: int = 0) -> List[ThreadInfo]:
+        """按最近活跃时间倒序分页"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT thread_id, title, created_at, last_active, archived FROM thread_catalog "
+                "ORDER BY last_active DESC LIMIT ? OFFSET ?",
+                (limit, offset)
+            ).fetchall()
+        return [ThreadInfo(*row[:4], archived=bool(row[4])) for row in rows]
+
+    def idle_threads(self, inactive_since: float) -> List[str]:
+        """last_active 早于 inactive_since 且尚未归档的会话"""
+        with self._connect() as conn:
+            return [row[0] for row in conn.execute(
+                "SELECT thread_id FROM thread_catalog WHERE last_active < ? AND archived = 0",
+                (inactive_since,)
+            )]
+
+    def is_archived(self, thread_id: str) -> bool:
+        with self._connect() as conn:
+            row = conn.execute("SELECT archived FROM thread_catalog WHERE thread_id = ?", (thread_id,)).fetchone()
+        return bool(row and row[0])
+
+    def set_archived(self, thread_id: str, archived: bool):
+        with self._connect() as conn:
+            conn.execute("UPDATE thread_catalog SET archived = ? WHERE thread_id = ?", (int(archived), thread_id))
+
+    def count(self) -> int:
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM thread_catalog").fetchone()[0]
+
+    def delete(self, thread_id: str):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM thread_catalog WHERE thread_id = ?", (thread_id,))
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM thread_catalog")
+
+    def backfill(self, app: Any):
+        """
+        一次性迁移：为目录上线前就存在的会话补齐目录行
+        只在第一次运行时扫描 checkpoints 表，之后由 touch() 维护
+        :param app: 编译好的 Research Graph (用于读取首个问题作为标题)
+        """
+        with self._connect() as conn:
+            if conn.execute("SELECT 1 FROM thread_catalog_meta WHERE key = 'backfilled'").fetchone():
+                return
+            has_checkpoints = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type='table' AND name='checkpoints'"
+            ).fetchone()
+            thread_ids = []
+            if has_checkpoints:
+                thread_ids = [row[0] for row in conn.execute(
+                    "SELECT DISTINCT thread_id FROM checkpoints "
+                    "WHERE thread_id NOT IN (SELECT thread_id FROM thread_catalog)"
+                )]
+
+        for thread_id in thread_ids:
+            try:
+                snapshot = app.get_state({"configurable": {"thread_id": thread_id}})
+                messages = (snapshot.values or {}).get("messages", [])
+                first = next((m.content for m in messages if isinstance(m, HumanMessage)), "")
+                at = time.time()
+                if snapshot.created_at:
+                    at = datetime.fromisoformat(snapshot.created_at).timestamp()
+                self.touch(thread_id, first or f"Chat {thread_id[:6]}", at=at)
+            except Exception as e:
+                logger.warning(f"⚠️ Failed to backfill thread {thread_id}: {e}")
+
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO thread_catalog_meta (key, value) VALUES ('backfilled', ?)", (str(time.time()),))
+        if thread_ids:
+            logger.info(f"📇 Thread catalog backfilled with {len(thread_ids)} existing threads.")
+
+
+# 单例
+thread_catalog = ThreadCatalog(settings.CHECKPOINT_DB_PATH)
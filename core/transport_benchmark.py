@@ -0,0 +1,173 @@
+"""
+Qdrant 传输方式基准测试：REST vs gRPC
+- scroll：分批取回集合中的点；with_vectors=True 时每个点带一个完整向量 (2048 个 float)，
+  REST 以 JSON 文本传输，gRPC 以 protobuf 二进制传输，差距主要体现在这里
+- search：单次检索的延迟 (是否带回向量各测一次)
+两种传输方式连的是同一个集合，结果只反映传输开销
+运行: python -m core.transport_benchmark --points 2000 --batch 256 --queries 50 --k 10
+"""
+
+import argparse
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional, Sequence
+
+import numpy as np
+from qdrant_client import QdrantClient
+
+# 确保能导入项目模块
+current_file_path = Path(__file__).resolve()
+project_root = current_file_path.parent.parent
+sys.path.append(str(project_root))
+
+from config.settings import settings
+from core.benchmark import sample_queries
+from core.qdrant import DENSE_VECTOR, qdrant_manager
+from utils.logger import logger
+
+TRANSPORTS = {"rest": False, "grpc": True}
+
+
+@dataclass
+class TransportResult:
+    transport: str
+    operation: str
+    requests: int
+    points: int
+    total_s: float
+    p50_ms: float
+    p95_ms: float
+
+    @property
+    def points_per_sec(self) -> float:
+        return self.points / self.total_s if self.total_s > 0 else 0.0
+
+    def format(self) -> str:
+        return (
+            f"{self.transport:<6} {self.operation:<22} {self.requests:>8} {self.points:>8} {self.total_s:>9.2f} "
+            f"{self.p50_ms:>9.1f} {self.p95_ms:>9.1f} {self.points_per_sec:>12.0f}"
+        )
+
+
+HEADER = (
+    f"{'trans':<6} {'operation':<22} {'requests':>8} {'points':>8} {'total s':>9} "
+    f"{'p50 ms':>9} {'p95 ms':>9} {'points/sec':>12}"
+)
+
+
+def _result(transport: str, operation: str, latencies: Sequence[float], points: int, total_s: float) -> TransportResult:
+    return TransportResult(
+        transport=transport,
+        operation=operation,
+        requests=len(latencies),
+        points=points,
+        total_s=total_s,
+        p50_ms=float(np.percentile(latencies, 50)) if latencies else 0.0,
+        p95_ms=float(np.percentile(latencies, 95)) if latencies else 0.0
+    )
+
+
+def bench_scroll(
+    client: QdrantClient,
+    transport: str,
+    collection_name: str,
+    batch_size: int,
+    limit: Optional[int],
+    with_vectors: bool
+) -> TransportResult:
+    """分批 scroll 到 limit 个点 (None 表示全部)，每批的耗时作为一次请求的延迟"""
+    latencies, fetched, offset = [], 0, None
+    started = time.perf_counter()
+    while True:
+        page = batch_size if limit is None else min(batch_size, limit - fetched)
+        if page <= 0:
+            break
+        t0 = time.perf_counter()
+        points, offset = client.scroll(
+            collection_name=collection_name, limit=page, offset=offset, with_vectors=with_vectors, with_payload=True
+        )
+        latencies.append((time.perf_counter() - t0) * 1000)
+        fetched += len(points)
+        if not points or offset is None:
+            break
+    operation = "scroll+vectors" if with_vectors else "scroll"
+    return _result(transport, operation, latencies, fetched, time.perf_counter() - started)
+
+
+def bench_search(
+    client: QdrantClient,
+    transport: str,
+    collection_name: str,
+    queries: Sequence[np.ndarray],
+    k: int,
+    with_vectors: bool
+) -> TransportResult:
+    """逐条检索完整向量；with_vectors=True 时与工作集首次检索一样带回候选的向量"""
+    layout = qdrant_manager.vector_layout(collection_name)
+    using = DENSE_VECTOR if DENSE_VECTOR in layout else None
+    latencies, returned = [], 0
+    started = time.perf_counter()
+    for q in queries:
+        t0 = time.perf_counter()
+        response = client.query_points(
+            collection_name=collection_name,
+            query=q.tolist(),
+            using=using,
+            limit=k,
+            with_payload=True,
+            with_vectors=([using] if using else True) if with_vectors else False
+        )
+        latencies.append((time.perf_counter() - t0) * 1000)
+        returned += len(response.points)
+    operation = f"search k={k}+vectors" if with_vectors else f"search k={k}"
+    return _result(transport, operation, latencies, returned, time.perf_counter() - started)
+
+
+def run_transport_benchmark(
+    num_points: Optional[int] = 2000,
+    batch_size: int = 256,
+    num_queries: int = 50,
+    k: int = 10,
+    transports: Sequence[str] = tuple(TRANSPORTS)
+) -> List[TransportResult]:
+    """
+    :param num_points: scroll 测试取回的点数，None 表示全部
+    :param batch_size: scroll 每批的点数
+    """
+    if settings.QDRANT_MODE == "embedded":
+        raise RuntimeError("Transport benchmark needs a Qdrant server; embedded mode has no network transport.")
+    collection = qdrant_manager.resolve_alias() or qdrant_manager.collection_name
+    queries = sample_queries(collection, num_queries)
+    if not queries:
+        raise RuntimeError(f"Collection '{collection}' is empty; nothing to benchmark.")
+
+    results = []
+    for transport in transports:
+        logger.info(f"⏱️ Benchmarking {transport} transport...")
+        client = qdrant_manager.make_client(prefer_grpc=TRANSPORTS[transport])
+        try:
+            # 预热：建立连接 / gRPC channel，不计入结果
+            bench_search(client, transport, collection, queries[:1], 1, with_vectors=False)
+            for with_vectors in (False, True):
+                results.append(bench_scroll(client, transport, collection, batch_size, num_points, with_vectors))
+            for with_vectors in (False, True):
+                results.append(bench_search(client, transport, collection, queries, k, with_vectors))
+        finally:
+            client.close()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="REST vs gRPC transport benchmark for Qdrant scroll and search")
+    parser.add_argument("--points", type=int, default=2000, help="scroll 取回的点数 (0 表示全部)")
+    parser.add_argument("--batch", type=int, default=256, help="scroll 每批的点数")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--transports", nargs="+", default=list(TRANSPORTS), choices=list(TRANSPORTS))
+    args = parser.parse_args()
+
+    print(HEADER)
+    for result in run_transport_benchmark(args.points or None, args.batch, args.queries, args.k, args.transports):
+        print(result.format())
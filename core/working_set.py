@@ -0,0 +1,144 @@
+"""
+线程级检索工作集
+同一个会话里的追问通常还是围绕同一批论文：
+第一次检索时多取一些候选 (连同向量) 放进工作集，之后的追问如果和会话主题足够接近，
+直接在本地对工作集重排，省掉一次 Qdrant 往返；话题漂移时再回到 Qdrant
+本地只能复现纯稠密检索的排序：集合带分段 / 稀疏向量、检索要做多路 RRF 融合时，
+稀疏分路的 IDF 和各分路在全集合上的排名都只在 Qdrant 端才有，这时每次都查 Qdrant，不建工作集
+"""
+
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import List, Optional, Sequence
+
+import numpy as np
+from langchain_core.documents import Document
+
+from config.settings import settings
+from core.qdrant import qdrant_manager
+from core.retriever import SearchFilters, SearchMode, fusion_branches, get_search_mode, normalize, search_points
+from utils.logger import logger
+
+
+@dataclass
+class WorkingSet:
+    documents: List[Document]
+    vectors: np.ndarray                    # (n, dim)，已归一化
+    collection_version: int
+    query_vectors: List[np.ndarray] = field(default_factory=list)
+    filter_key: str = ""                   # 建立工作集时的过滤条件，条件变了不能复用
+    mode: str = ""                         # 建立工作集时的检索档位，换档 (例如切到 exhaustive) 时回到 Qdrant
+
+    @property
+    def centroid(self) -> np.ndarray:
+        """会话主题中心：由这个工作集回答过的问题向量的均值"""
+        return normalize(np.mean(self.query_vectors, axis=0))
+
+    def rank(self, query: np.ndarray, top_k: int) -> List[Document]:
+        scores = self.vectors @ query
+        order = np.argsort(-scores)[:top_k]
+        return [self.documents[i] for i in order]
+
+
+class WorkingSetRetriever:
+    def __init__(self, pool_factor: int = 3, drift_threshold: float = 0.75, max_threads: int = 64):
+        """
+        :param pool_factor: 首次检索时取 top_k * pool_factor 个候选放进工作集
+        :param drift_threshold: 追问与会话主题中心的余弦相似度低于该值视为话题漂移
+        :param max_threads: 最多缓存多少个会话的工作集 (LRU)
+        """
+        self.pool_factor = pool_factor
+        self.drift_threshold = drift_threshold
+        self.max_threads = max_threads
+        self._sets: "OrderedDict[str, WorkingSet]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.local_hits = 0
+        self.remote_searches = 0
+
+    def _get(self, thread_id: str) -> Optional[WorkingSet]:
+        with self._lock:
+            ws = self._sets.get(thread_id)
+            if ws is not None:
+                self._sets.move_to_end(thread_id)
+            return ws
+
+    def _put(self, thread_id: str, ws: WorkingSet):
+        with self._lock:
+            self._sets[thread_id] = ws
+            self._sets.move_to_end(thread_id)
+            while len(self._sets) > self.max_threads:
+                self._sets.popitem(last=False)
+
+    def retrieve(
+        self,
+        query_vector: Sequence[float],
+        top_k: int,
+        thread_id: Optional[str] = None,
+        filters: Optional[SearchFilters] = None,
+        query_text: Optional[str] = None,
+        mode: Optional[SearchMode] = None
+    ) -> List[Document]:
+        """
+        :param thread_id: 为空时不使用工作集，直接查 Qdrant
+        :param filters: 结构化过滤条件；与工作集建立时的条件不同则回到 Qdrant
+        :param query_text: 问题原文，查 Qdrant 时用于混合检索的稀疏部分；需要多路融合时不使用工作集
+        :param mode: 检索档位；与工作集建立时的档位不同则回到 Qdrant
+        """
+        query = normalize(query_vector)
+        mode = mode or get_search_mode()
+        version = qdrant_manager.get_version()
+        filter_key = filters.key if filters and not filters.is_empty() else ""
+
+        # 工作集只能按稠密余弦重排，多路融合的结果在本地复现不了，直接查 Qdrant
+        if thread_id and len(fusion_branches(qdrant_manager.vector_layout(), query_text)) > 1:
+            self.forget(thread_id)
+            thread_id = None
+
+        ws = self._get(thread_id) if thread_id else None
+        if (ws is not None and ws.collection_version == version and ws.filter_key == filter_key
+                and ws.mode == mode.name and len(ws.documents) >= top_k):
+            similarity = float(ws.centroid @ query)
+            if similarity >= self.drift_threshold:
+                ws.query_vectors.append(query)
+                self.local_hits += 1
+                logger.info(f"   ♻️ Re-ranked thread working set locally (topic similarity={similarity:.3f}, {len(ws.documents)} candidates)")
+                return ws.rank(query, top_k)
+            logger.info(f"   🧭 Topic drift detected (similarity={similarity:.3f}). Falling back to Qdrant.")
+
+        # 工作集不存在 / 已过期 / 话题漂移：查 Qdrant 并重建工作集
+        self.remote_searches += 1
+        if not thread_id:
+            return [p.document for p in search_points(query, limit=top_k, filters=filters, query_text=query_text, mode=mode)]
+
+        points = search_points(
+            query, limit=top_k * self.pool_factor, with_vectors=True, filters=filters, query_text=query_text, mode=mode
+        )
+        points = [p for p in points if p.vector is not None]
+        if points:
+            self._put(thread_id, WorkingSet(
+                documents=[p.document for p in points],
+                vectors=np.stack([p.vector for p in points]),
+                collection_version=version,
+                query_vectors=[query],
+                filter_key=filter_key,
+                mode=mode.name
+            ))
+        return [p.document for p in points[:top_k]]
+
+    def forget(self, thread_id: str):
+        with self._lock:
+            self._sets.pop(thread_id, None)
+
+    def clear(self):
+        """丢弃全部会话的工作集 (清空历史时调用)"""
+        with self._lock:
+            self._sets.clear()
+
+
+# 单例
+working_set_retriever = WorkingSetRetriever(
+    pool_factor=settings.WORKING_SET_POOL_FACTOR,
+    drift_threshold=settings.WORKING_SET_DRIFT_THRESHOLD,
+    max_threads=settings.WORKING_SET_MAX_THREADS
+)
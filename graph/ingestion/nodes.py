@@ -1,16 +1,18 @@
 import json
 import yaml
-from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, List
 
 from langchain_core.messages import SystemMessage, HumanMessage
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document
 
 from config.settings import settings
-from core.llm import get_extractor_llm, get_embeddings
-from core.pdf_loader import load_pdf_as_images
-from core.qdrant import qdrant_manager
+from core.llm import get_extractor_llm
+from core.bib_resolver import bib_resolver, is_preprint, to_year
+from core.blob_store import blob_store
+from core.chunk_index import chunk_index, paper_point_id
+from core.ingest_sink import BatchIngestionSink
+from core.pdf_loader import load_pdf_as_image_refs
 from core.search import search_tool
 from graph.ingestion.state import IngestionState
 from utils.logger import logger
@@ -23,30 +25,65 @@ def load_prompts():
 
 PROMPTS = load_prompts()
 
+MAX_RETRIES = 3  # 联网修复的最大重试次数
+
 # ==========================================
-# Node 1: 元数据提取节点
+# 阶段函数 (Graph 节点与流水线引擎共用)
 # ==========================================
-def extract_metadata_node(state: IngestionState) -> Dict[str, Any]:
-    logger.info(f"👁️ Processing Node: Visual Extraction for {state['pdf_path']}")
-    
-    # 1. 加载图片 (如果 state 里没有)
-    images = state.get("page_images")
-    if not images:
-        # 调用新的图片加载器
-        images = load_pdf_as_images(state["pdf_path"], max_pages=5)
-    
-    # 2. 准备视觉模型的输入
+def find_missing_fields(metadata: Dict[str, Any], strict: bool = True) -> List[str]:
+    """
+    Agent 自我检查 (Reflection)：找出缺失的字段
+    :param strict: 为 True 时 arXiv / preprint 也视为 venue 缺失 (需要联网确认是否已正式发表)
+    """
+    missing = []
+    if not metadata.get("year"): missing.append("year")
+    venue = (metadata.get("venue") or "").lower()
+    if not venue or (strict and ("arxiv" in venue or "preprint" in venue)): missing.append("venue")
+    return missing
+
+def resolve_missing_offline(metadata: Dict[str, Any], missing: List[str]) -> List[str]:
+    """
+    联网之前先查本地书目库 (core.bib_resolver)，命中则直接补全 venue / year
+    :return: 补全后仍然缺失的字段 (为空则无需再走 web_fixer)
+    """
+    if not missing or not metadata.get("title"):
+        return missing
+
+    match = bib_resolver.resolve(metadata["title"])
+    if not match:
+        return missing
+
+    fixed = {}
+    if "venue" in missing and not is_preprint(match["venue"]):
+        # 正式发表的版本：venue 和 year 一起以书目库为准
+        fixed["venue"] = match["venue"]
+        if match["year"]:
+            fixed["year"] = match["year"]
+    if "year" in missing and match["year"] and "year" not in fixed:
+        fixed["year"] = match["year"]
+
+    if fixed:
+        metadata.update(fixed)
+        logger.info(f"   📚 Resolved offline (similarity={match['similarity']}): {fixed}")
+    return find_missing_fields(metadata, strict=True)
+
+def extract_metadata_from_images(image_refs: List[str]) -> Dict[str, Any]:
+    """
+    调用视觉模型从页面图片中提取元数据
+    :raises json.JSONDecodeError: 模型输出不是合法 JSON
+    """
     llm = get_extractor_llm()
     prompt_cfg = PROMPTS["extract_metadata"]
-    
+
     # --- 构造多模态消息 ---
     # User 消息包含两部分：文本指令 + 图片列表
     user_content = [
         {"type": "text", "text": prompt_cfg["user"]} # 这里不需要再 format {text} 了
     ]
-    
+
     # 把 5 张图片依次加进去
-    for img_b64 in images:
+    for ref in image_refs:
+        img_b64 = blob_store.get_b64(ref)
         user_content.append({
             "type": "image_url",
             "image_url": {
@@ -54,68 +91,33 @@ def extract_metadata_node(state: IngestionState) -> Dict[str, Any]:
                 "url": f"data:image/png;base64,{img_b64}"
             }
         })
-        
+
     messages = [
         SystemMessage(content=prompt_cfg["system"]),
         HumanMessage(content=user_content) # LangChain 会自动处理这个列表
     ]
-    
-    # 3. 调用模型 (后面的逻辑和之前一样)
-    try:
-        logger.info("   📤 Sending images to Vision LLM...")
-        response = llm.invoke(messages)
-        content = response.content.replace("```json", "").replace("```", "").strip()
-        metadata = json.loads(content)
-        
-        logger.info(f"   ✅ Visual Extraction Success: {metadata.get('title')}")
 
-        # 4. 关键：Agent 自我检查 (Reflection)
-        missing = []
-        if not metadata.get("year"): missing.append("year")
-        venue = metadata.get("venue", "").lower()
-        if not venue or "arxiv" in venue or "preprint" in venue: missing.append("venue")
-        
-        if missing:
-            logger.warning(f"   ⚠️ Missing/Incomplete fields (triggering search): {missing}")
-        
-        return {
-            "page_images": images,
-            "metadata": metadata,
-            "missing_fields": missing,
-            "retry_count": state.get("retry_count", 0)
-        }
-        
-    except json.JSONDecodeError:
-        logger.error("❌ Failed to parse JSON from LLM")
-        return {"status": "failed", "error_msg": "JSON Parse Error"}
-    except Exception as e:
-        logger.error(f"❌ Extraction Error: {e}")
-        return {"status": "failed", "error_msg": str(e)}
+    logger.info("   📤 Sending images to Vision LLM...")
+    response = llm.invoke(messages)
+    content = response.content.replace("```json", "").replace("```", "").strip()
+    return json.loads(content)
 
-# ==========================================
-# Node 2: 联网修复节点 (Agentic Loop)
-# ==========================================
-def web_fixer_node(state: IngestionState) -> Dict[str, Any]:
+def fix_metadata_once(metadata: Dict[str, Any], missing: List[str]) -> Dict[str, Any]:
     """
-    生成搜索词 -> 联网 -> 修正 Metadata
+    单次联网修复：生成搜索词 -> 联网 -> LLM 修正 Metadata
+    :return: 合并修复结果后的 metadata
     """
-    current_retries = state.get("retry_count", 0)
-    logger.info(f"🌍 Processing Node: Web Search Fixer (Attempt {current_retries + 1})")
-    
-    metadata = state["metadata"]
-    missing = state["missing_fields"]
-    
     # 1. 生成搜索关键词 (简单起见，直接用 Python 拼接，也可以用 LLM 生成)
     # PROMPTS["generate_search_query"] 可以在这里用，但为了省 Token，直接拼也不错：
     query = f"{metadata['title']} paper conference year bibtex"
-    
-    # 2. 执行搜索
-    search_results = search_tool.search(query)
-    
+
+    # 2. 执行搜索 (元数据几乎不会变，走长 TTL 缓存)
+    search_results = search_tool.search(query, use_case="metadata")
+
     # 3. 调用 llm 根据搜索结果修复
     llm = get_extractor_llm()
     prompt_cfg = PROMPTS["fix_metadata"]
-    
+
     messages = [
         SystemMessage(content=prompt_cfg["system"].format(
             current_venue=metadata.get("venue", "Unknown") # 👈 注入当前 venue
@@ -127,42 +129,28 @@ def web_fixer_node(state: IngestionState) -> Dict[str, Any]:
             search_results=search_results
         ))
     ]
-    
+
     # 4. 更新 Metadata
     try:
         response = llm.invoke(messages)
         fix_json = json.loads(response.content.replace("```json", "").replace("```", "").strip())
-        
+
         # 合并新旧数据
         if fix_json:
             metadata.update(fix_json)
             logger.info(f"   ✅ Fixed Metadata: {fix_json}")
         else:
             logger.info("   ❌ Could not find info from web.")
-            
+
     except Exception as e:
         logger.error(f"   Web fix failed: {e}")
-    
-    # 5. 再次检查是否还缺字段 (决定是否继续 Loop)
-    new_missing = []
-    if not metadata.get("year"): new_missing.append("year")
-    if not metadata.get("venue"): new_missing.append("venue")
-    
-    return {
-        "metadata": metadata,
-        "missing_fields": new_missing,
-        "retry_count": current_retries + 1
-    }
 
-# ==========================================
-# Node 3: 向量入库节点
-# ==========================================
-def ingest_to_qdrant_node(state: IngestionState) -> Dict[str, Any]:
-    logger.info("💾 Processing Node: Ingest High-Quality Metadata to Qdrant")
-    
-    metadata = state["metadata"]
-    
-    # 1. 构造合成文档 (保持不变)
+    return metadata
+
+def build_paper_document(metadata: Dict[str, Any], pdf_path: str) -> Document:
+    """
+    构造入库用的合成文档 (一篇论文 = 一个 Document)
+    """
     content_parts = [
         f"Title: {metadata.get('title', 'Unknown')}",
         f"Year: {metadata.get('year', 'Unknown')}",
@@ -174,39 +162,106 @@ def ingest_to_qdrant_node(state: IngestionState) -> Dict[str, Any]:
         metadata.get('introduction_summary', 'No summary provided.')
     ]
     clean_text = "\n\n".join(content_parts)
-    
-    # 2. 🌟 核心修改：取消切片，直接封装成一个 Document
+
+    # 🌟 核心修改：取消切片，直接封装成一个 Document
     # 之前的 RecursiveCharacterTextSplitter 把这个 clean_text 切成了几段
     # 导致数据库里出现了多条拥有相同 Metadata 的记录
-    final_doc = Document(
+    return Document(
         page_content=clean_text,
         metadata={
             **metadata,
-            "source": str(state["pdf_path"]),
+            # year 统一存整数，Qdrant 的整数索引才能做范围过滤
+            "year": to_year(metadata.get("year")),
+            "source": str(pdf_path),
             "content_type": "ai_generated_summary"
         }
     )
-    
-    # 3. 写入 Qdrant
+
+# ==========================================
+# Node 1: 元数据提取节点
+# ==========================================
+def extract_metadata_node(state: IngestionState) -> Dict[str, Any]:
+    logger.info(f"👁️ Processing Node: Visual Extraction for {state['pdf_path']}")
+
+    # 1. 加载图片引用 (如果 state 里没有)
+    # ⚠️ State 会被 Checkpointer 保存，这里只放 Blob key，Base64 仅在构造消息时临时生成
+    image_refs = state.get("page_image_refs")
+    if not image_refs:
+        image_refs = load_pdf_as_image_refs(state["pdf_path"], max_pages=5)
+
+    # 2. 调用视觉模型
     try:
-        qdrant_manager.ensure_collection_exists()
-        client = qdrant_manager.client
-        embedding_model = get_embeddings()
-        
-        from langchain_qdrant import QdrantVectorStore
-        
-        vector_store = QdrantVectorStore(
-            client=client,
-            collection_name=settings.QDRANT_COLLECTION_NAME,
-            embedding=embedding_model
-        )
-        
-        # 直接添加这一个文档
-        vector_store.add_documents([final_doc]) 
-        logger.info(f"   ✅ Successfully ingested 1 single document (Length: {len(clean_text)}).")
-        
-        return {"status": "success"}
-        
+        metadata = extract_metadata_from_images(image_refs)
+
+        logger.info(f"   ✅ Visual Extraction Success: {metadata.get('title')}")
+
+        # 3. 关键：Agent 自我检查 (Reflection)，缺失字段先查本地书目库
+        missing = find_missing_fields(metadata, strict=True)
+        missing = resolve_missing_offline(metadata, missing)
+
+        if missing:
+            logger.warning(f"   ⚠️ Missing/Incomplete fields (triggering search): {missing}")
+
+        return {
+            "page_image_refs": image_refs,
+            "metadata": metadata,
+            "missing_fields": missing,
+            "retry_count": state.get("retry_count", 0)
+        }
+
+    except json.JSONDecodeError:
+        logger.error("❌ Failed to parse JSON from LLM")
+        return {"page_image_refs": image_refs, "status": "failed", "error_msg": "JSON Parse Error"}
+    except Exception as e:
+        logger.error(f"❌ Extraction Error: {e}")
+        return {"page_image_refs": image_refs, "status": "failed", "error_msg": str(e)}
+
+# ==========================================
+# Node 2: 联网修复节点 (Agentic Loop)
+# ==========================================
+def web_fixer_node(state: IngestionState) -> Dict[str, Any]:
+    """
+    生成搜索词 -> 联网 -> 修正 Metadata
+    """
+    current_retries = state.get("retry_count", 0)
+    logger.info(f"🌍 Processing Node: Web Search Fixer (Attempt {current_retries + 1})")
+
+    metadata = fix_metadata_once(state["metadata"], state["missing_fields"])
+
+    # 再次检查是否还缺字段 (决定是否继续 Loop)
+    new_missing = find_missing_fields(metadata, strict=False)
+
+    return {
+        "metadata": metadata,
+        "missing_fields": new_missing,
+        "retry_count": current_retries + 1
+    }
+
+# ==========================================
+# Node 3: 向量入库节点
+# ==========================================
+def ingest_to_qdrant_node(state: IngestionState) -> Dict[str, Any]:
+    logger.info("💾 Processing Node: Ingest High-Quality Metadata to Qdrant")
+
+    # 1. 构造合成文档
+    final_doc = build_paper_document(state["metadata"], state["pdf_path"])
+
+    # 2. 写入 Qdrant (与批量流水线共用同一个 Sink 写入逻辑)
+    # point id 由 PDF 内容决定，全文分块通过它关联到论文
+    paper_id = paper_point_id(state["pdf_path"])
+    try:
+        sink = BatchIngestionSink()
+        sink.write([final_doc], [paper_id])
+        logger.info(f"   ✅ Successfully ingested 1 single document (Length: {len(final_doc.page_content)}).")
     except Exception as e:
         logger.error(f"❌ Database Error: {e}")
-        return {"status": "failed", "error_msg": str(e)}
\ No newline at end of file
+        return {"status": "failed", "error_msg": str(e)}
+
+    # 3. 全文分块索引 (可选)：失败不影响论文本身已入库
+    if settings.FULLTEXT_INDEX:
+        try:
+            chunk_index.index_papers([(paper_id, state["pdf_path"], final_doc.metadata)])
+        except Exception as e:
+            logger.error(f"   ⚠️ Full-text indexing failed: {e}")
+
+    return {"status": "success"}
@@ -0,0 +1,393 @@
+"""
+流水线入库引擎 (Pipelined Ingestion)
+render -> extract -> fix -> embed -> upsert (-> chunks，开启 FULLTEXT_INDEX 时)
+
+- 每个阶段有独立的 worker 池，阶段之间用有界队列连接 (队列满时上游阻塞，即背压)
+- render 是 CPU 密集型，放到进程池里跑；extract / fix 是网络 IO，用线程池并发
+- embed / upsert 跨论文攒批，交给 BatchIngestionSink 自适应批量 Embedding + 并行 Upsert
+- 结束后输出每个阶段的利用率，用于定位瓶颈
+- 不写逐篇 Checkpoint (与逐篇 Agent 模式不同)：中断后不能断点续跑，只能整批重跑；
+  point id 按 PDF 内容生成，重跑已入库的论文只会覆盖原有的点，不会重复
+- 每篇论文到达终态 (成功或失败) 时回收它渲染出的页面图片
+"""
+
+import multiprocessing
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from langchain_core.documents import Document
+
+from config.settings import settings
+from core.blob_store import blob_store
+from core.chunk_index import chunk_index, paper_point_id
+from core.ingest_sink import BatchIngestionSink, SinkStats
+from core.pdf_loader import load_pdf_as_image_refs
+from core.qdrant import qdrant_manager
+from graph.ingestion.nodes import (
+    MAX_RETRIES,
+    build_paper_document,
+    extract_metadata_from_images,
+    find_missing_fields,
+    fix_metadata_once,
+    resolve_missing_offline
+)
+from utils.logger import logger
+
+# 队列结束标记
+_STOP = object()
+
+
+@dataclass
+class PaperJob:
+    """在流水线中流转的单篇论文"""
+    pdf_path: str
+    image_refs: List[str] = field(default_factory=list)
+    metadata: Dict[str, Any] = field(default_factory=dict)
+    missing_fields: List[str] = field(default_factory=list)
+    retry_count: int = 0
+    document: Optional[Document] = None
+    vector: Optional[Dict[str, List[float]]] = None  # 整体向量 + 分段向量 (BatchIngestionSink.embed_papers)
+    point_id: Optional[str] = None                   # 主集合 point id (按 PDF 内容生成，全文分块靠它关联)
+    status: str = "pending"
+    error_msg: Optional[str] = None
+
+
+@dataclass
+class StageStats:
+    """单个阶段的运行统计"""
+    name: str
+    workers: int
+    processed: int = 0
+    failed: int = 0
+    batches: int = 0
+    busy_seconds: float = 0.0      # worker 实际处理耗时之和
+    blocked_seconds: float = 0.0   # 下游队列已满导致的阻塞耗时 (背压)
+    wall_seconds: float = 0.0      # 从流水线启动到该阶段结束
+
+    @property
+    def utilization(self) -> float:
+        """忙碌时间 / (worker 数 × 墙钟时间)，越接近 1 越可能是瓶颈"""
+        capacity = self.workers * self.wall_seconds
+        return self.busy_seconds / capacity if capacity > 0 else 0.0
+
+
+@dataclass
+class PipelineReport:
+    """一次流水线运行的汇总"""
+    stages: List[StageStats]
+    total: int
+    succeeded: int
+    failed: int
+    wall_seconds: float
+    sink: Optional[SinkStats] = None
+
+    @property
+    def bottleneck(self) -> Optional[str]:
+        if not self.stages:
+            return None
+        return max(self.stages, key=lambda s: s.utilization).name
+
+    def format(self) -> str:
+        lines = [
+            f"Pipeline finished: {self.succeeded}/{self.total} succeeded, "
+            f"{self.failed} failed in {self.wall_seconds:.1f}s",
+            f"{'stage':<8} {'workers':>7} {'items':>6} {'batches':>7} {'busy(s)':>8} {'blocked(s)':>10} {'util':>6}",
+        ]
+        for s in self.stages:
+            lines.append(
+                f"{s.name:<8} {s.workers:>7} {s.processed:>6} {s.batches:>7} "
+                f"{s.busy_seconds:>8.1f} {s.blocked_seconds:>10.1f} {s.utilization:>6.0%}"
+            )
+        lines.append(f"Bottleneck: {self.bottleneck}")
+        if self.sink:
+            lines.append(f"Sink: {self.sink.format()}")
+        return "\n".join(lines)
+
+
+class _Stage:
+    """
+    一个流水线阶段：N 个 worker 线程从 inbox 取任务，处理后放入 outbox
+    batch_size > 1 时会在 batch_timeout 内尽量攒满一批再处理
+    """
+
+    def __init__(
+        self,
+        name: str,
+        func: Callable[[List[PaperJob]], None],
+        workers: int,
+        inbox: queue.Queue,
+        outbox: queue.Queue,
+        batch_size: int = 1,
+        batch_timeout: float = 0.0
+    ):
+        self.name = name
+        self.func = func
+        self.inbox = inbox
+        self.outbox = outbox
+        self.batch_size = max(1, batch_size)
+        self.batch_timeout = batch_timeout
+        self.stats = StageStats(name=name, workers=max(1, workers))
+        self._lock = threading.Lock()
+        self._alive = self.stats.workers
+        self._threads: List[threading.Thread] = []
+        self._started_at = 0.0
+
+    def start(self, started_at: float):
+        self._started_at = started_at
+        for i in range(self.stats.workers):
+            t = threading.Thread(target=self._run, name=f"ingest-{self.name}-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def join(self):
+        for t in self._threads:
+            t.join()
+
+    def _collect(self):
+        """取一批任务，返回 (batch, 是否遇到结束标记)"""
+        item = self.inbox.get()
+        if item is _STOP:
+            return [], True
+        batch = [item]
+        deadline = time.monotonic() + self.batch_timeout
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self.inbox.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self):
+        while True:
+            batch, stop = self._collect()
+            if batch:
+                self._process(batch)
+            if stop:
+                # 把结束标记放回去，让同阶段的其他 worker 也能退出
+                self.inbox.put(_STOP)
+                break
+
+        with self._lock:
+            self._alive -= 1
+            is_last = self._alive == 0
+        if is_last:
+            self.stats.wall_seconds = time.perf_counter() - self._started_at
+            self.outbox.put(_STOP)
+
+    def _process(self, batch: List[PaperJob]):
+        # 前面阶段已失败的论文直接透传，不再处理
+        active = [job for job in batch if job.status != "failed"]
+
+        t0 = time.perf_counter()
+        if active:
+            try:
+                self.func(active)
+            except Exception as e:
+                logger.error(f"❌ [{self.name}] batch of {len(active)} failed: {e}")
+                for job in active:
+                    job.status = "failed"
+                    job.error_msg = f"{self.name}: {e}"
+        busy = time.perf_counter() - t0
+
+        t1 = time.perf_counter()
+        for job in batch:
+            self.outbox.put(job)
+        blocked = time.perf_counter() - t1
+
+        with self._lock:
+            self.stats.batches += 1
+            self.stats.processed += len(active)
+            self.stats.failed += sum(1 for job in active if job.status == "failed")
+            self.stats.busy_seconds += busy
+            self.stats.blocked_seconds += blocked
+
+
+def _per_job(stage_name: str, func: Callable[[PaperJob], None]) -> Callable[[List[PaperJob]], None]:
+    """把单篇处理函数包装成批处理函数，单篇失败不影响同批其他论文"""
+    def wrapper(jobs: List[PaperJob]):
+        for job in jobs:
+            try:
+                func(job)
+            except Exception as e:
+                logger.error(f"❌ [{stage_name}] {job.pdf_path}: {e}")
+                job.status = "failed"
+                job.error_msg = f"{stage_name}: {e}"
+    return wrapper
+
+
+class IngestionPipeline:
+    """
+    流水线入库引擎
+    用法:
+        pipeline = IngestionPipeline(extract_workers=8)
+        for job in pipeline.run_iter(pdf_paths):
+            ...
+        print(pipeline.report.format())
+    """
+
+    def __init__(
+        self,
+        render_workers: int = 2,
+        extract_workers: int = 4,
+        fix_workers: int = 4,
+        embed_workers: int = 2,
+        upsert_workers: int = 1,
+        queue_size: int = 8,
+        embed_batch_size: int = 64,
+        upsert_batch_size: int = 256,
+        chunk_batch_size: int = 4,
+        batch_timeout: float = 2.0,
+        max_pages: int = 5
+    ):
+        self.render_workers = render_workers
+        self.extract_workers = extract_workers
+        self.fix_workers = fix_workers
+        self.embed_workers = embed_workers
+        self.upsert_workers = upsert_workers
+        self.queue_size = queue_size
+        self.embed_batch_size = embed_batch_size
+        self.upsert_batch_size = upsert_batch_size
+        self.chunk_batch_size = chunk_batch_size
+        self.batch_timeout = batch_timeout
+        self.max_pages = max_pages
+        self.report: Optional[PipelineReport] = None
+        self.sink = BatchIngestionSink(embed_workers=embed_workers, upsert_batch_size=upsert_batch_size)
+        self._render_pool: Optional[ProcessPoolExecutor] = None
+
+    # ---------- 各阶段处理函数 ----------
+    def _render(self, job: PaperJob):
+        # 渲染结果直接写入 Blob 存储，进程间只传递引用 key
+        future = self._render_pool.submit(load_pdf_as_image_refs, job.pdf_path, self.max_pages)
+        job.image_refs = future.result()
+
+    def _extract(self, job: PaperJob):
+        job.metadata = extract_metadata_from_images(job.image_refs)
+        job.missing_fields = find_missing_fields(job.metadata, strict=True)
+        job.missing_fields = resolve_missing_offline(job.metadata, job.missing_fields)
+        logger.info(f"   ✅ [extract] {job.metadata.get('title')} (missing: {job.missing_fields})")
+
+    def _fix(self, job: PaperJob):
+        while job.missing_fields and job.retry_count < MAX_RETRIES:
+            job.metadata = fix_metadata_once(job.metadata, job.missing_fields)
+            job.missing_fields = find_missing_fields(job.metadata, strict=False)
+            job.retry_count += 1
+
+    def _embed(self, jobs: List[PaperJob]):
+        for job in jobs:
+            job.document = build_paper_document(job.metadata, job.pdf_path)
+            job.point_id = paper_point_id(job.pdf_path)
+        vectors = self.sink.embed_papers([job.document for job in jobs])
+        for job, vector in zip(jobs, vectors):
+            job.vector = vector
+
+    def _upsert(self, jobs: List[PaperJob]):
+        self.sink.upsert_points(self.sink.make_points(
+            [job.document for job in jobs], [job.vector for job in jobs], [job.point_id for job in jobs]
+        ))
+        for job in jobs:
+            job.status = "success"
+            job.vector = None  # 入库后释放向量内存
+
+    def _index_chunks(self, jobs: List[PaperJob]):
+        # 论文已经入库，全文分块失败只记日志，不把论文标记为失败
+        try:
+            chunk_index.index_papers([(job.point_id, job.pdf_path, job.document.metadata) for job in jobs])
+        except Exception as e:
+            logger.error(f"❌ [chunks] full-text indexing of {len(jobs)} papers failed: {e}")
+
+    # ---------- 运行 ----------
+    def run_iter(self, pdf_paths: List[str]) -> Iterator[PaperJob]:
+        """
+        运行流水线，按完成顺序逐篇产出结果 (在调用方线程中产出，方便 UI 刷新进度)
+        """
+        qdrant_manager.ensure_collection_exists()
+
+        stage_specs = [
+            ("render", _per_job("render", self._render), self.render_workers, 1),
+            ("extract", _per_job("extract", self._extract), self.extract_workers, 1),
+            ("fix", _per_job("fix", self._fix), self.fix_workers, 1),
+            ("embed", self._embed, self.embed_workers, self.embed_batch_size),
+            ("upsert", self._upsert, self.upsert_workers, self.upsert_batch_size),
+        ]
+        if settings.FULLTEXT_INDEX:
+            # 抽文本 + 分块 Embedding 比摘要入库慢得多，单独成一个阶段，不拖慢论文本身的入库
+            stage_specs.append(("chunks", self._index_chunks, self.embed_workers, self.chunk_batch_size))
+
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in stage_specs]
+        results: queue.Queue = queue.Queue()
+        outboxes = queues[1:] + [results]
+        stages = [
+            _Stage(
+                name, func, workers, inbox, outbox,
+                batch_size=batch_size,
+                batch_timeout=self.batch_timeout if batch_size > 1 else 0.0
+            )
+            for (name, func, workers, batch_size), inbox, outbox in zip(stage_specs, queues, outboxes)
+        ]
+
+        def feed():
+            for path in pdf_paths:
+                queues[0].put(PaperJob(pdf_path=str(path)))  # 队列满时阻塞 (背压)
+            queues[0].put(_STOP)
+
+        # spawn 避免在多线程进程里 fork
+        self._render_pool = ProcessPoolExecutor(
+            max_workers=max(1, self.render_workers),
+            mp_context=multiprocessing.get_context("spawn")
+        )
+        started_at = time.perf_counter()
+        logger.info(f"🏭 Starting ingestion pipeline for {len(pdf_paths)} papers...")
+
+        succeeded = failed = 0
+        try:
+            for stage in stages:
+                stage.start(started_at)
+            feeder = threading.Thread(target=feed, name="ingest-feeder", daemon=True)
+            feeder.start()
+
+            while True:
+                job = results.get()
+                if job is _STOP:
+                    break
+                if job.status == "success":
+                    succeeded += 1
+                else:
+                    failed += 1
+                # 页面图片只在 extract 阶段使用；流水线没有 Checkpoint，终态后不会再用到
+                blob_store.delete(job.image_refs)
+                job.image_refs = []
+                yield job
+
+            feeder.join()
+            for stage in stages:
+                stage.join()
+        finally:
+            self._render_pool.shutdown(wait=False, cancel_futures=True)
+            self._render_pool = None
+
+        self.report = PipelineReport(
+            stages=[stage.stats for stage in stages],
+            total=len(pdf_paths),
+            succeeded=succeeded,
+            failed=failed,
+            wall_seconds=time.perf_counter() - started_at
+        )
+        self.sink.stats.wall_seconds = self.report.wall_seconds
+        self.report.sink = self.sink.stats
+        logger.info("📊 " + self.report.format())
+
+    def run(self, pdf_paths: List[str]) -> PipelineReport:
+        """运行流水线直到全部完成，返回统计报告"""
+        for _ in self.run_iter(pdf_paths):
+            pass
+        return self.report
@@ -3,7 +3,7 @@ from typing import TypedDict, List, Optional, Dict, Any
 class IngestionState(TypedDict):
     pdf_path: str
     # raw_text: str  <-- 删除这个
-    page_images: List[str] # <-- 改成存储图片 Base64 列表
+    page_image_refs: List[str] # <-- 只存 Blob 引用 key，图片本体在 core.blob_store 中
     file_name: str
     metadata: Dict[str, Any]
     missing_fields: List[str]
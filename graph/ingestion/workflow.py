@@ -1,8 +1,15 @@
+import hashlib
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
 from langgraph.graph import StateGraph, END
-from langgraph.checkpoint.memory import MemorySaver
 
+from config.settings import settings
+from core.blob_store import blob_store
+from core.checkpointer import PooledSqliteSaver
 from graph.ingestion.state import IngestionState
 from graph.ingestion.nodes import (
+    MAX_RETRIES,
     extract_metadata_node,
     web_fixer_node,
     ingest_to_qdrant_node
@@ -15,13 +22,17 @@ from utils.logger import logger
 def decide_next_step(state: IngestionState) -> str:
     """
     判断下一步去哪里：
+    - 如果提取失败 (节点返回 status=failed) -> 结束，保留 Checkpoint 供排查 / 重跑
     - 如果字段齐全 -> 入库
     - 如果缺失但重试次数超标 -> 放弃治疗，直接入库
     - 如果缺失且还有重试机会 -> 联网修复
     """
+    if state.get("status") == "failed":
+        logger.error(f"🛑 Extraction failed: {state.get('error_msg')}. Stopping.")
+        return END
+
     missing = state.get("missing_fields", [])
     retry_count = state.get("retry_count", 0)
-    MAX_RETRIES = 3  # 最大重试次数
 
     if not missing:
         logger.info("✅ Data is complete. Moving to Ingestion.")
@@ -56,7 +67,8 @@ def build_ingestion_graph():
         decide_next_step,
         {
             "web_fixer": "web_fixer",
-            "ingest_to_qdrant": "ingest_to_qdrant"
+            "ingest_to_qdrant": "ingest_to_qdrant",
+            END: END
         }
     )
 
@@ -76,8 +88,76 @@ def build_ingestion_graph():
     workflow.add_edge("ingest_to_qdrant", END)
 
     # F. 编译 (Compile)
-    # checkpointer=MemorySaver() 允许我们在步骤之间保存状态 (用于 Debug 或人机交互)
-    return workflow.compile(checkpointer=MemorySaver())
+    # 使用 SQLite 持久化 Checkpoint：每个节点完成后都会落盘，
+    # 进程崩溃后已完成的视觉提取 / 联网修复不会丢失，可从断点继续
+    # PooledSqliteSaver 用连接池 + WAL，流水线多个 worker 与 Streamlit 线程可以并发读写 Checkpoint
+    return workflow.compile(checkpointer=PooledSqliteSaver(settings.INGESTION_CHECKPOINT_DB))
 
 # 实例化 App 对象，供 UI 调用
-ingestion_app = build_ingestion_graph()
\ No newline at end of file
+ingestion_app = build_ingestion_graph()
+
+# ==========================================
+# 3. 断点续跑 (Resume)
+# ==========================================
+def file_thread_id(pdf_path: str) -> str:
+    """
+    根据文件内容哈希生成确定性的 thread_id
+    同一篇论文 (哪怕重新上传、改了文件名) 总是映射到同一个 thread，从而能找回上次的进度
+    """
+    digest = hashlib.sha256()
+    with open(pdf_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return f"ingest-{digest.hexdigest()[:32]}"
+
+def prepare_ingestion_run(pdf_path: str) -> Tuple[Optional[Dict[str, Any]], Dict[str, Any]]:
+    """
+    为一篇论文准备 (输入, config)
+    - 如果该论文有未完成的 Checkpoint -> 输入为 None，LangGraph 会从最后完成的节点之后继续
+    - 否则 -> 返回全新的初始状态
+
+    :return: (initial_state 或 None, config)
+    """
+    thread_id = file_thread_id(pdf_path)
+    config = {"configurable": {"thread_id": thread_id}}
+
+    snapshot = ingestion_app.get_state(config)
+    if snapshot.next:
+        logger.info(f"♻️ Resuming {Path(pdf_path).name} from checkpoint (next: {list(snapshot.next)})")
+        return None, config
+
+    # 上次运行已结束但失败 (节点返回 status=failed)：重新开始，旧的页面图片会被重新渲染，先回收
+    stale_refs = (snapshot.values or {}).get("page_image_refs") or []
+    if stale_refs:
+        blob_store.delete(stale_refs)
+
+    initial_state = {
+        "pdf_path": str(pdf_path),
+        "retry_count": 0,
+        "status": "running",
+        "error_msg": None
+    }
+    return initial_state, config
+
+# ==========================================
+# 4. 线程回收 (Eviction)
+# ==========================================
+def release_ingestion_thread(thread_id: str, drop_blobs: bool = True):
+    """
+    入库流程成功结束后释放该 thread 的全部 Checkpoint
+    Checkpointer 会保留每个 thread_id 的所有快照，不回收就会无限增长
+    ⚠️ 失败的 thread 不要回收，保留下来才能断点续跑
+
+    :param thread_id: 要回收的 thread
+    :param drop_blobs: 是否一并删除该论文渲染出的页面图片
+    """
+    config = {"configurable": {"thread_id": thread_id}}
+    try:
+        if drop_blobs:
+            snapshot = ingestion_app.get_state(config)
+            refs = (snapshot.values or {}).get("page_image_refs") or []
+            blob_store.delete(refs)
+        ingestion_app.checkpointer.delete_thread(thread_id)
+        logger.info(f"🧹 Released ingestion thread {thread_id}")
+    except Exception as e:
+        logger.warning(f"⚠️ Failed to release ingestion thread {thread_id}: {e}")
\ No newline at end of file
@@ -1,15 +1,25 @@
 import json
+import re
+import time
 import yaml
 from typing import Dict, Any, List
 
 from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
 from langchain_core.documents import Document
-from langchain_qdrant import QdrantVectorStore
+from langchain_core.runnables import RunnableConfig
 
 from config.settings import settings
-from core.llm import get_agent_llm, get_embeddings, get_extractor_llm
+from core.llm import get_agent_llm, get_extractor_llm, embed_query
+from core.answer_cache import answer_cache, CACHED_MARKER
 from core.qdrant import qdrant_manager
-from core.search import search_tool
+from core.search import search_tool, format_results
+from core.context_packer import ContextPacker
+from core.chat_memory import chat_memory, strip_references, REFERENCES_MARKER
+from core.doc_store import hydrate_documents, make_context_refs, rehydrate_context
+from core.thread_catalog import thread_catalog
+from core.retriever import SEARCH_MODES, SearchFilters, get_search_mode, search_latency
+from core.chunk_index import CHUNK_CONTENT_TYPE, chunk_index
+from core.working_set import working_set_retriever
 from core.pdf_loader import load_pdf_as_images
 from graph.research.state import ResearchState
 from utils.logger import logger
@@ -22,20 +32,84 @@ def load_prompts():
 
 PROMPTS = load_prompts()
 
+# --- 辅助函数: 上下文存取 ---
+# reference 模式下 State 只保存文档引用，Checkpoint 不再反复序列化大段正文
+def store_context(docs: List[Document], existing_refs: List[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """把文档写回 State (按 RESEARCH_CONTEXT_MODE 决定存引用还是存完整文档)"""
+    if settings.RESEARCH_CONTEXT_MODE == "reference":
+        return {"context_refs": (existing_refs or []) + make_context_refs(docs), "context": []}
+    return {"context": docs, "context_refs": []}
+
+def load_context(state: ResearchState) -> List[Document]:
+    """从 State 取出完整文档 (引用会从 Qdrant / 本地 doc_store 取回，精简 payload 的正文从本地补全)"""
+    if state.get("context_refs"):
+        return rehydrate_context(state["context_refs"])
+    return hydrate_documents(state.get("context", []))
+
+# ==========================================
+# Node 0: 语义答案缓存 (Cache Lookup)
+# ==========================================
+def is_cacheable(state: ResearchState) -> bool:
+    """
+    只有不依赖对话上下文的回答才能复用：
+    会话的第一个问题、且没有临时上传论文
+    """
+    return (
+        settings.ANSWER_CACHE_ENABLED
+        and not state.get("uploaded_file_path")
+        and sum(isinstance(m, HumanMessage) for m in state.get("messages", [])) <= 1
+    )
+
+def cache_lookup_node(state: ResearchState, config: RunnableConfig) -> Dict[str, Any]:
+    """
+    相似问题在知识库未变化期间已经回答过 -> 直接返回缓存答案，跳过路由 / 检索 / 搜索 / 撰写
+    """
+    logger.info("⚡ Processing Node: Answer Cache")
+    if not is_cacheable(state):
+        return {"cache_hit": False}
+
+    question = state["question"]
+    try:
+        hit = answer_cache.lookup(
+            embed_query(question),
+            allow_web=state.get("allow_web_search", True),
+            top_k=state.get("top_k", 5),
+            collection_version=qdrant_manager.get_version(),
+            search_mode=state.get("search_mode") or settings.SEARCH_MODE
+        )
+    except Exception as e:
+        logger.error(f"❌ Answer cache lookup failed: {e}")
+        return {"cache_hit": False}
+
+    if not hit:
+        return {"cache_hit": False}
+
+    logger.info(f"   ⚡ Cache hit (similarity={hit.similarity:.3f}): {hit.question}")
+    thread_id = config.get("configurable", {}).get("thread_id")
+    if thread_id:
+        thread_catalog.touch(thread_id, question)
+    return {
+        "cache_hit": True,
+        "answer": CACHED_MARKER + hit.answer,
+        "messages": [AIMessage(content=strip_references(hit.answer))]
+    }
+
 # ==========================================
 # Node 1: 意图路由节点 (Router)
 # ==========================================
 def router_node(state: ResearchState) -> Dict[str, Any]:
     """
     分析用户意图：是只查本地知识库，还是需要联网？
+    同时从问题中提取检索过滤条件 (年份 / 会议 / 作者)，LLM 失败时用启发式规则兜底
     """
     logger.info("🚦 Processing Node: Router")
+    question = state["question"]
 
     if not state.get("allow_web_search", True):
-        logger.info("   🚫 Web search disabled by user. Forcing local retrieval.")
-        return {"router_decision": "retrieve"}
-    
-    question = state["question"]
+        # 不联网时不为路由单独调用 LLM，过滤条件用启发式解析
+        filters = SearchFilters.from_question(question)
+        logger.info(f"   🚫 Web search disabled by user. Forcing local retrieval. Filters: {filters.describe()}")
+        return {"router_decision": "retrieve", "filters": filters.to_dict()}
     
     llm = get_agent_llm(temperature=0) # 决策需要稳定
     prompt_cfg = PROMPTS["router"]
@@ -50,21 +124,26 @@ def router_node(state: ResearchState) -> Dict[str, Any]:
         content = response.content.replace("```json", "").replace("```", "").strip()
         decision_json = json.loads(content)
         decision = decision_json.get("decision", "web_search") # 默认联网，比较稳妥
+        if isinstance(decision_json.get("filters"), dict):
+            filters = SearchFilters.from_dict(decision_json["filters"])
+        else:
+            filters = SearchFilters.from_question(question)
         
-        logger.info(f"   👉 Decision: {decision}")
-        return {"router_decision": decision}
+        logger.info(f"   👉 Decision: {decision} | Filters: {filters.describe()}")
+        return {"router_decision": decision, "filters": filters.to_dict()}
         
     except Exception as e:
-        logger.error(f"❌ Router failed: {e}. Fallback to web_search.")
-        return {"router_decision": "web_search"}
+        filters = SearchFilters.from_question(question)
+        logger.error(f"❌ Router failed: {e}. Fallback to web_search (heuristic filters: {filters.describe()}).")
+        return {"router_decision": "web_search", "filters": filters.to_dict()}
 
 # ==========================================
 # Node 2: 本地检索节点 (Retriever) + 上传处理
 # ==========================================
-def retrieve_node(state: ResearchState) -> Dict[str, Any]:
+def retrieve_node(state: ResearchState, config: RunnableConfig) -> Dict[str, Any]:
     """
     1. 处理上传的 PDF (如果有) -> 转换为 Text
-    2. 从 Qdrant 检索相关文档
+    2. 按 Router 给出的过滤条件从 Qdrant 检索相关文档 (追问优先在会话工作集内本地重排)
     """
     logger.info("🔍 Processing Node: Retriever & Processor")
     question = state["question"]
@@ -106,26 +185,50 @@ def retrieve_node(state: ResearchState) -> Dict[str, Any]:
             logger.error(f"   ❌ Failed to process upload: {e}")
 
     # --- B. Qdrant 检索 ---
+    retrieval_ms = None
     try:
-        client = qdrant_manager.client
-        embedding_model = get_embeddings()
-        
-        vector_store = QdrantVectorStore(
-            client=client,
-            collection_name=settings.QDRANT_COLLECTION_NAME,
-            embedding=embedding_model
+        # 检索 Top K (问题向量与答案缓存共用，只请求一次 Embedding)
+        thread_id = config.get("configurable", {}).get("thread_id")
+        query_vector = embed_query(question)
+        filters = SearchFilters.from_dict(state.get("filters"))
+        mode = SEARCH_MODES.get(state.get("search_mode") or "") or get_search_mode()
+        t0 = time.perf_counter()
+        docs = working_set_retriever.retrieve(
+            query_vector, top_k, thread_id=thread_id, filters=filters, query_text=question, mode=mode
         )
-        
-        # 检索 Top K
-        docs = vector_store.similarity_search(question, k=top_k)
-        logger.info(f"   ✅ Retrieved {len(docs)} documents from DB.")
+        if not docs and not filters.is_empty():
+            # 过滤条件可能解析得过严 (或旧数据缺字段)，退回不过滤的检索
+            logger.warning(f"   ⚠️ No documents match filters ({filters.describe()}). Retrying without filters.")
+            docs = working_set_retriever.retrieve(query_vector, top_k, thread_id=thread_id, query_text=question, mode=mode)
+        logger.info(f"   ✅ Retrieved {len(docs)} documents from DB (filters: {filters.describe()}).")
         
         context_docs.extend(docs)
+
+        # 第二级：在命中的论文里找最相关的全文片段 (实验设置 / 具体数值等细节)
+        if settings.FULLTEXT_INDEX and docs:
+            chunks = chunk_index.search(
+                query_vector,
+                [doc.metadata["_id"] for doc in docs if doc.metadata.get("_id") is not None],
+                limit=settings.FULLTEXT_TOP_CHUNKS,
+                per_paper=settings.FULLTEXT_CHUNKS_PER_PAPER,
+                query_text=question,
+                mode=mode
+            )
+            logger.info(f"   📑 Retrieved {len(chunks)} full-text chunks within the top papers.")
+            context_docs.extend(chunks)
+
+        # 检索耗时 (不含问题 Embedding)，按档位记录供 UI 展示
+        retrieval_ms = (time.perf_counter() - t0) * 1000
+        search_latency.record(mode.name, retrieval_ms)
+        logger.info(f"   ⏱️ Retrieval took {retrieval_ms:.0f} ms (mode={mode.name}).")
         
     except Exception as e:
         logger.error(f"❌ Retrieval failed: {e}")
     
-    return {"context": context_docs}
+    update = store_context(context_docs)
+    if retrieval_ms is not None:
+        update["retrieval_ms"] = retrieval_ms
+    return update
 
 # ==========================================
 # Node 3: 联网搜索节点 (Web Search)
@@ -136,7 +239,6 @@ def web_search_node(state: ResearchState) -> Dict[str, Any]:
     """
     logger.info("🌍 Processing Node: Web Search")
     question = state["question"]
-    existing_context = state.get("context", [])
     
     llm = get_agent_llm()
     
@@ -147,69 +249,73 @@ def web_search_node(state: ResearchState) -> Dict[str, Any]:
         HumanMessage(content=prompt_cfg["user"].format(question=question))
     ]
     query_res = llm.invoke(messages).content.strip()
-    # 简单处理：假设 LLM 返回的是逗号分隔的关键词
-    queries = [q.strip() for q in query_res.split(",")]
+    # 简单处理：假设 LLM 返回的是逗号分隔的关键词 (兼容中文逗号和换行)，最多 3 个
+    queries = [q.strip() for q in re.split(r"[,，\n]", query_res) if q.strip()][:3]
     
     logger.info(f"   🔍 Generated Queries: {queries}")
     
-    # 2. 执行搜索 (只搜第一个词，或者并发搜)
-    # 为了演示简单，我们只用第一个关键词去搜
-    search_query = queries[0]
-    search_result_str = search_tool.search(search_query)
-    
+    # 2. 并发执行所有查询，按 URL / 近似内容去重后合并排序
+    results = search_tool.multi_search(queries, use_case="research")
+
     # 3. 将搜索结果封装成 Document 对象，以便和 Qdrant 结果格式统一
     web_doc = Document(
-        page_content=search_result_str,
-        metadata={"source": "web_search", "query": search_query}
+        page_content=format_results(results),
+        metadata={"source": "web_search", "query": ", ".join(queries)}
     )
     
-    # 4. 追加到现有 Context
+    # 4. 追加到现有 Context (reference 模式下只追加引用，不取回已有文档)
+    if settings.RESEARCH_CONTEXT_MODE == "reference":
+        update = store_context([web_doc], state.get("context_refs", []))
+    else:
+        update = store_context(state.get("context", []) + [web_doc])
     return {
-        "context": existing_context + [web_doc], # 合并
+        **update,
         "search_queries": queries
     }
 
 # ==========================================
 # Node 4: 撰写节点 (Writer)
 # ==========================================
-def writer_node(state: ResearchState) -> Dict[str, Any]:
+def writer_node(state: ResearchState, config: RunnableConfig) -> Dict[str, Any]:
     """
     读取 Context -> 生成最终回答
     """
     logger.info("✍️ Processing Node: Writer")
     temperature = state.get("temperature", 0.5)
     question = state["question"]
-    context_docs = state.get("context", [])
+    context_docs = load_context(state)
     messages = state.get("messages", [])
+
+    # 更新会话目录 (侧边栏历史列表)，标题取本会话的第一个问题
+    thread_id = config.get("configurable", {}).get("thread_id")
+    if thread_id:
+        first_question = next((m.content for m in messages if isinstance(m, HumanMessage)), question)
+        thread_catalog.touch(thread_id, first_question)
     
     if not context_docs:
         return {"answer": "抱歉，我没有找到任何相关资料，无法回答您的问题。"}
     
-    # 1. 格式化上下文
-    context_str = ""
-    for i, doc in enumerate(context_docs):
-        source = doc.metadata.get("title", "Web Search")
-        venue = doc.metadata.get("venue", "")
-        year = doc.metadata.get("year", "")
-        # 标记上传的文件
-        if doc.metadata.get("source") == "uploaded_file":
-            source = "[User Uploaded PDF]"
-            
-        context_str += f"\n--- Reference {i+1} ({source}) ---\n{doc.page_content}\n"
-    
-    # 2. 格式化历史消息
-    history_str = ""
-    recent_history = messages[:-1] # 不包含当前最新的这条问题
-    for msg in recent_history:
-        role = "User" if isinstance(msg, HumanMessage) else "Assistant"
-        history_str += f"{role}: {msg.content}\n"
-    
+    # 1. 准备历史消息 (不包含当前最新的这条问题)
+    # windowed 模式：最近 N 轮原文 + 更早对话的滚动摘要
+    history, summary = messages[:-1], ""
+    if settings.CHAT_MEMORY_MODE == "windowed" and thread_id:
+        summary, history = chat_memory.load(thread_id, history)
+
+    # 2. 按 Token 预算打包上下文和历史消息
+    prompt_cfg = PROMPTS["write_review"]
+    packed = ContextPacker().pack(
+        context_docs,
+        history,
+        reserved_text=prompt_cfg["system"] + question,
+        summary=summary
+    )
+    context_docs = packed.docs  # 参考文献编号与实际放进 Prompt 的文档保持一致
+
     # 3. 调用 LLM
     llm = get_agent_llm(temperature=temperature) 
-    prompt_cfg = PROMPTS["write_review"]
     system_msg = prompt_cfg["system"].format(
-        context=context_str,
-        chat_history=history_str, 
+        context=packed.format_context(),
+        chat_history=packed.chat_history, 
         question=question
     )
     
@@ -223,7 +329,7 @@ def writer_node(state: ResearchState) -> Dict[str, Any]:
         logger.info("   ✅ Answer generated.")
         
         # 增加参考文献
-        ref_section = "\n\n---\n### 📚 References\n\n"
+        ref_section = f"{REFERENCES_MARKER}\n\n"
         for i , doc in enumerate(context_docs):
             meta = doc.metadata
             index = i+1
@@ -233,11 +339,14 @@ def writer_node(state: ResearchState) -> Dict[str, Any]:
             elif meta.get("source") == "web_search":
                 query = meta.get("query", "General Search")
                 ref_section += f"**[{index}]** 🌐 **Web Search**: *{query}* (Content from Tavily)\n\n"
+            elif meta.get("content_type") == CHUNK_CONTENT_TYPE:
+                title = meta.get("title", "Unknown Title")
+                ref_section += f"**[{index}]** 📑 **{title}** — *Full-text excerpt, p. {meta.get('page', '?')}*\n\n"
             else:
                 # 论文来源
                 title = meta.get("title", "Unknown Title")
                 venue = meta.get("venue", "Unknown Venue")
-                year = meta.get("year", "N/A")
+                year = meta.get("year") or "N/A"
                 authors = meta.get("authors", [])
                 
                 auth_str = "Unknown Authors"
@@ -249,10 +358,30 @@ def writer_node(state: ResearchState) -> Dict[str, Any]:
                 ref_section += f"   - *{auth_str}* | {venue}, {year}\n\n"
                 
         final_content = response.content + ref_section
-        
+
+        # 会话的第一个问题写入语义答案缓存
+        if is_cacheable(state):
+            try:
+                answer_cache.store(
+                    question,
+                    embed_query(question),
+                    allow_web=state.get("allow_web_search", True),
+                    top_k=state.get("top_k", 5),
+                    collection_version=qdrant_manager.get_version(),
+                    answer=final_content,
+                    search_mode=state.get("search_mode") or settings.SEARCH_MODE
+                )
+            except Exception as e:
+                logger.error(f"❌ Failed to store answer in cache: {e}")
+
+        # 后台把滑出窗口的旧对话合并进摘要，不阻塞本轮回答
+        if settings.CHAT_MEMORY_MODE == "windowed" and thread_id:
+            chat_memory.schedule_update(thread_id, messages + [AIMessage(content=response.content)])
+
+        # 参考文献只用于展示，存入对话历史 (Checkpoint) 的是去掉样板后的正文
         return {
             "answer": final_content,
-            "messages": [AIMessage(content=final_content)] 
+            "messages": [AIMessage(content=response.content)] 
         }
     except Exception as e:
         logger.error(f"❌ Writing failed: {e}")
@@ -1,4 +1,4 @@
-from typing import TypedDict, List, Annotated, Optional
+from typing import TypedDict, List, Annotated, Optional, Dict, Any
 from langchain_core.documents import Document
 from langchain_core.messages import AnyMessage # 👈 引入 Message
 from langgraph.graph.message import add_messages # 👈 引入 reducer
@@ -10,10 +10,16 @@ class ResearchState(TypedDict):
     
     question: str
     router_decision: str
+    filters: Dict[str, Any]  # Router 从问题中解析出的检索过滤条件 (core.retriever.SearchFilters)
     search_queries: List[str]
     context: List[Document]
+    # reference 模式下的上下文：[{kind, id, collection, digest}]，完整文档按需取回 (core.doc_store)
+    context_refs: List[Dict[str, Any]]
     answer: str
+    cache_hit: bool  # 本轮是否直接命中语义答案缓存 (core.answer_cache)
     allow_web_search: bool
     top_k: int
+    search_mode: str      # 检索档位 fast / balanced / exhaustive (core.retriever.SEARCH_MODES)，缺省为 SEARCH_MODE
+    retrieval_ms: float   # 本轮知识库检索的实测耗时 (毫秒)
     temperature: float
     uploaded_file_path: Optional[str]
\ No newline at end of file
@@ -1,9 +1,12 @@
-import sqlite3  # 👈 必须导入这个标准库
 from langgraph.graph import StateGraph, END
-from langgraph.checkpoint.sqlite import SqliteSaver # 👈 确保导入的是 SqliteSaver
 
+from config.settings import settings
+from core.checkpointer import PooledSqliteSaver
+from core.checkpoint_maintenance import checkpoint_maintainer
+from core.thread_catalog import thread_catalog
 from graph.research.state import ResearchState
 from graph.research.nodes import (
+    cache_lookup_node,
     router_node,
     retrieve_node,
     web_search_node,
@@ -16,7 +19,7 @@ from utils.logger import logger
 # ==========================================
 def decide_to_web_search(state: ResearchState) -> str:
     """
-    根据 Router 的决策决定下一步
+    本地检索完成后，根据 Router 的决策决定下一步
     """
     decision = state.get("router_decision", "retrieve")
     
@@ -27,6 +30,15 @@ def decide_to_web_search(state: ResearchState) -> str:
         logger.info("👉 Routing to: Writer (Skipping Web)")
         return "writer"
 
+def decide_after_cache(state: ResearchState) -> str:
+    """
+    命中答案缓存直接结束，否则进入正常流程
+    """
+    if state.get("cache_hit"):
+        logger.info("👉 Answer served from cache")
+        return "end"
+    return "router"
+
 # ==========================================
 # 2. 构建 Research Graph
 # ==========================================
@@ -34,22 +46,34 @@ def build_research_graph():
     workflow = StateGraph(ResearchState)
 
     # A. 添加节点
-    workflow.add_node("retrieve", retrieve_node)     # 查本地
-    workflow.add_node("router", router_node)         # 做决策
+    workflow.add_node("cache_lookup", cache_lookup_node) # 查答案缓存
+    workflow.add_node("router", router_node)         # 做决策 + 解析过滤条件
+    workflow.add_node("retrieve", retrieve_node)     # 查本地 (按过滤条件)
     workflow.add_node("web_search", web_search_node) # 查网络
     workflow.add_node("writer", writer_node)         # 写答案
 
     # B. 设置起点
-    # 策略：无论如何先查本地库，哪怕Router最后决定联网，本地资料也是很好的补充
-    workflow.set_entry_point("retrieve")
+    # 策略：先查语义答案缓存；未命中时先由 Router 决策并解析过滤条件 (年份 / 会议 / 作者)，
+    # 然后无论如何都查本地库，哪怕Router决定联网，本地资料也是很好的补充
+    workflow.set_entry_point("cache_lookup")
 
     # C. 连接节点
-    # 1. Retrieve -> Router (查完本地，让大脑判断一下够不够，或者问题是否需要即时信息)
-    workflow.add_edge("retrieve", "router")
+    # 0. Cache -> Conditional (命中直接结束 OR 去路由)
+    workflow.add_conditional_edges(
+        "cache_lookup",
+        decide_after_cache,
+        {
+            "end": END,
+            "router": "router"
+        }
+    )
+
+    # 1. Router -> Retrieve (带着过滤条件查本地，过滤在 Qdrant 的 ANN 阶段生效)
+    workflow.add_edge("router", "retrieve")
 
-    # 2. Router -> Conditional (去联网 OR 直接写)
+    # 2. Retrieve -> Conditional (按 Router 的决策去联网 OR 直接写)
     workflow.add_conditional_edges(
-        "router",
+        "retrieve",
         decide_to_web_search,
         {
             "web_search": "web_search",
@@ -65,11 +89,16 @@ def build_research_graph():
 
     # D. 编译 (Compile)
     # 🌟 修改点：使用 SQLite 持久化存储
-    # check_same_thread=False 是 Streamlit 多线程环境下必须的
-    conn = sqlite3.connect("checkpoints.sqlite", check_same_thread=False)
-    memory = SqliteSaver(conn)
+    # Streamlit 每个会话一个线程：用连接池 + WAL，多个会话并发对话互不阻塞
+    memory = PooledSqliteSaver(settings.CHECKPOINT_DB_PATH)
 
     return workflow.compile(checkpointer=memory)
 
 # 实例化 App
-research_app = build_research_graph()
\ No newline at end of file
+research_app = build_research_graph()
+
+# 一次性为旧会话补齐会话目录 (之后由 writer_node 维护)
+thread_catalog.backfill(research_app)
+
+# 后台维护 Checkpoint 数据库 (保留最近 N 个 / 归档不活跃会话 / 空间回收)
+checkpoint_maintainer.start()
\ No newline at end of file
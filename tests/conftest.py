@@ -0,0 +1,47 @@
+"""
+pytest 公共配置
+- 把项目根目录加入 sys.path (与各模块 __main__ 自检的做法一致)
+- 必填的 API Key 给占位值：测试不访问外部服务，只需要 Settings 能加载
+- 数据目录 / Checkpoint 库指向临时目录，测试不会写到仓库的 data/，也不会改动本地的集合版本号
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+for key in ("AGENT_API_KEY", "CRITIC_API_KEY", "EXTRACTOR_API_KEY", "EMBEDDING_API_KEY", "TAVILY_API_KEY"):
+    os.environ.setdefault(key, "test")
+# 后台维护线程不在测试里启动
+os.environ.setdefault("CHECKPOINT_MAINTENANCE_INTERVAL", "0")
+# 测试固定用进程内纯内存 Qdrant (QDRANT_PATH=:memory:)，不依赖也不会碰到 .env 里配置的 Qdrant 服务
+os.environ["QDRANT_MODE"] = "embedded"
+os.environ["QDRANT_PATH"] = ":memory:"
+# 测试模块在收集阶段就会导入 settings 和各模块单例 (DocStore 等建库)，
+# 这早于任何 fixture (包括 tmp_path_factory)，所以临时目录在这里建、在 pytest_unconfigure 里删
+TEST_DATA_DIR = tempfile.mkdtemp(prefix="pytest-data-")
+os.environ["DATA_PATH"] = TEST_DATA_DIR
+os.environ["CHECKPOINT_DB_PATH"] = os.path.join(TEST_DATA_DIR, "checkpoints.sqlite")
+
+import pytest  # noqa: E402
+
+
+def pytest_unconfigure(config):
+    shutil.rmtree(TEST_DATA_DIR, ignore_errors=True)
+
+
+@pytest.fixture
+def qdrant():
+    """每个测试一个全新的内存 Qdrant，返回 qdrant_manager"""
+    from core.qdrant import qdrant_manager
+
+    qdrant_manager._client = None
+    qdrant_manager._layouts.clear()
+    qdrant_manager._counts.clear()
+    yield qdrant_manager
+    qdrant_manager.client.close()
+    qdrant_manager._client = None
@@ -0,0 +1,52 @@
+"""PooledSqliteSaver 并发测试：多个会话线程同时在各自的 thread_id 上跑多轮对话"""
+
+import operator
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Annotated, List, TypedDict
+
+from langgraph.graph import END, StateGraph
+
+from core.checkpointer import PooledSqliteSaver
+
+SESSIONS, TURNS = 32, 20
+
+
+class CounterState(TypedDict):
+    turns: Annotated[List[int], operator.add]
+
+
+def step(state: CounterState):
+    time.sleep(0.001)  # 模拟节点内的工作
+    return {"turns": [len(state.get("turns", []))]}
+
+
+def build_graph():
+    graph = StateGraph(CounterState)
+    graph.add_node("a", step)
+    graph.add_node("b", step)
+    graph.set_entry_point("a")
+    graph.add_edge("a", "b")
+    graph.add_edge("b", END)
+    return graph
+
+
+def test_parallel_sessions_keep_complete_state(tmp_path):
+    """没有 "database is locked"，且每个会话的状态完整 (每轮两个节点各追加一次)"""
+    saver = PooledSqliteSaver(tmp_path / "concurrency.sqlite", pool_size=8)
+    app = build_graph().compile(checkpointer=saver)
+
+    def session(i: int) -> int:
+        config = {"configurable": {"thread_id": f"session-{i}"}}
+        for _ in range(TURNS):
+            app.invoke({"turns": []}, config)
+        return len(app.get_state(config).values["turns"])
+
+    try:
+        with ThreadPoolExecutor(max_workers=SESSIONS) as pool:
+            results = list(pool.map(session, range(SESSIONS)))
+    finally:
+        saver.close()
+
+    assert results == [TURNS * 2] * SESSIONS
+    assert saver._created <= saver.pool_size + 1
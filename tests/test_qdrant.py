@@ -0,0 +1,93 @@
+"""检索 (过滤 + 混合) 与集合搬运，跑在进程内纯内存 Qdrant 上 (QDRANT_PATH=:memory:)"""
+
+import uuid
+
+import numpy as np
+from qdrant_client import QdrantClient, models
+
+from config.settings import settings
+from core.qdrant import SPARSE_VECTOR
+from core.qdrant_transfer import copy_aliases, copy_collection, recreate_collection
+from core.retriever import SEARCH_MODES, SearchFilters, search_points
+
+DIM = 32
+VENUES = ["CVPR 2023", "Proceedings of NeurIPS", "ICML", "ACL"]
+
+
+def make_collection(manager, name: str, n: int = 80, seed: int = 0, needle: str = "", needle_vector=None) -> str:
+    """n 个随机论文点；needle 不为空时额外写入一个正文含该词、稠密向量为 needle_vector 的点，返回其 id"""
+    rng = np.random.default_rng(seed)
+    manager.create_collection(name, DIM, mini_dim=0, sparse=True, sections=False)
+    rows = [
+        (rng.normal(size=DIM), f"paper {i} about learning", {"year": 2015 + i % 10, "venue": VENUES[i % len(VENUES)]})
+        for i in range(n)
+    ]
+    needle_id = str(uuid.uuid4())
+    if needle:
+        rows.append((needle_vector, f"a study of {needle} catalysts", {"year": 2020, "venue": "ICML"}))
+    points = []
+    for i, (vector, text, metadata) in enumerate(rows):
+        points.append(models.PointStruct(
+            id=needle_id if needle and i == len(rows) - 1 else str(uuid.uuid4()),
+            vector=manager.make_vectors(vector.tolist(), name, text=text),
+            payload={"page_content": text, "metadata": {"title": text, **metadata}}
+        ))
+    manager.client.upsert(name, points, wait=True)
+    manager.bump_version(name)
+    return needle_id
+
+
+def test_search_points_applies_filters(qdrant):
+    name = qdrant.collection_name
+    make_collection(qdrant, name)
+    query = np.random.default_rng(1).normal(size=DIM)
+    filters = SearchFilters(year_from=2018, year_to=2020, venues=["NeurIPS"])
+
+    points = search_points(query, 10, collection_name=name, filters=filters, mode=SEARCH_MODES["balanced"])
+
+    assert points
+    for point in points:
+        assert 2018 <= point.document.metadata["year"] <= 2020
+        assert "NeurIPS" in point.document.metadata["venue"]
+
+
+def test_hybrid_search_surfaces_exact_term_match(qdrant, monkeypatch):
+    monkeypatch.setattr(settings, "HYBRID_SEARCH", True)
+    name = qdrant.collection_name
+    query = np.random.default_rng(1).normal(size=DIM)
+    # 稠密向量与问题方向相反，只有稀疏 (BM25) 分路能把它找回来
+    needle_id = make_collection(qdrant, name, needle="zeolite", needle_vector=-query)
+    mode = SEARCH_MODES["balanced"]
+
+    dense_only = search_points(query, 5, collection_name=name, mode=mode)
+    hybrid = search_points(query, 5, collection_name=name, query_text="zeolite catalysts", mode=mode)
+
+    assert needle_id not in {str(p.document.metadata["_id"]) for p in dense_only}
+    assert needle_id in {str(p.document.metadata["_id"]) for p in hybrid}
+
+
+def test_copy_collection_preserves_layout_points_and_aliases(qdrant):
+    source_name = f"{qdrant.collection_name}__physical"
+    make_collection(qdrant, source_name, n=300)
+    qdrant.point_alias(source_name)
+    target = QdrantClient(location=":memory:")
+    try:
+        recreate_collection(qdrant.client, target, source_name)
+        copied = copy_collection(qdrant.client, target, source_name, batch_size=64)
+        aliases = copy_aliases(qdrant.client, target, [source_name])
+
+        assert copied == 300 == target.count(source_name).count
+        assert aliases == [qdrant.collection_name]
+        params = target.get_collection(source_name).config.params
+        source_params = qdrant.client.get_collection(source_name).config.params
+        assert params.vectors == source_params.vectors
+        assert set(params.sparse_vectors) == {SPARSE_VECTOR}
+
+        original, _ = qdrant.client.scroll(source_name, limit=5, with_vectors=True, with_payload=True)
+        copies = {p.id: p for p in target.retrieve(source_name, [p.id for p in original], with_vectors=True, with_payload=True)}
+        for point in original:
+            assert copies[point.id].payload == point.payload
+            assert np.allclose(qdrant.full_vector(copies[point.id].vector), qdrant.full_vector(point.vector))
+            assert copies[point.id].vector[SPARSE_VECTOR].indices == point.vector[SPARSE_VECTOR].indices
+    finally:
+        target.close()
@@ -0,0 +1,61 @@
+"""会话工作集：本地重排只用于纯稠密检索，多路融合 (分段 / 稀疏) 时每次都回到 Qdrant"""
+
+import uuid
+
+import numpy as np
+import pytest
+from qdrant_client import models
+
+from core.retriever import SEARCH_MODES
+from core.working_set import WorkingSetRetriever
+
+DIM = 32
+TOPICS = ["graph neural network", "diffusion model", "reinforcement learning", "protein folding"]
+
+
+def fill(manager, name: str, sections: bool, sparse: bool, n: int = 60, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    manager.create_collection(name, DIM, mini_dim=0, sparse=sparse, sections=sections)
+    points = []
+    for i in range(n):
+        vector = rng.normal(size=DIM)
+        text = f"{TOPICS[i % len(TOPICS)]} paper {i}"
+        section_vectors = {key: rng.normal(size=DIM).tolist() for key in ("title", "abstract", "intro")} if sections else None
+        points.append(models.PointStruct(
+            id=str(uuid.uuid4()),
+            vector=manager.make_vectors(vector.tolist(), name, text=text, sections=section_vectors),
+            payload={"page_content": text, "metadata": {"title": text, "year": 2015 + i % 10}}
+        ))
+    manager.client.upsert(name, points, wait=True)
+    manager.bump_version(name)
+
+
+def titles(docs):
+    return [doc.metadata["title"] for doc in docs]
+
+
+@pytest.mark.parametrize("sections,sparse", [(True, True), (True, False), (False, True)])
+def test_fused_retrieval_is_stable_across_follow_ups(qdrant, sections, sparse):
+    fill(qdrant, qdrant.collection_name, sections=sections, sparse=sparse)
+    retriever = WorkingSetRetriever(pool_factor=3, drift_threshold=0.0)
+    query = np.random.default_rng(1).normal(size=DIM)
+    mode = SEARCH_MODES["balanced"]
+
+    first = retriever.retrieve(query, 5, thread_id="t", query_text="diffusion model paper", mode=mode)
+    second = retriever.retrieve(query, 5, thread_id="t", query_text="diffusion model paper", mode=mode)
+
+    assert titles(first) == titles(second)
+    assert retriever.local_hits == 0 and retriever.remote_searches == 2
+
+
+def test_dense_only_follow_up_is_reranked_locally(qdrant):
+    fill(qdrant, qdrant.collection_name, sections=False, sparse=False)
+    retriever = WorkingSetRetriever(pool_factor=3, drift_threshold=0.0)
+    query = np.random.default_rng(1).normal(size=DIM)
+    mode = SEARCH_MODES["balanced"]
+
+    first = retriever.retrieve(query, 5, thread_id="t", query_text="diffusion model paper", mode=mode)
+    second = retriever.retrieve(query, 5, thread_id="t", query_text="diffusion model paper", mode=mode)
+
+    assert titles(first) == titles(second)
+    assert retriever.local_hits == 1 and retriever.remote_searches == 1
@@ -1,6 +1,8 @@
 import streamlit as st
 from typing import Dict, Any, List
 
+from core.retriever import SearchFilters
+
 def render_ingestion_status(status_container, node_name: str, state_update: Dict[str, Any], preview_data: Dict):
     """
     可视化入库流程的状态更新
@@ -16,8 +18,8 @@ def render_ingestion_status(status_container, node_name: str, state_update: Dict
         missing = state_update.get("missing_fields", [])
         
         # 收集预览数据
-        if state_update.get("page_images"):
-            preview_data["images"] = state_update["page_images"]
+        if state_update.get("page_image_refs"):
+            preview_data["image_refs"] = state_update["page_image_refs"]
         if meta:
             preview_data["metadata"] = meta
         
@@ -46,16 +48,25 @@ def render_research_status(status_container, node_name: str, state_update: Dict[
     """
     可视化研究助手流程的状态更新
     """
-    if node_name == "retrieve":
-        docs = state_update.get("context", [])
-        status_container.info(f"🔍 **Retriever**: Found {len(docs)} local documents.")
+    if node_name == "cache_lookup":
+        if state_update.get("cache_hit"):
+            status_container.success("⚡ **Cache**: Same question answered before. Returning cached answer.")
+
+    elif node_name == "retrieve":
+        docs = state_update.get("context_refs") or state_update.get("context", [])
+        elapsed = state_update.get("retrieval_ms")
+        timing = f" in {elapsed:.0f} ms" if elapsed is not None else ""
+        status_container.info(f"🔍 **Retriever**: Found {len(docs)} local documents{timing}.")
         
     elif node_name == "router":
         decision = state_update.get("router_decision")
         if decision == "web_search":
-            status_container.warning("🚦 **Router**: Need external info. Switching to Web Search.")
+            status_container.warning("🚦 **Router**: Need external info. Will also search the Web.")
         else:
             status_container.success("🚦 **Router**: Local knowledge is sufficient.")
+        filters = SearchFilters.from_dict(state_update.get("filters"))
+        if not filters.is_empty():
+            status_container.write(f"🎯 **Filters**: `{filters.describe()}`")
             
     elif node_name == "web_search":
         queries = state_update.get("search_queries", [])
@@ -1,10 +1,10 @@
-import base64
-import uuid
 import streamlit as st
 import traceback
 
 # --- 导入业务逻辑 ---
-from graph.ingestion.workflow import ingestion_app
+from core.blob_store import blob_store
+from graph.ingestion.pipeline import IngestionPipeline
+from graph.ingestion.workflow import ingestion_app, prepare_ingestion_run, release_ingestion_thread
 
 # --- 导入你的新组件 ---
 # 注意：render_pdf_uploader 需要修改为返回列表 List[Path]
@@ -24,10 +24,78 @@ file_paths = render_pdf_uploader()
 if file_paths:
     st.info(f"📂 Ready to process {len(file_paths)} documents.")
 
+    # 批量模式：分阶段流水线，适合一次导入大量论文
+    pipeline_mode = st.toggle(
+        "⚡ Pipeline Mode",
+        value=len(file_paths) > 5,
+        help="render → extract → fix → embed → upsert 分阶段并发执行，embed/upsert 跨论文批处理。适合大批量导入。"
+             "注意：流水线模式不保存逐篇进度，中断后无法断点续跑，需要整批重跑 (已入库的论文会被覆盖，不会重复)。"
+    )
+    if pipeline_mode:
+        st.caption("⚠️ Pipeline mode keeps no per-paper checkpoint: an interrupted batch has to be re-run from the start.")
+    if pipeline_mode:
+        with st.expander("⚙️ Pipeline Workers", expanded=False):
+            w_col1, w_col2, w_col3 = st.columns(3)
+            with w_col1:
+                render_workers = st.number_input("Render", 1, 16, 2)
+                embed_workers = st.number_input("Embed", 1, 8, 2)
+            with w_col2:
+                extract_workers = st.number_input("Extract", 1, 32, 4)
+                upsert_workers = st.number_input("Upsert", 1, 8, 1)
+            with w_col3:
+                fix_workers = st.number_input("Fix", 1, 32, 4)
+                queue_size = st.number_input("Queue Size", 1, 64, 8)
+
+    # ==========================================
+    # 2a. 流水线模式
+    # ==========================================
+    if pipeline_mode and st.button("🚀 Start Ingestion Pipeline", type="primary"):
+        pipeline = IngestionPipeline(
+            render_workers=render_workers,
+            extract_workers=extract_workers,
+            fix_workers=fix_workers,
+            embed_workers=embed_workers,
+            upsert_workers=upsert_workers,
+            queue_size=queue_size
+        )
+        progress_bar = st.progress(0)
+        total_files = len(file_paths)
+        
+        with st.status(f"🏭 Pipeline is processing {total_files} documents...", expanded=True) as pipeline_status:
+            for done, job in enumerate(pipeline.run_iter([str(p) for p in file_paths]), start=1):
+                title = job.metadata.get("title") or job.pdf_path
+                if job.status == "success":
+                    pipeline_status.write(f"✅ **{title}** ({job.metadata.get('venue', 'Unknown')}, {job.metadata.get('year', 'N/A')})")
+                else:
+                    pipeline_status.write(f"❌ `{job.pdf_path}`: {job.error_msg}")
+                progress_bar.progress(done / total_files)
+            pipeline_status.update(label="✅ Pipeline finished!", state="complete", expanded=False)
+        
+        report = pipeline.report
+        st.success(f"🎉 {report.succeeded}/{report.total} documents ingested in {report.wall_seconds:.1f}s")
+        st.markdown(f"**🐢 Bottleneck:** `{report.bottleneck}`")
+        if report.sink:
+            st.caption(f"📦 Sink: {report.sink.format()}")
+        st.dataframe(
+            [
+                {
+                    "Stage": s.name,
+                    "Workers": s.workers,
+                    "Items": s.processed,
+                    "Batches": s.batches,
+                    "Busy (s)": round(s.busy_seconds, 1),
+                    "Blocked (s)": round(s.blocked_seconds, 1),
+                    "Utilization": f"{s.utilization:.0%}",
+                }
+                for s in report.stages
+            ],
+            use_container_width=True
+        )
+
     # ==========================================
-    # 2. 启动 Agent 流程
+    # 2b. 启动 Agent 流程 (逐篇)
     # ==========================================
-    if st.button("🚀 Start AI Ingestion Agent", type="primary"):
+    if not pipeline_mode and st.button("🚀 Start AI Ingestion Agent", type="primary"):
         
         # 总进度条
         progress_bar = st.progress(0)
@@ -43,18 +111,17 @@ if file_paths:
             
             # 定义临时变量收集当前文件的结果数据
             preview_data = {
-                "images": None,
+                "image_refs": None,
                 "metadata": {}
             }
+            succeeded = False
             
             try:
-                # 构造初始状态
-                initial_state = {
-                    "pdf_path": str(file_path),
-                    "retry_count": 0
-                }
-                # 为每个文件生成独立的 thread_id，避免状态混淆
-                config = {"configurable": {"thread_id": str(uuid.uuid4())}}
+                # 构造初始状态 (thread_id 由文件哈希决定；有未完成的 Checkpoint 时 initial_state 为 None，即断点续跑)
+                initial_state, config = prepare_ingestion_run(str(file_path))
+                thread_id = config["configurable"]["thread_id"]
+                if initial_state is None:
+                    status_container.info("♻️ Found unfinished progress. Resuming from last checkpoint...")
                 
                 # --- Stream 运行图 ---
                 for event in ingestion_app.stream(initial_state, config=config):
@@ -67,41 +134,57 @@ if file_paths:
                             preview_data
                         )
                 
-                status_container.update(label=f"✅ {file_path.name} - Complete!", state="complete", expanded=False)
+                # 续跑时前面节点的输出不会再次出现在 stream 中，以最终状态为准
+                final_state = ingestion_app.get_state(config).values or {}
+                preview_data["metadata"] = final_state.get("metadata") or preview_data["metadata"]
+                preview_data["image_refs"] = final_state.get("page_image_refs") or preview_data["image_refs"]
+                # 节点通过返回 status=failed 报告失败 (不抛异常)，stream 会正常结束，必须看最终状态
+                succeeded = final_state.get("status") == "success"
+                if not succeeded:
+                    status_container.update(label=f"❌ Failed on {file_path.name}", state="error")
+                    st.error(f"{file_path.name} failed: {final_state.get('error_msg') or 'unknown error'}. "
+                             "Run it again to retry.")
+                else:
+                    status_container.update(label=f"✅ {file_path.name} - Complete!", state="complete", expanded=False)
                 
-                # ==========================================
-                # 4. 展示该文件的最终结果
-                # ==========================================
-                with st.expander(f"🎉 View Result: {file_path.name}", expanded=True):
-                    final_meta = preview_data.get("metadata", {})
-                    final_images = preview_data.get("images", [])
+                    # ==========================================
+                    # 4. 展示该文件的最终结果
+                    # ==========================================
+                    with st.expander(f"🎉 View Result: {file_path.name}", expanded=True):
+                        final_meta = preview_data.get("metadata", {})
+                        final_image_refs = preview_data.get("image_refs") or []
                     
-                    col1, col2 = st.columns([1, 2])
-                    with col1:
-                        if final_images and len(final_images) > 0:
-                            try:
-                                # Base64 解码显示封面
-                                image_data = base64.b64decode(final_images[0])
-                                st.image(image_data, caption="Cover Page", use_container_width=True)
-                            except Exception:
-                                st.warning("Image render failed")
-                        else:
-                            st.warning("No preview image available")
+                        col1, col2 = st.columns([1, 2])
+                        with col1:
+                            if final_image_refs:
+                                try:
+                                    # 从 Blob 存储读取封面
+                                    image_data = blob_store.get(final_image_refs[0])
+                                    st.image(image_data, caption="Cover Page", use_container_width=True)
+                                except Exception:
+                                    st.warning("Image render failed")
+                            else:
+                                st.warning("No preview image available")
                             
-                    with col2:
-                        st.markdown(f"**Title:** {final_meta.get('title', 'Unknown')}")
-                        st.markdown(f"**Venue:** {final_meta.get('venue', 'Unknown')}")
-                        st.markdown(f"**Year:** {final_meta.get('year', 'Unknown')}")
-                        st.markdown(f"**Authors:** {', '.join(final_meta.get('authors', []))}")
+                        with col2:
+                            st.markdown(f"**Title:** {final_meta.get('title', 'Unknown')}")
+                            st.markdown(f"**Venue:** {final_meta.get('venue', 'Unknown')}")
+                            st.markdown(f"**Year:** {final_meta.get('year', 'Unknown')}")
+                            st.markdown(f"**Authors:** {', '.join(final_meta.get('authors', []))}")
                         
-                        if final_meta.get("introduction_summary"):
-                            st.caption("**Introduction Summary:**")
-                            st.info(final_meta.get("introduction_summary"))
+                            if final_meta.get("introduction_summary"):
+                                st.caption("**Introduction Summary:**")
+                                st.info(final_meta.get("introduction_summary"))
             
             except Exception as e:
                 status_container.update(label=f"❌ Error on {file_path.name}", state="error")
                 st.error(f"An error occurred with {file_path.name}: {e}")
                 st.code(traceback.format_exc())
+            finally:
+                # 只有最终状态为 success 才回收该 thread 的 Checkpoint 和页面图片；
+                # 异常中断的保留，下次重跑时续传；节点报告失败的保留以便排查，重跑时重新开始
+                if succeeded:
+                    release_ingestion_thread(thread_id)
             
             # 更新进度条
             progress_bar.progress((i + 1) / total_files)
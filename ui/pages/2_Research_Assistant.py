@@ -1,5 +1,4 @@
 import uuid
-import sqlite3
 import streamlit as st
 from langchain_core.messages import HumanMessage, AIMessage
 from pathlib import Path
@@ -7,6 +6,11 @@ from pathlib import Path
 # --- 导入业务逻辑 ---
 from graph.research.workflow import research_app
 from config.settings import settings
+from core.chat_memory import chat_memory
+from core.checkpoint_maintenance import checkpoint_maintainer
+from core.retriever import SEARCH_MODES, search_latency
+from core.thread_catalog import thread_catalog
+from core.working_set import working_set_retriever
 # --- 导入组件 ---
 from ui.components.chat_interface import render_chat_history, render_assistant_response
 from ui.components.state_visualizer import render_research_status
@@ -17,60 +21,36 @@ st.title("🧠 Deep Research Assistant")
 # ==========================================
 # 0. 数据库辅助函数
 # ==========================================
-DB_PATH = "checkpoints.sqlite"
+HISTORY_PAGE_SIZE = 20
 
-def get_history_threads():
-    """读取所有历史对话 ID"""
+def get_history_threads(limit: int):
+    """读取最近活跃的历史对话 (会话目录上的一次分页查询)"""
     try:
-        conn = sqlite3.connect(f"file:{DB_PATH}?mode=ro", uri=True)
-        cursor = conn.cursor()
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='checkpoints';")
-        if not cursor.fetchone(): return []
-        
-        query = """
-            SELECT thread_id, MAX(checkpoint_id) as last_active 
-            FROM checkpoints 
-            GROUP BY thread_id 
-            ORDER BY last_active DESC
-        """
-        cursor.execute(query)
-        threads = [row[0] for row in cursor.fetchall()]
-        conn.close()
-        return threads
+        return thread_catalog.list_threads(limit=limit)
     except Exception:
         return []
 
 def delete_chat_history(thread_id: str):
-    """删除指定 thread_id 的所有记录"""
+    """删除指定 thread_id 的所有记录 (Checkpoint / 归档 / 摘要 / 目录)"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        tables = ["checkpoints", "checkpoint_blobs", "checkpoint_writes"]
-        for table in tables:
-            try:
-                cursor.execute(f"DELETE FROM {table} WHERE thread_id = ?", (thread_id,))
-            except sqlite3.OperationalError:
-                pass 
-        conn.commit()
-        conn.close()
+        checkpoint_maintainer.delete_threads([thread_id])
+        checkpoint_maintainer.drop_archive(thread_id)
+        chat_memory.delete(thread_id)
+        thread_catalog.delete(thread_id)
+        working_set_retriever.forget(thread_id)
         return True
     except Exception as e:
         st.error(f"Failed to delete chat: {e}")
         return False
 
 def clear_all_history():
-    """清空所有历史记录"""
+    """清空所有历史记录，空间回收由后台维护线程完成"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        tables = ["checkpoints", "checkpoint_blobs", "checkpoint_writes"]
-        for table in tables:
-            try:
-                cursor.execute(f"DELETE FROM {table}")
-            except sqlite3.OperationalError:
-                pass
-        conn.commit()
-        conn.close()
+        checkpoint_maintainer.delete_threads()
+        checkpoint_maintainer.drop_archive()
+        chat_memory.delete()
+        thread_catalog.clear()
+        working_set_retriever.clear()
         return True
     except Exception as e:
         st.error(f"Failed to clear history: {e}")
@@ -119,6 +99,23 @@ with st.sidebar:
         allow_web = st.toggle("🌐 Enable Web Search", value=True)
         st.caption("🔍 **Retrieval (Top-K)**")
         top_k_val = st.slider("Docs", 1, 10, 5)
+        st.caption("⚡ **Search Mode**")
+        mode_names = list(SEARCH_MODES)
+        search_mode = st.radio(
+            "Mode",
+            mode_names,
+            index=mode_names.index(settings.SEARCH_MODE) if settings.SEARCH_MODE in mode_names else 0,
+            horizontal=True,
+            label_visibility="collapsed",
+            help="\n".join(f"**{m.name}**: {m.description}" for m in SEARCH_MODES.values())
+        )
+        # 各档位在本进程内的实测检索延迟
+        latency = search_latency.summary()
+        if latency:
+            st.caption(" · ".join(
+                f"{name}: p50 {s['p50']:.0f} ms / p95 {s['p95']:.0f} ms (n={s['count']})"
+                for name, s in latency.items()
+            ))
         st.caption("🌡️ **Temperature**")
         temp_val = st.slider("Creativity", 0.0, 1.0, 0.5, 0.1)
 
@@ -136,25 +133,18 @@ with st.sidebar:
                 st.rerun()
 
     # --- 渲染历史列表 ---
-    history_threads = get_history_threads()
+    if "history_limit" not in st.session_state:
+        st.session_state.history_limit = HISTORY_PAGE_SIZE
+    history_threads = get_history_threads(st.session_state.history_limit)
     
     if not history_threads:
         st.caption("No history found.")
     
-    for t_id in history_threads:
-        # 获取标题
-        label = f"Chat {t_id[:6]}.."
-        try:
-            sp_config = {"configurable": {"thread_id": t_id}}
-            snapshot = research_app.get_state(sp_config)
-            if snapshot.values and "messages" in snapshot.values:
-                for m in snapshot.values["messages"]:
-                    if isinstance(m, HumanMessage):
-                        content = m.content.strip().replace("\n", " ")
-                        label = (content[:15] + "..") if len(content) > 15 else content
-                        break
-        except Exception:
-            pass
+    for thread in history_threads:
+        t_id = thread.thread_id
+        # 标题直接来自会话目录，无需读取 State
+        title = thread.title or f"Chat {t_id[:6]}.."
+        label = (title[:15] + "..") if len(title) > 15 else title
 
         # 渲染按钮
         col_chat, col_del = st.columns([0.75, 0.25])
@@ -180,6 +170,12 @@ with st.sidebar:
                         st.session_state.messages = []
                     st.rerun()
 
+    # --- 分页：加载更多 ---
+    if len(history_threads) >= st.session_state.history_limit:
+        if st.button("⬇️ Load more", key="load_more_history", use_container_width=True):
+            st.session_state.history_limit += HISTORY_PAGE_SIZE
+            st.rerun()
+
 # 获取当前 ID
 thread_id = st.session_state.current_thread_id
 
@@ -189,6 +185,9 @@ thread_id = st.session_state.current_thread_id
 if not st.session_state.get("messages"):
     st.session_state.messages = []
     try:
+        # 已归档的会话先从冷存储恢复
+        if thread_catalog.is_archived(thread_id):
+            checkpoint_maintainer.restore_thread(thread_id)
         config = {"configurable": {"thread_id": thread_id}}
         state_snapshot = research_app.get_state(config)
         if state_snapshot.values and "messages" in state_snapshot.values:
@@ -223,6 +222,7 @@ if prompt := st.chat_input("Ask about your papers..."):
                 "messages": [HumanMessage(content=prompt)],
                 "allow_web_search": allow_web,
                 "top_k": top_k_val,
+                "search_mode": search_mode,
                 "temperature": temp_val,
                 "uploaded_file_path": st.session_state.uploaded_ref_path # 👈 传入文件路径
             }
@@ -231,8 +231,8 @@ if prompt := st.chat_input("Ask about your papers..."):
             for event in research_app.stream(initial_state, config=config):
                 for node_name, state_update in event.items():
                     render_research_status(status_box, node_name, state_update)
-                    if node_name == "writer":
-                        final_answer = state_update.get("answer", "")
+                    if node_name in ("writer", "cache_lookup") and state_update.get("answer"):
+                        final_answer = state_update["answer"]
             
             status_box.update(label="✅ Ready!", state="complete", expanded=False)
             if final_answer:
@@ -5,6 +5,7 @@ import plotly.graph_objects as go
 from typing import List, Dict, Any
 
 # --- 核心模块导入 ---
+from core.doc_store import load_bodies
 from core.qdrant import qdrant_manager
 from core.clustering import clustering_service
 from utils.logger import logger
@@ -295,9 +296,13 @@ if st.session_state.clustering_result:
     
     if selected_cluster is not None:
         cluster_papers = grouped.get(selected_cluster, [])
+        # 精简 payload 下摘要只在本地存储，只为当前展开的簇取回
+        bodies = load_bodies([p["id"] for p in cluster_papers if "abstract" not in p["metadata"]])
         
         for paper in cluster_papers:
             meta = paper["metadata"]
+            if str(paper["id"]) in bodies:
+                meta = {**bodies[str(paper["id"])].metadata, **meta}
             title = meta.get("title", "Unknown Title")
             venue = meta.get("venue", "Unknown")
             year = meta.get("year", "N/A")